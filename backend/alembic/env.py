@@ -8,8 +8,14 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if BASE_DIR not in sys.path:
     sys.path.append(BASE_DIR)
 
-from app.database import Base, DATABASE_URL
-from app import models
+if "backend.app.database" in sys.modules:
+    # Running inside the API process: reuse its metadata instead of importing
+    # the package a second time under another name
+    from backend.app.database import Base, DATABASE_URL
+    from backend.app import models
+else:
+    from app.database import Base, DATABASE_URL
+    from app import models
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -17,10 +23,15 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-if config.config_file_name is not None:
+# When invoked from the app's schema boot a live connection is handed over
+# via config.attributes; don't touch the host process's logging or URL then.
+external_connection = config.attributes.get("connection")
+
+if config.config_file_name is not None and external_connection is None:
     fileConfig(config.config_file_name)
 
-config.set_main_option("sqlalchemy.url", DATABASE_URL)
+if external_connection is None:
+    config.set_main_option("sqlalchemy.url", DATABASE_URL)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -60,6 +71,12 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    if external_connection is not None:
+        context.configure(connection=external_connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
@@ -0,0 +1,48 @@
+"""keyset pagination indexes
+
+Revision ID: 3f9c2a1d7b64
+Revises: 80bac37d379c
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a1d7b64'
+down_revision: Union[str, None] = '80bac37d379c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_index(name: str, table: str, columns: list[str]) -> None:
+    # Tables created by Base.metadata.create_all already carry the model indexes
+    if name not in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}:
+        op.create_index(name, table, columns, unique=False)
+
+
+def upgrade() -> None:
+    # (filter, created_at, id) composites serve ORDER BY created_at DESC, id DESC
+    # together with the keyset predicate of every paginated list endpoint
+    _create_index('idx_books_status_created', 'books', ['status', 'created_at', 'id'])
+    _create_index('idx_books_seller_created', 'books', ['seller_id', 'created_at', 'id'])
+    _create_index('idx_orders_buyer_created', 'orders', ['buyer_id', 'created_at', 'id'])
+    _create_index('idx_orders_seller_created', 'orders', ['seller_id', 'created_at', 'id'])
+    _create_index('idx_delivery_tasks_status_created', 'delivery_tasks', ['status', 'created_at', 'id'])
+    _create_index('idx_favorites_user_created', 'favorites', ['user_id', 'created_at', 'id'])
+    _create_index('idx_reviews_book_created', 'reviews', ['book_id', 'created_at', 'id'])
+    _create_index('idx_users_created', 'users', ['created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_users_created', table_name='users')
+    op.drop_index('idx_reviews_book_created', table_name='reviews')
+    op.drop_index('idx_favorites_user_created', table_name='favorites')
+    op.drop_index('idx_delivery_tasks_status_created', table_name='delivery_tasks')
+    op.drop_index('idx_orders_seller_created', table_name='orders')
+    op.drop_index('idx_orders_buyer_created', table_name='orders')
+    op.drop_index('idx_books_seller_created', table_name='books')
+    op.drop_index('idx_books_status_created', table_name='books')
@@ -0,0 +1,33 @@
+"""orders status/payment_due_at index
+
+Revision ID: a71e4c09d2b5
+Revises: 3f9c2a1d7b64
+Create Date: 2026-10-17 10:03:27.560912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a71e4c09d2b5'
+down_revision: Union[str, None] = '3f9c2a1d7b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_index(name: str, table: str, columns: list[str]) -> None:
+    # Tables created by Base.metadata.create_all already carry the model indexes
+    if name not in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}:
+        op.create_index(name, table, columns, unique=False)
+
+
+def upgrade() -> None:
+    # Lets the payment-expiry sweeper range-scan overdue pending orders
+    _create_index('idx_orders_status_due', 'orders', ['status', 'payment_due_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_orders_status_due', table_name='orders')
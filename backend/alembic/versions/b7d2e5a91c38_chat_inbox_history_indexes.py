@@ -0,0 +1,40 @@
+"""chat inbox and history indexes
+
+Revision ID: b7d2e5a91c38
+Revises: e93f0a5c7d21
+Create Date: 2026-10-17 22:31:05.274816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e5a91c38'
+down_revision: Union[str, None] = 'e93f0a5c7d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_index(name: str, table: str, columns: list[str]) -> None:
+    # Tables created by Base.metadata.create_all already carry the model indexes
+    if name not in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}:
+        op.create_index(name, table, columns, unique=False)
+
+
+def upgrade() -> None:
+    # Message history: WHERE session_id = ? ORDER BY created_at DESC, id DESC
+    _create_index('idx_chat_messages_session_created', 'chat_messages', ['session_id', 'created_at', 'id'])
+    # Inbox: one index range per side of the pair, merged by UNION ALL
+    _create_index('idx_chat_sessions_user1_last', 'chat_sessions', ['user1_id', 'last_message_at', 'id'])
+    _create_index('idx_chat_sessions_user2_last', 'chat_sessions', ['user2_id', 'last_message_at', 'id'])
+    # Sessions opened without a message sort by when they were opened
+    op.execute("UPDATE chat_sessions SET last_message_at = created_at WHERE last_message_at IS NULL")
+
+
+def downgrade() -> None:
+    op.drop_index('idx_chat_sessions_user2_last', table_name='chat_sessions')
+    op.drop_index('idx_chat_sessions_user1_last', table_name='chat_sessions')
+    op.drop_index('idx_chat_messages_session_created', table_name='chat_messages')
@@ -0,0 +1,41 @@
+"""courier presence
+
+Position columns reported by PUT /api/couriers/me/presence and the index the
+dispatcher uses to load couriers seen within the presence TTL.
+
+Revision ID: c2a4f8e61d09
+Revises: b7d2e5a91c38
+Create Date: 2026-10-17 23:05:47.630192
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2a4f8e61d09'
+down_revision: Union[str, None] = 'b7d2e5a91c38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {c['name'] for c in inspector.get_columns('couriers')}
+    if 'current_lat' not in columns:
+        op.add_column('couriers', sa.Column('current_lat', sa.DECIMAL(9, 6), nullable=True))
+    if 'current_lng' not in columns:
+        op.add_column('couriers', sa.Column('current_lng', sa.DECIMAL(9, 6), nullable=True))
+    if 'current_zone' not in columns:
+        op.add_column('couriers', sa.Column('current_zone', sa.String(50), nullable=True))
+    if 'idx_couriers_online_seen' not in {ix['name'] for ix in inspector.get_indexes('couriers')}:
+        op.create_index('idx_couriers_online_seen', 'couriers', ['is_online', 'last_online_time'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_couriers_online_seen', table_name='couriers')
+    op.drop_column('couriers', 'current_zone')
+    op.drop_column('couriers', 'current_lng')
+    op.drop_column('couriers', 'current_lat')
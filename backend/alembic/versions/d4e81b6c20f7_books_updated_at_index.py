@@ -0,0 +1,33 @@
+"""books updated_at index
+
+Revision ID: d4e81b6c20f7
+Revises: a71e4c09d2b5
+Create Date: 2026-10-17 21:10:42.118304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e81b6c20f7'
+down_revision: Union[str, None] = 'a71e4c09d2b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_index(name: str, table: str, columns: list[str]) -> None:
+    # Tables created by Base.metadata.create_all already carry the model indexes
+    if name not in {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}:
+        op.create_index(name, table, columns, unique=False)
+
+
+def upgrade() -> None:
+    # Watermark catch-up of the search/facet indexes and the catalogue snapshot
+    _create_index('idx_books_updated_at', 'books', ['updated_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_books_updated_at', table_name='books')
@@ -0,0 +1,35 @@
+"""reputation aggregates
+
+couriers.review_count, needed to keep couriers.rating as an incremental
+average, and a (reviewed_id, role, rating) index so reconciliation can
+aggregate a chunk of users' reviews from the index alone.
+
+Revision ID: d4e8b1c7a2f5
+Revises: c2a4f8e61d09
+Create Date: 2026-10-18 01:12:09.418377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8b1c7a2f5'
+down_revision: Union[str, None] = 'c2a4f8e61d09'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if 'review_count' not in {c['name'] for c in inspector.get_columns('couriers')}:
+        op.add_column('couriers', sa.Column('review_count', sa.Integer(), server_default='0', nullable=True))
+    if 'idx_reviews_reviewed_role' not in {ix['name'] for ix in inspector.get_indexes('reviews')}:
+        op.create_index('idx_reviews_reviewed_role', 'reviews', ['reviewed_id', 'role', 'rating'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_reviews_reviewed_role', table_name='reviews')
+    op.drop_column('couriers', 'review_count')
@@ -0,0 +1,32 @@
+"""books.cover_variants
+
+Records which resized WebP variants of a book's cover have been rendered, so
+serializing a book does not check the upload directory. Existing rows stay
+NULL until ``python -m backend.app.images --backfill`` fills them.
+
+Revision ID: e6a3c9f2d184
+Revises: d4e8b1c7a2f5
+Create Date: 2026-10-18 09:41:27.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6a3c9f2d184'
+down_revision: Union[str, None] = 'd4e8b1c7a2f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if 'cover_variants' not in {c['name'] for c in inspector.get_columns('books')}:
+        op.add_column('books', sa.Column('cover_variants', sa.String(length=50), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('books', 'cover_variants')
@@ -0,0 +1,32 @@
+"""book_categories updated_at
+
+The model has always declared ``updated_at`` (TimestampMixin) but the table
+from database/SecondHandData.sql never had it, so loading a BookCategory
+entity failed; the admin category pages now do.
+
+Revision ID: e93f0a5c7d21
+Revises: d4e81b6c20f7
+Create Date: 2026-10-17 21:48:16.402937
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e93f0a5c7d21'
+down_revision: Union[str, None] = 'd4e81b6c20f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('book_categories')}
+    if 'updated_at' not in columns:
+        op.add_column('book_categories', sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('book_categories', 'updated_at')
@@ -0,0 +1,62 @@
+"""chat_sessions.pair_key
+
+A stored "<user1_id>:<user2_id>:<book_id or ''>" key with a unique index, so
+concurrent opens of the same conversation cannot create two sessions. The
+baseline unique_user_pair index does not cover sessions without a book (MySQL
+unique indexes treat NULLs as distinct). Existing rows are keyed here; where a
+pair already has duplicates only its most recently active session gets the
+key and the others keep NULL.
+
+Revision ID: f1b7d3a9c46e
+Revises: c5d83f1e9a02
+Create Date: 2026-10-18 14:06:52.917420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b7d3a9c46e'
+down_revision: Union[str, None] = 'c5d83f1e9a02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'pair_key' not in {c['name'] for c in inspector.get_columns('chat_sessions')}:
+        op.add_column('chat_sessions', sa.Column('pair_key', sa.String(length=110), nullable=True))
+    sessions = sa.table(
+        'chat_sessions',
+        sa.column('id', sa.String), sa.column('user1_id', sa.String), sa.column('user2_id', sa.String),
+        sa.column('book_id', sa.String), sa.column('pair_key', sa.String), sa.column('last_message_at', sa.TIMESTAMP),
+    )
+    taken = set(bind.execute(sa.select(sessions.c.pair_key).where(sessions.c.pair_key.is_not(None))).scalars())
+    rows = bind.execute(
+        sa.select(sessions.c.id, sessions.c.user1_id, sessions.c.user2_id, sessions.c.book_id)
+        .where(sessions.c.pair_key.is_(None))
+        .order_by(sessions.c.last_message_at.desc(), sessions.c.id.desc())
+    ).all()
+    keyed = []
+    for row in rows:
+        user1, user2 = sorted((row.user1_id, row.user2_id))
+        key = f"{user1}:{user2}:{row.book_id or ''}"
+        if key not in taken:
+            taken.add(key)
+            keyed.append({'row_id': row.id, 'key': key})
+    if keyed:
+        bind.execute(
+            sessions.update().where(sessions.c.id == sa.bindparam('row_id')).values(pair_key=sa.bindparam('key')),
+            keyed,
+        )
+    if 'uq_chat_sessions_pair_key' not in {ix['name'] for ix in inspector.get_indexes('chat_sessions')}:
+        op.create_index('uq_chat_sessions_pair_key', 'chat_sessions', ['pair_key'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('uq_chat_sessions_pair_key', table_name='chat_sessions')
+    op.drop_column('chat_sessions', 'pair_key')
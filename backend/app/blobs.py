@@ -0,0 +1,199 @@
+"""Reference counting and garbage collection for the upload blob store.
+
+A blob under ``UPLOAD_DIR`` is live while any of ``books.cover_image``,
+``books.gallery_images`` or ``book_images.image_url`` points at it. Deleting
+or editing a book releases its blobs immediately when nothing else refers to
+them; the periodic job sweeps whatever is left (abandoned uploads, rows
+removed by cascades or by hand)::
+
+    python -m backend.app.blobs gc [--dry-run]
+    python -m backend.app.blobs migrate     # move pre-dedup uploads into the store
+
+Blobs modified within ``UPLOAD_GC_GRACE_SECONDS`` are never removed: an image
+is uploaded before the book that references it is saved, and a duplicate
+upload refreshes the mtime of the blob it reuses.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import Counter
+from pathlib import Path
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .images import UPLOAD_URL_PREFIX, VARIANTS, is_variant, originals, rendered_variants, variant_path
+from .models.book import Book
+from .models.book_image import BookImage
+from .uploads import UPLOAD_DIR, UPLOAD_TMP_DIR, blob_relpath
+
+UPLOAD_GC_GRACE_SECONDS = float(os.getenv("UPLOAD_GC_GRACE_SECONDS", str(24 * 3600)))
+
+
+def url_to_relpath(url: str | None) -> str | None:
+    if not url or not url.startswith(UPLOAD_URL_PREFIX):
+        return None
+    return url[len(UPLOAD_URL_PREFIX):]
+
+
+def book_image_urls(book: Book) -> set[str]:
+    urls = {book.cover_image} if book.cover_image else set()
+    urls.update(json.loads(book.gallery_images or "[]"))
+    urls.update(img.image_url for img in book.images)
+    return {u for u in urls if url_to_relpath(u)}
+
+
+def reference_counts(db: Session) -> Counter:
+    """Blob path (relative to UPLOAD_DIR) -> number of references."""
+    refs: Counter = Counter()
+    for cover, gallery in db.query(Book.cover_image, Book.gallery_images).yield_per(1000):
+        for url in [cover, *json.loads(gallery or "[]")]:
+            rel = url_to_relpath(url)
+            if rel:
+                refs[rel] += 1
+    for (url,) in db.query(BookImage.image_url).yield_per(1000):
+        rel = url_to_relpath(url)
+        if rel:
+            refs[rel] += 1
+    return refs
+
+
+def is_referenced(db: Session, url: str) -> bool:
+    return (
+        db.query(Book.id).filter(or_(Book.cover_image == url, Book.gallery_images.contains(json.dumps(url)))).first() is not None
+        or db.query(BookImage.id).filter(BookImage.image_url == url).first() is not None
+    )
+
+
+def _remove_blob(path: Path) -> int:
+    freed = 0
+    for p in [path, *(variant_path(path, name) for name in VARIANTS)]:
+        try:
+            freed += p.stat().st_size
+            p.unlink()
+        except FileNotFoundError:
+            pass
+    for parent in (path.parent, path.parent.parent):
+        if parent != UPLOAD_DIR:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+    return freed
+
+
+def _within_grace(path: Path, now: float, grace: float) -> bool:
+    try:
+        return now - path.stat().st_mtime < grace
+    except FileNotFoundError:
+        return True
+
+
+def release(db: Session, urls, grace: float = UPLOAD_GC_GRACE_SECONDS) -> int:
+    """Delete the blobs behind ``urls`` that nothing references any more.
+
+    Call after committing the change that dropped the references.
+    """
+    now = time.time()
+    removed = 0
+    for url in urls:
+        rel = url_to_relpath(url)
+        if not rel:
+            continue
+        path = UPLOAD_DIR / rel
+        if not path.is_file() or _within_grace(path, now, grace) or is_referenced(db, url):
+            continue
+        _remove_blob(path)
+        removed += 1
+    return removed
+
+
+def collect_garbage(db: Session, dry_run: bool = False, grace: float = UPLOAD_GC_GRACE_SECONDS) -> dict:
+    refs = reference_counts(db)
+    now = time.time()
+    stats = {"blobs": 0, "referenced": 0, "removed": 0, "freed_bytes": 0, "stale_tmp": 0}
+    for path in list(originals()):
+        stats["blobs"] += 1
+        if path.relative_to(UPLOAD_DIR).as_posix() in refs:
+            stats["referenced"] += 1
+            continue
+        if _within_grace(path, now, grace):
+            continue
+        stats["removed"] += 1
+        if dry_run:
+            stats["freed_bytes"] += path.stat().st_size
+        else:
+            stats["freed_bytes"] += _remove_blob(path)
+    # Temp files left behind by interrupted uploads or renders
+    for path in [*UPLOAD_TMP_DIR.glob("*"), *UPLOAD_DIR.rglob("*.part")]:
+        if path.is_file() and not _within_grace(path, now, grace):
+            stats["stale_tmp"] += 1
+            if not dry_run:
+                path.unlink(missing_ok=True)
+    return stats
+
+
+def _hash_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def migrate_legacy(db: Session) -> int:
+    """Move flat ``<uuid>.ext`` uploads into the store and repoint the rows.
+
+    Blobs are created first, the database is rewritten in one commit, and only
+    then are the old files deleted, so an interruption never breaks a link.
+    """
+    mapping: dict[str, str] = {}
+    legacy = [p for p in UPLOAD_DIR.iterdir() if p.is_file() and not p.name.startswith(".") and not is_variant(p)]
+    for path in legacy:
+        rel = blob_relpath(_hash_file(path), path.suffix.lower())
+        dest = UPLOAD_DIR / rel
+        if not dest.exists():
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, dest)
+            for name in VARIANTS:
+                if variant_path(path, name).exists() and not variant_path(dest, name).exists():
+                    shutil.copy2(variant_path(path, name), variant_path(dest, name))
+        mapping[UPLOAD_URL_PREFIX + path.name] = UPLOAD_URL_PREFIX + rel
+    if not mapping:
+        return 0
+
+    for book in db.query(Book).filter(or_(Book.cover_image.in_(list(mapping)), Book.gallery_images.contains(UPLOAD_URL_PREFIX))):
+        if book.cover_image in mapping:
+            book.cover_image = mapping[book.cover_image]
+            book.cover_variants = rendered_variants(book.cover_image)
+        if book.gallery_images:
+            book.gallery_images = json.dumps([mapping.get(u, u) for u in json.loads(book.gallery_images)])
+    for img in db.query(BookImage).filter(BookImage.image_url.in_(list(mapping))):
+        img.image_url = mapping[img.image_url]
+    db.commit()
+
+    for path in legacy:
+        for p in [path, *(variant_path(path, name) for name in VARIANTS)]:
+            p.unlink(missing_ok=True)
+    return len(legacy)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the content-addressed upload store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gc = sub.add_parser("gc", help="remove blobs no book refers to")
+    gc.add_argument("--dry-run", action="store_true")
+    sub.add_parser("migrate", help="move legacy flat uploads into the store")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        if args.command == "gc":
+            print("[BLOBS]", collect_garbage(db, dry_run=args.dry_run))
+        else:
+            print(f"[BLOBS] migrated {migrate_legacy(db)} legacy uploads")
+    finally:
+        db.close()
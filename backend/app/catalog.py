@@ -0,0 +1,387 @@
+"""Memory-mapped, columnar snapshot of the available catalogue.
+
+Plain browse requests (no search term, only ``available`` books) are answered
+from a read-only file shared by every uvicorn worker instead of MySQL:
+
+* one worker at a time holds ``<path>.lock`` (``flock``) and is the builder:
+  it keeps the rows in memory, pulls books whose ``updated_at`` is at or past
+  its watermark every ``CATALOG_REFRESH_SECONDS``, and rewrites the file
+  atomically (temp file + rename) when something changed. A full rebuild
+  every ``CATALOG_FULL_REBUILD_SECONDS`` drops rows for deleted books;
+* every worker maps the file again when its inode changes and builds the
+  per-category row lists it needs locally.
+
+The file is a header followed by fixed-width columns (id, created_at in
+microseconds, price in cents, category, publish year, condition), rows sorted
+by ``(created_at DESC, id DESC)`` like every other list, so the usual keyset
+cursor works unchanged and is located with a binary search. Only the ids of
+the final page go to the database, to be hydrated into ``BookOut``; rows that
+stopped being available since the last refresh are dropped there.
+
+Disabled unless ``CATALOG_SNAPSHOT_ENABLED`` is set; ``fcntl`` is required,
+so the snapshot stays off on platforms without it.
+"""
+import bisect
+import datetime
+import heapq
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import SessionLocal
+from .models.book import Book, BookStatus, ConditionLevel
+from .pagination import decode_keyset, encode_cursor
+from .response_cache import LIST_TAG, response_cache
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+CATALOG_SNAPSHOT_ENABLED = os.getenv("CATALOG_SNAPSHOT_ENABLED", "false").lower() in ("1", "true", "yes")
+CATALOG_SNAPSHOT_PATH = Path(os.getenv("CATALOG_SNAPSHOT_PATH", str(Path(__file__).resolve().parents[1] / "catalog.snapshot")))
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "2"))
+CATALOG_FULL_REBUILD_SECONDS = float(os.getenv("CATALOG_FULL_REBUILD_SECONDS", "600"))
+
+MAGIC = b"DHUCAT01"
+# magic, row count, generation, watermark (us since epoch, -1 = none)
+_HEADER = struct.Struct("<8sIxxxxqq")
+ID_WIDTH = 36
+NO_CATEGORY = -1
+CONDITIONS = list(ConditionLevel)
+_CONDITION_INDEX = {c: i for i, c in enumerate(CONDITIONS)}
+_EPOCH = datetime.datetime(1970, 1, 1)
+_US = datetime.timedelta(microseconds=1)
+
+# (typecode, bytes per row) in file order, after the id column
+_COLUMNS = (("created", "q", 8), ("price", "q", 8), ("category", "i", 4), ("year", "h", 2), ("condition", "B", 1))
+
+
+def to_us(dt: datetime.datetime) -> int:
+    return (dt - _EPOCH) // _US
+
+
+def from_us(us: int) -> datetime.datetime:
+    return _EPOCH + datetime.timedelta(microseconds=us)
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _layout(count: int) -> tuple[int, dict[str, int]]:
+    offsets = {}
+    pos = _HEADER.size
+    offsets["id"] = pos
+    pos = _align(pos + count * ID_WIDTH)
+    for name, _, width in _COLUMNS:
+        offsets[name] = pos
+        pos = _align(pos + count * width)
+    return pos, offsets
+
+
+def _row(book) -> tuple:
+    """(id, created_us, price_cents, category, year, condition) of a book row."""
+    return (
+        book.id,
+        to_us(book.created_at),
+        int(round(book.selling_price * 100)),
+        book.category_id if book.category_id is not None else NO_CATEGORY,
+        book.publish_year or 0,
+        _CONDITION_INDEX[book.condition_level],
+    )
+
+
+def write_snapshot(path: Path, rows: list[tuple], generation: int, watermark: datetime.datetime | None):
+    """Write ``rows`` (already in list order) to ``path`` atomically."""
+    size, offsets = _layout(len(rows))
+    buf = bytearray(size)
+    _HEADER.pack_into(buf, 0, MAGIC, len(rows), generation, to_us(watermark) if watermark else -1)
+    ids = b"".join(r[0].encode().ljust(ID_WIDTH, b"\0") for r in rows)
+    buf[offsets["id"]:offsets["id"] + len(ids)] = ids
+    for col, (name, code, width) in enumerate(_COLUMNS, start=1):
+        data = array(code, (r[col] for r in rows)).tobytes()
+        buf[offsets[name]:offsets[name] + len(data)] = data
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(buf)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Snapshot:
+    """Read-only view over one mapped snapshot file."""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.inode = (st.st_ino, st.st_mtime_ns, st.st_size)
+        magic, self.count, self.generation, watermark = _HEADER.unpack_from(self.mm, 0)
+        size, offsets = _layout(self.count)
+        if magic != MAGIC or len(self.mm) < size:
+            raise ValueError(f"{path} is not a catalogue snapshot")
+        self.watermark = from_us(watermark) if watermark >= 0 else None
+        view = memoryview(self.mm)
+        self._ids = view[offsets["id"]:offsets["id"] + self.count * ID_WIDTH]
+        for name, code, width in _COLUMNS:
+            setattr(self, name, view[offsets[name]:offsets[name] + self.count * width].cast(code))
+        self._by_category: dict[int, array] | None = None
+
+    def id_at(self, i: int) -> str:
+        return bytes(self._ids[i * ID_WIDTH:(i + 1) * ID_WIDTH]).rstrip(b"\0").decode()
+
+    def rows(self) -> list[tuple]:
+        return [
+            (self.id_at(i), self.created[i], self.price[i], self.category[i], self.year[i], self.condition[i])
+            for i in range(self.count)
+        ]
+
+    def by_category(self) -> dict[int, array]:
+        """category id -> ascending row numbers; built once per mapping."""
+        if self._by_category is None:
+            index: dict[int, array] = {}
+            for i, cat in enumerate(self.category):
+                index.setdefault(cat, array("I")).append(i)
+            self._by_category = index
+        return self._by_category
+
+    def position_after(self, created: datetime.datetime, last_id: str) -> int:
+        """First row that sorts after the keyset cursor ``(created, last_id)``."""
+        key = (to_us(created), str(last_id))
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (self.created[mid], self.id_at(mid)) < key:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def candidates(self, start: int, category_ids=None):
+        if category_ids is None:
+            return iter(range(start, self.count))
+        index = self.by_category()
+        lists = [index[c] for c in category_ids if c in index]
+        tails = (lst[bisect.bisect_left(lst, start):] for lst in lists)
+        return heapq.merge(*tails)
+
+    def page(self, cursor: str | None, limit: int, category_ids=None, predicate=None) -> tuple[list[str], str | None]:
+        start = 0
+        if cursor:
+            created, last_id = decode_keyset(cursor)
+            start = self.position_after(created, last_id)
+        rows: list[int] = []
+        for i in self.candidates(start, category_ids):
+            if predicate is None or predicate(self, i):
+                rows.append(i)
+                if len(rows) > limit:
+                    break
+        if len(rows) <= limit:
+            return [self.id_at(i) for i in rows], None
+        rows = rows[:limit]
+        last = rows[-1]
+        return [self.id_at(i) for i in rows], encode_cursor(from_us(self.created[last]), self.id_at(last))
+
+
+class CatalogSnapshot:
+    def __init__(self, path: Path = CATALOG_SNAPSHOT_PATH, interval: float = CATALOG_REFRESH_SECONDS,
+                 full_rebuild_interval: float = CATALOG_FULL_REBUILD_SECONDS):
+        self.path = Path(path)
+        self.interval = interval
+        self.full_rebuild_interval = full_rebuild_interval
+        self._current: Snapshot | None = None
+        self._remap_lock = threading.Lock()
+        self._lock_file = None
+        # Builder state, only populated in the worker that holds the lock
+        self._rows: dict[str, tuple] | None = None
+        self._watermark: datetime.datetime | None = None
+        self._generation = 0
+        self._last_full = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.builds = 0
+        self.remaps = 0
+        self.served = 0
+        self.last_build_ms = 0.0
+        self.last_error: str | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return CATALOG_SNAPSHOT_ENABLED and fcntl is not None
+
+    @property
+    def is_builder(self) -> bool:
+        return self._lock_file is not None
+
+    @property
+    def current(self) -> Snapshot | None:
+        return self._current
+
+    def _try_become_builder(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.path.with_name(self.path.name + ".lock"), "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    def _release_builder(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self._rows = None
+
+    def _full_rebuild(self, db):
+        watermark = db.query(func.max(Book.updated_at)).scalar()
+        books = db.query(Book.id, Book.created_at, Book.selling_price, Book.category_id, Book.publish_year, Book.condition_level).filter(
+            Book.status == BookStatus.available
+        )
+        self._rows = {row[0]: row for row in map(_row, books.yield_per(5000))}
+        self._watermark = watermark
+        self._last_full = time.monotonic()
+
+    def _catch_up(self, db) -> bool:
+        # >= because TIMESTAMP has one-second resolution; unchanged rows are ignored below
+        changed = db.query(
+            Book.id, Book.created_at, Book.selling_price, Book.category_id, Book.publish_year,
+            Book.condition_level, Book.status, Book.updated_at,
+        ).filter(Book.updated_at >= self._watermark)
+        dirty = False
+        for book in changed.yield_per(5000):
+            if book.status == BookStatus.available:
+                row = _row(book)
+                dirty |= self._rows.get(book.id) != row
+                self._rows[book.id] = row
+            else:
+                dirty |= self._rows.pop(book.id, None) is not None
+            if book.updated_at and book.updated_at > self._watermark:
+                self._watermark = book.updated_at
+        return dirty
+
+    def build(self, full: bool = False) -> bool:
+        """Bring the file up to date; return True if a new one was written."""
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            if self._rows is None and not full and self._current is not None and self._current.watermark:
+                # Take over from a previous builder: start from its file
+                self._rows = {r[0]: r for r in self._current.rows()}
+                self._watermark = self._current.watermark
+                self._generation = self._current.generation
+                self._last_full = time.monotonic()
+            if full or self._rows is None or self._watermark is None or time.monotonic() - self._last_full > self.full_rebuild_interval:
+                self._full_rebuild(db)
+                dirty = True
+            else:
+                dirty = self._catch_up(db)
+        finally:
+            db.close()
+        if not dirty and self.path.exists():
+            return False
+        self._generation += 1
+        rows = sorted(self._rows.values(), key=lambda r: (r[1], r[0]), reverse=True)
+        write_snapshot(self.path, rows, self._generation, self._watermark)
+        self.builds += 1
+        self.last_build_ms = (time.perf_counter() - start) * 1000
+        return True
+
+    def remap(self) -> bool:
+        """Map the file again if another process (or we) replaced it."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        current = self._current
+        if current is not None and current.inode == (st.st_ino, st.st_mtime_ns, st.st_size):
+            return False
+        with self._remap_lock:
+            try:
+                snap = Snapshot(self.path)
+            except (OSError, ValueError, struct.error) as e:
+                self.last_error = str(e)
+                return False
+            # The old mapping is unmapped once the last request using it is done
+            self._current = snap
+            self.remaps += 1
+        if current is not None:
+            # Lists cached from the previous snapshot may predate the change
+            response_cache.invalidate_tag(LIST_TAG)
+        return True
+
+    def refresh(self):
+        try:
+            self.remap()
+            if self._try_become_builder():
+                if self.build():
+                    self.remap()
+            self.last_error = None
+        except Exception as e:
+            # Rebuild from scratch next time rather than trusting partial state
+            self._rows = None
+            self.last_error = str(e)
+            print("[WARN] catalogue snapshot refresh failed:", e)
+
+    def start(self):
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="catalog-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self._release_builder()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    async def page(self, db: AsyncSession, cursor: str | None, limit: int, category_ids=None, predicate=None):
+        """One page of available books as ORM rows, or None if there is no snapshot yet."""
+        snap = self._current
+        if snap is None:
+            return None
+        ids, next_cursor = snap.page(cursor, limit, category_ids, predicate)
+        self.served += 1
+        if not ids:
+            return [], next_cursor
+        result = await db.execute(select(Book).where(Book.id.in_(ids), Book.status == BookStatus.available))
+        found = {b.id: b for b in result.scalars().all()}
+        return [found[i] for i in ids if i in found], next_cursor
+
+    def stats(self) -> dict:
+        snap = self._current
+        return {
+            "enabled": self.enabled,
+            "builder": self.is_builder,
+            "rows": snap.count if snap else None,
+            "generation": snap.generation if snap else None,
+            "watermark": snap.watermark.isoformat() if snap and snap.watermark else None,
+            "bytes": len(snap.mm) if snap else 0,
+            "builds": self.builds,
+            "remaps": self.remaps,
+            "served": self.served,
+            "last_build_ms": round(self.last_build_ms, 3),
+            "last_error": self.last_error,
+        }
+
+
+catalog_snapshot = CatalogSnapshot()
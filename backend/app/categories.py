@@ -0,0 +1,196 @@
+"""In-memory category tree with nested-set numbering.
+
+``book_categories`` is an adjacency list (``parent_id``). The whole table is
+small, so every worker keeps it in memory, numbered in pre-order (sort_order,
+id): a node's descendants are exactly ``order[lft:rgt]``, so expanding
+"计算机" to itself plus every subcategory is a list slice and ``list_books``
+filters with one ``category_id IN (...)``.
+
+The tree is rebuilt when this process commits a category change (ORM flush
+hook, like ``facets.py``) and otherwise re-read at most every
+``CATEGORY_TREE_REFRESH_SECONDS`` to notice edits made by other workers or
+directly in MySQL; the re-read is one query over a handful of rows and only
+triggers a rebuild when something differs.
+"""
+import json
+import os
+import threading
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models.category import BookCategory
+from .response_cache import CachedResponse
+
+CATEGORY_TREE_REFRESH_SECONDS = float(os.getenv("CATEGORY_TREE_REFRESH_SECONDS", "30"))
+
+
+class CategoryNode:
+    __slots__ = ("id", "name", "parent_id", "sort_order", "is_active", "lft", "rgt", "depth", "children")
+
+    def __init__(self, id, name, parent_id, sort_order, is_active):
+        self.id = id
+        self.name = name
+        self.parent_id = parent_id
+        self.sort_order = sort_order or 0
+        self.is_active = is_active is None or bool(is_active)
+        self.lft = self.rgt = self.depth = 0
+        self.children: list["CategoryNode"] = []
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "parent_id": self.parent_id,
+            "depth": self.depth,
+            "children": [c.to_dict() for c in self.children if c.is_active],
+        }
+
+
+class CategoryTree:
+    def __init__(self, refresh_interval: float = CATEGORY_TREE_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._rows: list[tuple] | None = None
+        self._nodes: dict[int, CategoryNode] = {}
+        self._order: list[int] = []
+        self._roots: list[CategoryNode] = []
+        self._response: CachedResponse | None = None
+        self._checked_at = 0.0
+        self._stale = True
+        self.rebuilds = 0
+
+    @staticmethod
+    def _stmt():
+        # Explicit columns: legacy schemas lack the mixin's updated_at
+        return select(BookCategory.id, BookCategory.name, BookCategory.parent_id, BookCategory.sort_order, BookCategory.is_active).order_by(BookCategory.id)
+
+    def _build(self, rows: list[tuple]):
+        nodes = {r[0]: CategoryNode(*r) for r in rows}
+        roots = []
+        for node in nodes.values():
+            parent = nodes.get(node.parent_id)
+            if parent is None or parent is node:
+                roots.append(node)
+            else:
+                parent.children.append(node)
+        order: list[int] = []
+        seen: set[int] = set()
+
+        def number(node: CategoryNode, depth: int):
+            # Iterative pre-order walk; a parent_id cycle is cut where it closes
+            stack = [(node, depth, False)]
+            while stack:
+                n, d, done = stack.pop()
+                if done:
+                    n.rgt = len(order)
+                    continue
+                if n.id in seen:
+                    continue
+                seen.add(n.id)
+                n.lft, n.depth = len(order), d
+                order.append(n.id)
+                n.children.sort(key=lambda c: (c.sort_order, c.id))
+                stack.append((n, d, True))
+                for child in reversed(n.children):
+                    stack.append((child, d + 1, False))
+
+        roots.sort(key=lambda c: (c.sort_order, c.id))
+        for root in roots:
+            number(root, 0)
+        # Nodes only reachable through a cycle become roots of their own
+        for node in sorted(nodes.values(), key=lambda c: (c.sort_order, c.id)):
+            if node.id not in seen:
+                if node.parent_id in nodes:
+                    nodes[node.parent_id].children.remove(node)
+                roots.append(node)
+                number(node, 0)
+        body = json.dumps([r.to_dict() for r in roots if r.is_active], ensure_ascii=False, separators=(",", ":")).encode()
+        with self._lock:
+            self._rows = rows
+            self._nodes, self._order, self._roots = nodes, order, roots
+            self._response = CachedResponse(body, set(), float("inf"))
+            self._stale = False
+            self.rebuilds += 1
+
+    def _due(self, force: bool) -> bool:
+        now = time.monotonic()
+        if not force and not self._stale and now - self._checked_at < self.refresh_interval:
+            return False
+        self._checked_at = now
+        return True
+
+    def _apply(self, rows: list[tuple]) -> bool:
+        if rows == self._rows and not self._stale:
+            return False
+        self._build(rows)
+        return True
+
+    def refresh(self, db: Session, force: bool = False) -> bool:
+        """Re-read the table if due; return True if the tree changed."""
+        if not self._due(force):
+            return False
+        return self._apply([tuple(r) for r in db.execute(self._stmt()).all()])
+
+    async def refresh_async(self, db: AsyncSession, force: bool = False) -> bool:
+        if not self._due(force):
+            return False
+        return self._apply([tuple(r) for r in (await db.execute(self._stmt())).all()])
+
+    def invalidate(self):
+        self._stale = True
+
+    def subtree_ids(self, category_id: int) -> list[int]:
+        """The category and all of its descendants (just the id if unknown)."""
+        with self._lock:
+            node = self._nodes.get(category_id)
+            if node is None:
+                return [category_id]
+            return self._order[node.lft:node.rgt]
+
+    def lineage(self, category_id: int) -> list[int]:
+        """The category followed by its ancestors up to the root."""
+        out = []
+        with self._lock:
+            node = self._nodes.get(category_id)
+            while node is not None and node.id not in out:
+                out.append(node.id)
+                node = self._nodes.get(node.parent_id)
+        return out or [category_id]
+
+    def flat(self) -> list[CategoryNode]:
+        """All nodes in tree order, for admin pages."""
+        with self._lock:
+            return [self._nodes[i] for i in self._order]
+
+    @property
+    def response(self) -> CachedResponse | None:
+        return self._response
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"categories": len(self._nodes), "roots": len(self._roots), "rebuilds": self.rebuilds, "stale": self._stale}
+
+
+category_tree = CategoryTree()
+
+_PENDING = "category_changed"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_category_changes(session, flush_context):
+    if any(isinstance(obj, BookCategory) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info[_PENDING] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_category_changes(session):
+    if session.info.pop(_PENDING, False):
+        category_tree.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_category_changes(session):
+    session.info.pop(_PENDING, None)
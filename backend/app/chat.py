@@ -0,0 +1,706 @@
+"""Real-time chat: WebSocket fan-out, batched persistence, pluggable pub/sub.
+
+A message sent over ``/api/chat/ws`` (or ``POST /api/chat/sessions/{id}/messages``)
+takes two independent paths:
+
+* **delivery** -- it is published on the :class:`ChatBroker`; every worker's
+  :class:`ChatHub` pushes it to the sockets its recipients have open, so the
+  round trip is one broker hop and never touches MySQL;
+* **persistence** -- it is queued on the :class:`MessageWriter`, which wakes
+  when work arrives, waits ``CHAT_FLUSH_INTERVAL_MS`` to gather a batch and
+  writes it in one transaction: a multi-row ``INSERT`` into ``chat_messages``
+  plus one additive ``UPDATE`` per session (``unread_count_userN =
+  unread_count_userN + k``, ``last_message``), in id order so concurrent
+  workers lock rows alike. Reads ("mark as read") go through the same queue,
+  so they are applied in order with the messages around them.
+
+Ids and ``created_at`` are assigned before the message is delivered, so what
+clients receive is exactly what history later returns. A failed flush is put
+back and retried with exponential backoff; the shutdown hook flushes what is
+left, so only a hard kill loses (at most one interval of) messages. A batch
+the database rejects (``IntegrityError`` / ``DataError``: a deleted sender or
+session, bad data), or one that keeps failing for ``CHAT_FLUSH_MAX_ATTEMPTS``
+tries, is written one operation per transaction instead; an operation that is
+rejected, or fails that many times on its own, goes to a bounded dead-letter
+list (``/api/debug/chat``) so it cannot hold up everything queued behind it.
+
+``CHAT_BROKER=memory`` delivers within the process (single worker, tests);
+``CHAT_BROKER=redis`` publishes on a Redis channel so several workers or hosts
+deliver to each other's sockets (needs ``pip install redis``).
+"""
+import abc
+import asyncio
+import datetime
+import json
+import os
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from sqlalchemy import func, insert, or_, select, union_all, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import database
+from .models.chat import ChatMessage, ChatSession, MessageType
+from .pagination import keyset_condition, keyset_page
+
+CHAT_BROKER = os.getenv("CHAT_BROKER", "memory").lower()
+CHAT_REDIS_URL = os.getenv("CHAT_REDIS_URL", "redis://127.0.0.1:6379/0")
+CHAT_REDIS_CHANNEL = os.getenv("CHAT_REDIS_CHANNEL", "dhu:chat")
+CHAT_FLUSH_INTERVAL_MS = float(os.getenv("CHAT_FLUSH_INTERVAL_MS", "20"))
+CHAT_FLUSH_BATCH_SIZE = int(os.getenv("CHAT_FLUSH_BATCH_SIZE", "500"))
+CHAT_FLUSH_MAX_ATTEMPTS = int(os.getenv("CHAT_FLUSH_MAX_ATTEMPTS", "8"))
+CHAT_FLUSH_MAX_BACKOFF_SECONDS = 30.0
+DEAD_LETTER_SIZE = 1000
+# Outgoing frames buffered per socket before a slow client is disconnected
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", "256"))
+# Bounds drift of cached unread totals from messages other workers had not yet flushed
+CHAT_UNREAD_CACHE_TTL_SECONDS = float(os.getenv("CHAT_UNREAD_CACHE_TTL_SECONDS", "60"))
+MAX_MESSAGE_CHARS = 2000
+PARTICIPANT_CACHE_SIZE = 10000
+UNREAD_CACHE_SIZE = 10000
+
+
+def encode(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def session_pair_key(user_a: str, user_b: str, book_id: str | None) -> str:
+    """``chat_sessions.pair_key``: the same for either user order."""
+    user1, user2 = sorted((user_a, user_b))
+    return f"{user1}:{user2}:{book_id or ''}"
+
+
+_id_lock = threading.Lock()
+_id_last = (0, 0)
+
+
+def message_id() -> str:
+    """UUIDv7-layout id (ms timestamp, then a per-ms counter, then random bits).
+
+    ``created_at`` has second precision, so history orders by ``(created_at,
+    id)``; time-ordered ids keep messages sent within the same second in send
+    order (per worker).
+    """
+    global _id_last
+    with _id_lock:
+        ms, seq = time.time_ns() // 1_000_000, 0
+        if ms <= _id_last[0]:
+            ms, seq = _id_last[0], _id_last[1] + 1
+            if seq > 0xFFF:
+                ms, seq = ms + 1, 0
+        _id_last = (ms, seq)
+    value = (ms << 80) | (0x7 << 76) | (seq << 64) | (0b10 << 62) | secrets.randbits(62)
+    return str(uuid.UUID(int=value))
+
+
+class Connection:
+    def __init__(self, websocket: WebSocket, user_id: str):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue[str] = asyncio.Queue(CHAT_SEND_QUEUE_SIZE)
+        self.pump_task: asyncio.Task | None = None
+
+    def push(self, frame: str) -> bool:
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def pump(self):
+        while True:
+            await self.websocket.send_text(await self.queue.get())
+
+    def overflow(self):
+        # Too far behind: drop the socket, the client reconnects and reloads history
+        if self.pump_task is not None:
+            self.pump_task.cancel()
+
+
+class ChatHub:
+    """Sockets open in this process, keyed by user id (one user, many tabs)."""
+
+    def __init__(self):
+        self._connections: dict[str, set[Connection]] = {}
+        self.delivered = 0
+        self.dropped = 0
+
+    def attach(self, conn: Connection):
+        self._connections.setdefault(conn.user_id, set()).add(conn)
+
+    def detach(self, conn: Connection):
+        conns = self._connections.get(conn.user_id)
+        if conns is not None:
+            conns.discard(conn)
+            if not conns:
+                del self._connections[conn.user_id]
+
+    def online(self, user_id: str) -> bool:
+        return user_id in self._connections
+
+    def deliver(self, user_ids, frame: str):
+        for user_id in user_ids:
+            for conn in list(self._connections.get(user_id, ())):
+                if conn.push(frame):
+                    self.delivered += 1
+                else:
+                    self.dropped += 1
+                    self.detach(conn)
+                    conn.overflow()
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._connections),
+            "sockets": sum(len(c) for c in self._connections.values()),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+class ChatBroker(abc.ABC):
+    """Carries ``(recipient ids, frame, unread changes)`` to every worker.
+
+    ``unread`` maps a user id to an unread-total delta, or to None when the
+    user read a session and their total must be recomputed.
+    """
+
+    def __init__(self):
+        self.handler = None
+
+    async def start(self, handler):
+        self.handler = handler
+
+    async def stop(self):
+        pass
+
+    @abc.abstractmethod
+    async def publish(self, user_ids: list[str], frame: str, unread: dict | None = None):
+        ...
+
+
+class MemoryChatBroker(ChatBroker):
+    async def publish(self, user_ids, frame, unread=None):
+        if self.handler is not None:
+            self.handler(user_ids, frame, unread)
+
+
+class RedisChatBroker(ChatBroker):
+    """One Redis pub/sub channel shared by all workers."""
+
+    def __init__(self, url: str = CHAT_REDIS_URL, channel: str = CHAT_REDIS_CHANNEL):
+        super().__init__()
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self, handler):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CHAT_BROKER=redis requires the redis package: pip install redis")
+        await super().start(handler)
+        self._redis = redis.from_url(self.url)
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub):
+        async for item in pubsub.listen():
+            if item.get("type") != "message":
+                continue
+            try:
+                envelope = json.loads(item["data"])
+                self.handler(envelope["to"], envelope["frame"], envelope.get("unread"))
+            except Exception as e:
+                print("[WARN] bad chat broker message:", e)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def publish(self, user_ids, frame, unread=None):
+        await self._redis.publish(self.channel, json.dumps({"to": user_ids, "frame": frame, "unread": unread}, ensure_ascii=False))
+
+
+def make_chat_broker(kind: str = CHAT_BROKER) -> ChatBroker:
+    if kind == "memory":
+        return MemoryChatBroker()
+    if kind == "redis":
+        return RedisChatBroker()
+    raise ValueError(f"Unknown CHAT_BROKER: {kind}")
+
+
+class MessageWriter:
+    """Batches message inserts, unread counters and read receipts."""
+
+    def __init__(self, interval_ms: float = CHAT_FLUSH_INTERVAL_MS, batch_size: int = CHAT_FLUSH_BATCH_SIZE):
+        self.interval = interval_ms / 1000
+        self.batch_size = batch_size
+        # ("message", row, recipient side) | ("read", session id, reader side, reader id, at)
+        self._pending: list[tuple] = []
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._lock: asyncio.Lock | None = None
+        # Consecutive failed flushes, and failures of the first op while
+        # writing one op per transaction; reset by any success
+        self._attempts = 0
+        self._head_failures = 0
+        self._retry_at = 0.0
+        self.dead_letters: deque = deque(maxlen=DEAD_LETTER_SIZE)
+        self.flushes = 0
+        self.flushed_messages = 0
+        self.dropped = 0
+        self.last_error: str | None = None
+
+    def _signal(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def add_message(self, row: dict, recipient_side: int):
+        self._pending.append(("message", row, recipient_side))
+        self._signal()
+
+    def mark_read(self, session_id: str, side: int, reader_id: str, at: datetime.datetime):
+        self._pending.append(("read", session_id, side, reader_id, at))
+        self._signal()
+
+    @property
+    def backlog(self) -> int:
+        return len(self._pending)
+
+    @staticmethod
+    def _plan(ops: list[tuple]):
+        rows: list[dict] = []
+        sessions: dict[str, dict] = {}
+        reads: dict[tuple[str, str], datetime.datetime] = {}
+        for op in ops:
+            if op[0] == "message":
+                _, row, side = op
+                rows.append(row)
+                st = sessions.setdefault(row["session_id"], {"unread": [0, 0], "reset": [False, False], "last": None})
+                st["unread"][side - 1] += 1
+                st["last"] = (row["content"], row["created_at"])
+            else:
+                _, session_id, side, reader_id, at = op
+                st = sessions.setdefault(session_id, {"unread": [0, 0], "reset": [False, False], "last": None})
+                st["unread"][side - 1] = 0
+                st["reset"][side - 1] = True
+                reads.setdefault((session_id, reader_id), at)
+                # Messages still in this batch are inserted as already read
+                for row in rows:
+                    if row["session_id"] == session_id and row["sender_id"] != reader_id and not row["is_read"]:
+                        row["is_read"], row["read_at"] = True, at
+        return rows, sessions, reads
+
+    @staticmethod
+    def _unread_value(column, delta: int, reset: bool):
+        # Additive, so concurrent flushes from several workers never lose counts
+        return delta if reset else func.coalesce(column, 0) + delta
+
+    async def _write(self, db: AsyncSession, ops: list[tuple]):
+        rows, sessions, reads = self._plan(ops)
+        # Rows from earlier batches; this batch's rows already carry is_read
+        for (session_id, reader_id), at in reads.items():
+            await db.execute(
+                update(ChatMessage)
+                .where(ChatMessage.session_id == session_id, ChatMessage.sender_id != reader_id, ChatMessage.is_read.is_(False))
+                .values(is_read=True, read_at=at)
+                .execution_options(synchronize_session=False)
+            )
+        if rows:
+            await db.execute(insert(ChatMessage), rows)
+        for session_id in sorted(sessions):
+            st = sessions[session_id]
+            values = {}
+            for side, column in ((1, ChatSession.unread_count_user1), (2, ChatSession.unread_count_user2)):
+                if st["unread"][side - 1] or st["reset"][side - 1]:
+                    values[column.key] = self._unread_value(column, st["unread"][side - 1], st["reset"][side - 1])
+            if st["last"] is not None:
+                values["last_message"], values["last_message_at"] = st["last"]
+            await db.execute(update(ChatSession).where(ChatSession.id == session_id).values(values).execution_options(synchronize_session=False))
+        await db.commit()
+        return len(rows)
+
+    async def _write_batch(self, ops: list[tuple]) -> int:
+        database.get_async_engine()
+        async with database.AsyncSessionLocal() as db:
+            return await self._write(db, ops)
+
+    def _dead_letter(self, op: tuple, error: Exception):
+        self.dead_letters.append({"op": op[0], "session_id": op[1]["session_id"] if op[0] == "message" else op[1], "error": str(error)})
+        self.dropped += 1
+        print(f"[WARN] chat {op[0]} dropped:", error)
+
+    async def _write_isolated(self, ops: list[tuple]) -> int:
+        """Write ``ops`` one per transaction, dead-lettering the ones that cannot
+        be stored. Handled ops are removed from ``ops``, so after a transient
+        failure only the rest is put back."""
+        written = 0
+        while ops:
+            try:
+                written += await self._write_batch(ops[:1])
+            except (IntegrityError, DataError) as e:
+                self._dead_letter(ops[0], e)
+            except Exception as e:
+                self._head_failures += 1
+                if self._head_failures < CHAT_FLUSH_MAX_ATTEMPTS:
+                    raise
+                self._dead_letter(ops[0], e)
+            self._head_failures = 0
+            ops.pop(0)
+        return written
+
+    async def flush(self, force: bool = False) -> int:
+        """Write everything queued so far; return how many messages were inserted.
+
+        While backing off after a failure this returns at once (the loop
+        retries), unless ``force`` is set.
+        """
+        async with self._lock or asyncio.Lock():
+            if not force and time.monotonic() < self._retry_at:
+                return 0
+            written = 0
+            while self._pending:
+                ops, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                try:
+                    if self._attempts >= CHAT_FLUSH_MAX_ATTEMPTS:
+                        written += await self._write_isolated(ops)
+                    else:
+                        written += await self._write_batch(ops)
+                except (IntegrityError, DataError) as e:
+                    # Retrying the same batch would fail forever: isolate the bad ops
+                    self._pending[:0] = ops
+                    self._attempts = CHAT_FLUSH_MAX_ATTEMPTS
+                    self.last_error = str(e)
+                    print("[WARN] chat flush rejected, writing one by one:", e)
+                    continue
+                except BaseException as e:
+                    # Put the rest back in front of anything queued meanwhile
+                    self._pending[:0] = ops
+                    if not isinstance(e, Exception):
+                        raise
+                    self._attempts += 1
+                    self._retry_at = time.monotonic() + min(2 ** self._attempts * self.interval, CHAT_FLUSH_MAX_BACKOFF_SECONDS)
+                    self.last_error = str(e)
+                    print("[WARN] chat flush failed:", e)
+                    break
+                self._attempts = 0
+                self._retry_at = 0.0
+                self.flushes += 1
+            self.flushed_messages += written
+            return written
+
+    async def _loop(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            await asyncio.sleep(self.interval)
+            await self.flush()
+            if self._pending:
+                # Retry a failed batch once its backoff is over instead of spinning
+                await asyncio.sleep(max(self._retry_at - time.monotonic(), self.interval))
+                self._wake.set()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        if self._pending:
+            self._wake.set()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush(force=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed_messages": self.flushed_messages,
+            "failed_attempts": self._attempts,
+            "dropped": self.dropped,
+            "dead_letters": list(self.dead_letters)[-20:],
+            "last_error": self.last_error,
+            "interval_ms": self.interval * 1000,
+        }
+
+
+class UnreadTotals:
+    """Per-user unread total across sessions (``unread_count_user1/2`` summed).
+
+    A miss costs one indexed query; after that the entry follows broker events:
+    ``+k`` when messages are sent to the user, dropped when the user reads a
+    session (the next request recomputes it). Every worker sees every event, so
+    entries stay current across workers without touching MySQL.
+    """
+
+    def __init__(self, maxsize: int = UNREAD_CACHE_SIZE, ttl: float = CHAT_UNREAD_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        # user id -> [running load() calls, events seen]; only present while a
+        # load is in flight, so a load can tell an event raced its query
+        self._loading: dict[str, list[int]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def apply(self, changes: dict):
+        for user_id, delta in changes.items():
+            loading = self._loading.get(user_id)
+            if loading is not None:
+                loading[1] += 1
+            entry = self._entries.get(user_id)
+            if entry is None:
+                continue
+            if delta is None:
+                del self._entries[user_id]
+            else:
+                self._entries[user_id] = (entry[0] + delta, entry[1])
+
+    @staticmethod
+    def _stmt(user_id: str):
+        return union_all(
+            select(func.coalesce(func.sum(ChatSession.unread_count_user1), 0)).where(ChatSession.user1_id == user_id),
+            select(func.coalesce(func.sum(ChatSession.unread_count_user2), 0)).where(ChatSession.user2_id == user_id),
+        )
+
+    def cached(self, user_id: str) -> int | None:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    async def load(self, db: AsyncSession, user_id: str) -> int:
+        self.misses += 1
+        loading = self._loading.setdefault(user_id, [0, 0])
+        loading[0] += 1
+        events_before = loading[1]
+        try:
+            total = int(sum((await db.execute(self._stmt(user_id))).scalars().all()))
+        finally:
+            loading[0] -= 1
+            if not loading[0]:
+                del self._loading[user_id]
+        if loading[1] == events_before:
+            self._entries[user_id] = (total, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return total
+
+    def stats(self) -> dict:
+        return {"users": len(self._entries), "loading": len(self._loading), "hits": self.hits, "misses": self.misses}
+
+
+class ChatService:
+    def __init__(self, broker: ChatBroker | None = None):
+        self.hub = ChatHub()
+        self.broker = broker or make_chat_broker()
+        self.writer = MessageWriter()
+        self.unread = UnreadTotals()
+        # session id -> (user1_id, user2_id); participants never change
+        self._participants: OrderedDict[str, tuple[str, str]] = OrderedDict()
+
+    def _on_event(self, user_ids: list[str], frame: str, unread: dict | None = None):
+        if unread:
+            self.unread.apply(unread)
+        self.hub.deliver(user_ids, frame)
+
+    async def start(self):
+        await self.broker.start(self._on_event)
+        self.writer.start()
+
+    async def stop(self):
+        await self.broker.stop()
+        await self.writer.stop()
+
+    def remember(self, session: ChatSession):
+        self._participants[session.id] = (session.user1_id, session.user2_id)
+        self._participants.move_to_end(session.id)
+        while len(self._participants) > PARTICIPANT_CACHE_SIZE:
+            self._participants.popitem(last=False)
+
+    async def participants(self, db: AsyncSession, session_id: str, user_id: str) -> tuple[str, str]:
+        """Both participants of a session ``user_id`` belongs to (404/403 otherwise)."""
+        pair = self._participants.get(session_id)
+        if pair is None:
+            row = (await db.execute(select(ChatSession.user1_id, ChatSession.user2_id).where(ChatSession.id == session_id))).first()
+            if row is None:
+                raise HTTPException(status_code=404, detail="Chat session not found")
+            pair = (row[0], row[1])
+            self._participants[session_id] = pair
+        if user_id not in pair:
+            raise HTTPException(status_code=403, detail="无权访问该会话")
+        return pair
+
+    async def open_session(self, db: AsyncSession, user_id: str, peer_id: str, book_id: str | None) -> ChatSession:
+        """The session between two users about a book, created on first use."""
+        key = session_pair_key(user_id, peer_id, book_id)
+        stmt = select(ChatSession).where(ChatSession.pair_key == key)
+        session = (await db.execute(stmt)).scalars().first()
+        if session is None:
+            user1, user2 = sorted((user_id, peer_id))
+            now = datetime.datetime.utcnow().replace(microsecond=0)
+            # last_message_at is the inbox sort key, so it is never NULL
+            session = ChatSession(user1_id=user1, user2_id=user2, book_id=book_id, pair_key=key, last_message_at=now, unread_count_user1=0, unread_count_user2=0)
+            db.add(session)
+            try:
+                await db.commit()
+            except IntegrityError:
+                # Opened concurrently by the other side (uq_chat_sessions_pair_key);
+                # any other constraint failure finds nothing and is re-raised
+                await db.rollback()
+                session = (await db.execute(stmt)).scalars().first()
+                if session is None:
+                    raise
+        self.remember(session)
+        return session
+
+    async def send(self, db: AsyncSession, sender_id: str, session_id: str, content: str, message_type: MessageType = MessageType.text, image_url: str | None = None) -> dict:
+        content = (content or "").strip()
+        if not content:
+            raise HTTPException(status_code=400, detail="消息内容不能为空")
+        if len(content) > MAX_MESSAGE_CHARS:
+            raise HTTPException(status_code=400, detail="消息过长")
+        if message_type == MessageType.system:
+            raise HTTPException(status_code=400, detail="Invalid message_type")
+        user1, user2 = await self.participants(db, session_id, sender_id)
+        row = {
+            "id": message_id(),
+            "session_id": session_id,
+            "sender_id": sender_id,
+            "message_type": message_type,
+            "content": content,
+            "image_url": image_url,
+            "is_read": False,
+            "read_at": None,
+            "created_at": datetime.datetime.utcnow().replace(microsecond=0),
+        }
+        message = dict(row, message_type=message_type.value, created_at=row["created_at"].isoformat())
+        recipient = user2 if sender_id == user1 else user1
+        self.writer.add_message(row, recipient_side=2 if sender_id == user1 else 1)
+        # The sender's other tabs get it too
+        await self.broker.publish([user1, user2], encode({"type": "message", "message": message}), {recipient: 1})
+        return message
+
+    async def mark_read(self, db: AsyncSession, user_id: str, session_id: str):
+        user1, user2 = await self.participants(db, session_id, user_id)
+        at = datetime.datetime.utcnow().replace(microsecond=0)
+        self.writer.mark_read(session_id, 1 if user_id == user1 else 2, user_id, at)
+        await self.broker.publish([user1, user2], encode({"type": "read", "session_id": session_id, "reader_id": user_id, "read_at": at.isoformat()}), {user_id: None})
+
+    async def inbox(self, db: AsyncSession, user_id: str, cursor: str | None, limit: int) -> tuple[list[ChatSession], str | None]:
+        """The user's sessions, most recent message first.
+
+        ``user1_id = ? OR user2_id = ?`` cannot walk one index in order, so each
+        side is a separate range scan of its ``(userN_id, last_message_at, id)``
+        index, cut to ``limit + 1`` rows, and the two short lists are merged by
+        ``UNION ALL`` in the same statement.
+        """
+        await self.writer.flush()
+        cond = keyset_condition(ChatSession, cursor, "last_message_at")
+        branches = []
+        for column in (ChatSession.user1_id, ChatSession.user2_id):
+            side = select(ChatSession.id, ChatSession.last_message_at).where(column == user_id)
+            if cond is not None:
+                side = side.where(cond)
+            side = side.order_by(ChatSession.last_message_at.desc(), ChatSession.id.desc()).limit(limit + 1).subquery()
+            branches.append(select(side.c.id, side.c.last_message_at))
+        merged = union_all(*branches).subquery()
+        stmt = (
+            select(ChatSession)
+            .join(merged, ChatSession.id == merged.c.id)
+            .order_by(merged.c.last_message_at.desc(), merged.c.id.desc())
+            .limit(limit + 1)
+        )
+        sessions = list((await db.execute(stmt)).scalars().all())
+        for s in sessions:
+            self.remember(s)
+        return keyset_page(sessions, limit, "last_message_at")
+
+    async def unread_total(self, db: AsyncSession, user_id: str) -> int:
+        total = self.unread.cached(user_id)
+        if total is None:
+            await self.writer.flush()
+            total = await self.unread.load(db, user_id)
+        return total
+
+    async def _handle_frame(self, conn: Connection, data: dict):
+        kind = data.get("type")
+        if kind == "ping":
+            conn.push(encode({"type": "pong"}))
+            return
+        database.get_async_engine()
+        async with database.AsyncSessionLocal() as db:
+            if kind == "send":
+                try:
+                    message_type = MessageType(data.get("message_type") or "text")
+                except ValueError:
+                    raise HTTPException(status_code=400, detail="Invalid message_type")
+                message = await self.send(db, conn.user_id, data.get("session_id"), data.get("content"), message_type, data.get("image_url"))
+                conn.push(encode({"type": "ack", "client_id": data.get("client_id"), "message": message}))
+            elif kind == "read":
+                await self.mark_read(db, conn.user_id, data.get("session_id"))
+            else:
+                raise HTTPException(status_code=400, detail="Unknown frame type")
+
+    async def _receive(self, conn: Connection):
+        while True:
+            try:
+                text = await conn.websocket.receive_text()
+            except WebSocketDisconnect:
+                return
+            try:
+                data = json.loads(text)
+                if not isinstance(data, dict):
+                    raise ValueError
+            except ValueError:
+                conn.push(encode({"type": "error", "status": 400, "detail": "Invalid JSON frame"}))
+                continue
+            try:
+                await self._handle_frame(conn, data)
+            except HTTPException as e:
+                conn.push(encode({"type": "error", "client_id": data.get("client_id"), "status": e.status_code, "detail": e.detail}))
+
+    async def serve(self, websocket: WebSocket, user_id: str):
+        """Run one authenticated socket until the client disconnects."""
+        await websocket.accept()
+        conn = Connection(websocket, user_id)
+        conn.pump_task = asyncio.create_task(conn.pump())
+        receiver = asyncio.create_task(self._receive(conn))
+        self.hub.attach(conn)
+        try:
+            done, _ = await asyncio.wait({conn.pump_task, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self.hub.detach(conn)
+            conn.pump_task.cancel()
+            receiver.cancel()
+        if receiver not in done:
+            # Overflowed or the send side failed
+            try:
+                await websocket.close(code=1013)
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {"broker": type(self.broker).__name__, "hub": self.hub.stats(), "writer": self.writer.stats(), "unread": self.unread.stats()}
+
+
+chat_service = ChatService()
@@ -0,0 +1,142 @@
+"""Write-behind aggregator for ``books.view_count`` and ``books.favorite_count``.
+
+Requests only bump an in-memory delta; a background thread flushes all
+pending deltas every ``COUNTER_FLUSH_INTERVAL_SECONDS`` with one additive
+statement::
+
+    UPDATE books SET view_count = view_count + CASE id WHEN :a THEN 3 ... ELSE 0 END,
+                     favorite_count = ... WHERE id IN (...)
+
+Because the statement adds deltas instead of writing absolute values, any
+number of workers can flush concurrently and a hot book's row is locked once
+per interval instead of once per request. Deltas from a failed flush are
+merged back and retried; the shutdown hook flushes whatever is left, so only
+a hard kill loses (at most one interval of) counts.
+"""
+import atexit
+import os
+import threading
+
+from sqlalchemy import case, func, update
+
+from .database import SessionLocal
+from .models.book import Book
+from .response_cache import response_cache
+
+COUNTER_FLUSH_INTERVAL_SECONDS = float(os.getenv("COUNTER_FLUSH_INTERVAL_SECONDS", "5"))
+# Upper bound on ids per statement; larger backlogs flush in several statements
+COUNTER_FLUSH_BATCH_SIZE = int(os.getenv("COUNTER_FLUSH_BATCH_SIZE", "1000"))
+
+
+class CounterAggregator:
+    def __init__(self, interval: float = COUNTER_FLUSH_INTERVAL_SECONDS, batch_size: int = COUNTER_FLUSH_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        # Serialises flushes so a shutdown flush never races the timer thread
+        self._flush_lock = threading.Lock()
+        # book_id -> [views, favorites]
+        self._pending: dict[str, list[int]] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.last_error: str | None = None
+
+    def record_view(self, book_id: str, n: int = 1):
+        with self._lock:
+            self._pending.setdefault(book_id, [0, 0])[0] += n
+
+    def record_favorite(self, book_id: str, delta: int):
+        with self._lock:
+            self._pending.setdefault(book_id, [0, 0])[1] += delta
+
+    def _requeue(self, deltas: dict[str, list[int]]):
+        with self._lock:
+            for book_id, (views, favs) in deltas.items():
+                slot = self._pending.setdefault(book_id, [0, 0])
+                slot[0] += views
+                slot[1] += favs
+
+    @staticmethod
+    def _statement(deltas: dict[str, list[int]]):
+        views = {k: v for k, (v, _) in deltas.items() if v}
+        favs = {k: f for k, (_, f) in deltas.items() if f}
+        # Counters are not edits: pin updated_at so the mixin's onupdate (and
+        # MySQL's ON UPDATE CURRENT_TIMESTAMP) do not bump it and wake every
+        # updated_at watermark (search index, catalogue caches) on each flush
+        values = {Book.updated_at: Book.updated_at}
+        if views:
+            values[Book.view_count] = func.coalesce(Book.view_count, 0) + case(views, value=Book.id, else_=0)
+        if favs:
+            new_favs = func.coalesce(Book.favorite_count, 0) + case(favs, value=Book.id, else_=0)
+            # Never go negative, e.g. after an unfavorite of a pre-existing row
+            values[Book.favorite_count] = case((new_favs < 0, 0), else_=new_favs)
+        return update(Book).where(Book.id.in_(list(deltas))).values(values).execution_options(synchronize_session=False)
+
+    def flush(self) -> int:
+        """Write all pending deltas; return how many books were updated."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            pending = {k: d for k, d in pending.items() if d[0] or d[1]}
+            if not pending:
+                return 0
+            # Fixed id order so concurrent flushes from several workers lock rows alike
+            items = sorted(pending.items())
+            written = 0
+            db = SessionLocal()
+            try:
+                for i in range(0, len(items), self.batch_size):
+                    chunk = dict(items[i:i + self.batch_size])
+                    db.execute(self._statement(chunk))
+                    db.commit()
+                    written = i + len(chunk)
+                    # View counts may lag by the cache TTL; favorite counts should not
+                    for book_id, (_, favs) in chunk.items():
+                        if favs:
+                            response_cache.invalidate_book(book_id)
+            except Exception as e:
+                db.rollback()
+                self._requeue(dict(items[written:]))
+                self.last_error = str(e)
+                print("[WARN] counter flush failed:", e)
+            finally:
+                db.close()
+            self.flushes += 1
+            self.flushed_rows += written
+            return written
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="book-counter-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending_books": pending,
+            "flushes": self.flushes,
+            "flushed_rows": self.flushed_rows,
+            "last_error": self.last_error,
+            "interval_seconds": self.interval,
+        }
+
+
+book_counters = CounterAggregator()
+# Last chance for deltas if the process exits without running the shutdown hook
+atexit.register(book_counters.flush)
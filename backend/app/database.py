@@ -1,6 +1,11 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.orm import sessionmaker, DeclarativeBase, Session
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
+import itertools
 import os
+import threading
+import time
 from pathlib import Path
 
 # 加载 .env 文件（如果存在）
@@ -18,14 +23,147 @@ MYSQL_HOST = os.getenv("DB_HOST", "127.0.0.1")
 MYSQL_PORT = os.getenv("DB_PORT", "3306")
 MYSQL_DB = os.getenv("DB_NAME", "dhu_secondhand_platform")
 
-DATABASE_URL = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}?charset=utf8mb4"
+def _mysql_url(driver: str, host: str, port: str) -> str:
+    return f"mysql+{driver}://{MYSQL_USER}:{MYSQL_PASSWORD}@{host}:{port}/{MYSQL_DB}?charset=utf8mb4"
 
-engine = create_engine(DATABASE_URL, echo=False, future=True)
+def _split_host(entry: str) -> tuple[str, str]:
+    host, _, port = entry.strip().partition(':')
+    return host, port or MYSQL_PORT
+
+DATABASE_URL = _mysql_url("pymysql", MYSQL_HOST, MYSQL_PORT)
+# 异步驱动（aiomysql）；测试时可设置为 sqlite+aiosqlite:///...
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _mysql_url("aiomysql", MYSQL_HOST, MYSQL_PORT))
+# 只读副本：逗号分隔的 host[:port]，与主库共用账号和库名
+REPLICA_HOSTS = [_split_host(h) for h in os.getenv("DB_REPLICA_HOSTS", "").split(',') if h.strip()]
+
+# 连接池配置；pool_size + max_overflow 应覆盖单个 uvicorn worker 的并发
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# 小于 MySQL wait_timeout，避免使用已被服务端关闭的空闲连接
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+class PoolWaitMetrics:
+    """Time spent waiting for a pooled connection, per engine."""
+
+    BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+
+    def observe(self, name: str, wait_ms: float, failed: bool = False):
+        with self._lock:
+            st = self._stats.setdefault(name, {
+                "checkouts": 0, "failed": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0,
+                "buckets": {f"le_{b}ms": 0 for b in self.BUCKETS_MS} | {"inf": 0},
+            })
+            if failed:
+                st["failed"] += 1
+                return
+            st["checkouts"] += 1
+            st["total_wait_ms"] += wait_ms
+            st["max_wait_ms"] = max(st["max_wait_ms"], wait_ms)
+            for b in self.BUCKETS_MS:
+                if wait_ms <= b:
+                    st["buckets"][f"le_{b}ms"] += 1
+                    break
+            else:
+                st["buckets"]["inf"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = {}
+            for name, st in self._stats.items():
+                out[name] = dict(st, buckets=dict(st["buckets"]),
+                                 avg_wait_ms=round(st["total_wait_ms"] / st["checkouts"], 3) if st["checkouts"] else 0.0)
+            return out
+
+
+pool_metrics = PoolWaitMetrics()
+
+
+def _timed_pool(base):
+    class TimedPool(base):
+        metrics_name = "primary"
+
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                conn = super()._do_get()
+            except Exception:
+                pool_metrics.observe(self.metrics_name, 0.0, failed=True)
+                raise
+            pool_metrics.observe(self.metrics_name, (time.perf_counter() - start) * 1000)
+            return conn
+
+        def recreate(self):
+            new = super().recreate()
+            new.metrics_name = self.metrics_name
+            return new
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+TimedQueuePool = _timed_pool(QueuePool)
+TimedAsyncQueuePool = _timed_pool(AsyncAdaptedQueuePool)
+
+
+def _engine_kwargs(poolclass) -> dict:
+    return dict(
+        poolclass=poolclass,
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=POOL_PRE_PING,
+        pool_timeout=POOL_TIMEOUT,
+    )
+
+
+def _create_engine(url: str, name: str):
+    eng = create_engine(url, echo=False, future=True, **_engine_kwargs(TimedQueuePool))
+    eng.pool.metrics_name = name
+    return eng
+
+
+engine = _create_engine(DATABASE_URL, "primary")
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+replica_engines = [_create_engine(_mysql_url("pymysql", h, p), f"replica:{h}:{p}") for h, p in REPLICA_HOSTS]
+_replica_cycle = itertools.cycle(range(len(replica_engines))) if replica_engines else None
 
 class Base(DeclarativeBase):
     pass
 
+
+class RoutingSession(Session):
+    """Sends reads to a replica and everything else to the primary.
+
+    Once the session flushes or executes DML it stays pinned to the primary
+    for the rest of its life, so a request always reads its own writes.
+    """
+
+    def _primary(self):
+        return engine
+
+    def _replicas(self):
+        return replica_engines
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info['pinned_primary'] = True
+        replicas = self._replicas()
+        if self.info.get('pinned_primary') or not replicas:
+            return self._primary()
+        if 'replica' not in self.info:
+            self.info['replica'] = next(_replica_cycle)
+        return replicas[self.info['replica']]
+
+
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autoflush=False, autocommit=False)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -33,6 +171,72 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """Session for read-only endpoints; served by a replica when configured."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# The async engine is created lazily so Alembic and scripts/seed_data.py keep
+# working on the sync engine without the async driver installed.
+async_engine = None
+AsyncSessionLocal = None
+async_replica_engines: list = []
+AsyncReadSessionLocal = None
+
+
+class AsyncRoutingSession(RoutingSession):
+    # AsyncSession drives a sync Session underneath, which must bind to sync_engine
+    def _primary(self):
+        return async_engine.sync_engine
+
+    def _replicas(self):
+        return [e.sync_engine for e in async_replica_engines]
+
+
+def get_async_engine():
+    global async_engine, AsyncSessionLocal, async_replica_engines, AsyncReadSessionLocal
+    if async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        def _create_async(url: str, name: str):
+            eng = create_async_engine(url, echo=False, **_engine_kwargs(TimedAsyncQueuePool))
+            eng.sync_engine.pool.metrics_name = name
+            return eng
+
+        async_engine = _create_async(ASYNC_DATABASE_URL, "async:primary")
+        async_replica_engines = [_create_async(_mysql_url("aiomysql", h, p), f"async:replica:{h}:{p}") for h, p in REPLICA_HOSTS]
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        AsyncReadSessionLocal = async_sessionmaker(sync_session_class=AsyncRoutingSession, autoflush=False, expire_on_commit=False)
+    return async_engine
+
+async def get_async_db():
+    get_async_engine()
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db():
+    get_async_engine()
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+def pool_status() -> dict:
+    """Checkout-wait metrics plus the live state of every pool."""
+    engines = [engine, *replica_engines]
+    if async_engine is not None:
+        engines += [e.sync_engine for e in [async_engine, *async_replica_engines]]
+    pools = {getattr(e.pool, 'metrics_name', str(e.url)): e.pool for e in engines}
+    return {
+        "config": {
+            "pool_size": POOL_SIZE, "max_overflow": POOL_MAX_OVERFLOW, "recycle": POOL_RECYCLE,
+            "pre_ping": POOL_PRE_PING, "timeout": POOL_TIMEOUT, "replicas": len(REPLICA_HOSTS),
+        },
+        "pools": {name: p.status() for name, p in pools.items()},
+        "checkout_wait": pool_metrics.snapshot(),
+    }
+
 # 简单的连通性测试（仅在直接运行此模块时执行）
 if __name__ == "__main__":
     from sqlalchemy import text
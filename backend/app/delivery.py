@@ -0,0 +1,164 @@
+"""Delivery task lifecycle: handover codes, state transitions, duration estimates.
+
+A task moves ``accepted -> picked_up -> delivering -> delivered``, only by its
+courier:
+
+* ``picked_up`` needs the task's ``pickup_code``, which only the seller sees
+  (``GET /api/orders/{id}/delivery``), so the courier has the book in hand;
+* ``delivered`` needs the ``delivery_code``, which only the buyer sees.
+
+Both codes are generated when the task is created (:func:`new_code`). Each
+transition is a conditional ``UPDATE ... WHERE courier_id = ? AND status =
+<previous>``, so a repeated or concurrent request cannot apply twice. On
+delivery ``actual_duration`` (seconds from acceptance) is stored and the
+courier's ``completed_orders`` is incremented in the same transaction
+(``total_orders`` is incremented on assignment, see ``dispatch.assign``).
+
+:class:`DurationEstimator` keeps the last ``DELIVERY_ESTIMATE_WINDOW`` actual
+durations per pickup zone and fills ``estimated_duration`` of new tasks with
+their median; zones without history fall back to all zones, then to a
+travel-time guess. It is warmed from recently delivered tasks at startup and
+then updated in-process, so other workers' completions show up on restart.
+``/api/debug/delivery`` and the admin courier page list the per-zone figures.
+"""
+import collections
+import datetime
+import math
+import os
+import secrets
+import statistics
+import threading
+
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .dispatch import RIDING_SPEED_MPS, zone_map
+from .models.courier import Courier
+from .models.delivery_task import DeliveryTask, DeliveryTaskStatus
+
+DELIVERY_ESTIMATE_WINDOW = int(os.getenv("DELIVERY_ESTIMATE_WINDOW", "50"))
+# Zones need this many deliveries before their own median is trusted
+MIN_ZONE_SAMPLES = 5
+# Prior when nothing has been delivered yet: pickup + handover on both ends
+HANDLING_SECONDS = 600
+DEFAULT_ROUTE_METERS = 1000.0
+CODE_DIGITS = 6
+
+# new status -> (required current status, code column checked, timestamp column set)
+TRANSITIONS = {
+    DeliveryTaskStatus.picked_up: (DeliveryTaskStatus.accepted, "pickup_code", "picked_up_at"),
+    DeliveryTaskStatus.delivering: (DeliveryTaskStatus.picked_up, None, None),
+    DeliveryTaskStatus.delivered: (DeliveryTaskStatus.delivering, "delivery_code", "delivered_at"),
+}
+
+
+def new_code() -> str:
+    return f"{secrets.randbelow(10 ** CODE_DIGITS):0{CODE_DIGITS}d}"
+
+
+class DurationEstimator:
+    def __init__(self, window: int = DELIVERY_ESTIMATE_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._zones: dict[str | None, collections.deque] = {}
+        self._all: collections.deque = collections.deque(maxlen=window)
+
+    def record(self, pickup_location: str | None, seconds: int | None):
+        if seconds is None or seconds < 0:
+            return
+        zone = zone_map.zone_of(pickup_location)
+        with self._lock:
+            self._zones.setdefault(zone, collections.deque(maxlen=self.window)).append(seconds)
+            self._all.append(seconds)
+
+    def estimate(self, pickup_location: str | None, delivery_location: str | None) -> int:
+        """Expected seconds from acceptance to delivery."""
+        zone = zone_map.zone_of(pickup_location)
+        with self._lock:
+            samples = self._zones.get(zone)
+            if samples is not None and len(samples) >= MIN_ZONE_SAMPLES:
+                return int(statistics.median(samples))
+            if len(self._all) >= MIN_ZONE_SAMPLES:
+                return int(statistics.median(self._all))
+        start, end = zone_map.locate(pickup_location), zone_map.locate(delivery_location)
+        meters = math.dist(start, end) if start is not None and end is not None else DEFAULT_ROUTE_METERS
+        return int(HANDLING_SECONDS + meters / RIDING_SPEED_MPS)
+
+    def warm(self, db: Session):
+        """Load the most recent actual durations (one query)."""
+        rows = db.query(DeliveryTask.pickup_location, DeliveryTask.actual_duration).filter(
+            DeliveryTask.status == DeliveryTaskStatus.delivered,
+            DeliveryTask.actual_duration.isnot(None),
+        ).order_by(DeliveryTask.delivered_at.desc()).limit(self.window * max(len(zone_map.zones), 1)).all()
+        for row in reversed(rows):
+            self.record(row.pickup_location, row.actual_duration)
+
+    def stats(self) -> dict:
+        with self._lock:
+            def summary(samples):
+                ordered = sorted(samples)
+                return {
+                    "samples": len(ordered),
+                    "median_seconds": int(statistics.median(ordered)) if ordered else None,
+                    "p90_seconds": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))] if ordered else None,
+                }
+            return {
+                "window": self.window,
+                "all": summary(self._all),
+                "zones": {zone or "unknown": summary(s) for zone, s in sorted(self._zones.items(), key=lambda kv: kv[0] or "")},
+            }
+
+
+duration_estimator = DurationEstimator()
+
+
+def prepare_task(task: DeliveryTask):
+    """Fresh handover codes and a duration estimate for a new or re-opened task."""
+    task.pickup_code = new_code()
+    task.delivery_code = new_code()
+    task.estimated_duration = duration_estimator.estimate(task.pickup_location, task.delivery_location)
+
+
+def advance(db: Session, task_id: str, courier_id: str, new_status: DeliveryTaskStatus, code: str | None = None) -> DeliveryTask:
+    """Move ``task_id`` to ``new_status`` for its courier; the caller commits
+    (and, for ``delivered``, records the duration on :data:`duration_estimator`).
+
+    Raises ``HTTPException``: 404 unknown task, 403 someone else's task, 400
+    invalid transition or wrong code, 409 the task changed underneath.
+    """
+    if new_status not in TRANSITIONS:
+        raise HTTPException(status_code=400, detail="invalid status")
+    required, code_column, time_column = TRANSITIONS[new_status]
+    task = db.query(DeliveryTask).filter(DeliveryTask.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if task.courier_id != courier_id:
+        raise HTTPException(status_code=403, detail="不是你的配送任务")
+    if task.status != required:
+        raise HTTPException(status_code=400, detail=f"任务当前状态为 {task.status.value}，无法变更为 {new_status.value}")
+    if code_column is not None:
+        expected = getattr(task, code_column)
+        if not expected or not code or not secrets.compare_digest(expected, code.strip()):
+            raise HTTPException(status_code=400, detail="取件码错误" if code_column == "pickup_code" else "收货码错误")
+    now = datetime.datetime.utcnow()
+    values = {DeliveryTask.status: new_status}
+    if time_column is not None:
+        values[getattr(DeliveryTask, time_column)] = now
+    if new_status == DeliveryTaskStatus.delivered and task.accepted_at is not None:
+        values[DeliveryTask.actual_duration] = max(0, int((now - task.accepted_at).total_seconds()))
+    won = db.query(DeliveryTask).filter(
+        DeliveryTask.id == task_id,
+        DeliveryTask.courier_id == courier_id,
+        DeliveryTask.status == required,
+    ).update(values, synchronize_session=False)
+    if won != 1:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="任务状态已变化，请刷新")
+    if new_status == DeliveryTaskStatus.delivered:
+        db.query(Courier).filter(Courier.id == courier_id).update(
+            {Courier.completed_orders: func.coalesce(Courier.completed_orders, 0) + 1},
+            synchronize_session=False,
+        )
+    db.expire(task)
+    return task
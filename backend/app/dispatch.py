@@ -0,0 +1,464 @@
+"""Courier dispatch: assigns pending delivery tasks to nearby online couriers.
+
+Instead of every courier polling ``GET /api/delivery_tasks`` and racing to
+accept, couriers report presence (``PUT /api/couriers/me/presence``, every
+``DISPATCH_PRESENCE_TTL_SECONDS / 3`` or so) and the dispatcher assigns work:
+
+1. ``pickup_location`` strings are mapped to campus zones (:class:`ZoneMap`;
+   exact alias, then longest alias contained in the text, then ``lat,lng``);
+   couriers report a zone name or GPS position. Everything is projected onto
+   a local metre grid around the campus origin.
+2. Every ``DISPATCH_INTERVAL_SECONDS`` one query loads the approved couriers
+   seen within the TTL, one query their current load (active tasks), and one
+   the oldest ``DISPATCH_BATCH_SIZE`` unassigned pending tasks. Couriers go into
+   a :class:`GridIndex` (``DISPATCH_CELL_METERS`` buckets), so each task only
+   looks at couriers within ``DISPATCH_RADIUS_METERS``.
+3. Candidate (task, courier) pairs are scored by :func:`cost` -- travel time to
+   the pickup, plus a penalty per task already carried, plus a penalty per
+   rating point below 5, minus a bonus for how long the task has waited --
+   and assigned greedily cheapest-first with at most ``DISPATCH_MAX_LOAD``
+   active tasks per courier.
+4. Each assignment is a conditional ``UPDATE ... WHERE status = 'pending' AND
+   courier_id IS NULL``, so a task accepted by hand in the meantime is never
+   overwritten. Manual accepts (:func:`assign`) and "claim next"
+   (:func:`claim_next`) go through the same statement, so however many
+   couriers race for a task exactly one UPDATE matches.
+
+One worker per host dispatches (``flock`` on ``DISPATCH_LOCK_PATH``, as with
+the catalogue snapshot); several hosts are still safe because of step 4, at
+worst briefly exceeding ``DISPATCH_MAX_LOAD``. Run standalone with
+``python -m backend.app.dispatch``.
+"""
+import datetime
+import functools
+import json
+import math
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models.courier import Courier, CourierStatus
+from .models.delivery_task import DeliveryTask, DeliveryTaskStatus
+from .taskfeed import task_feed
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+DISPATCH_ENABLED = os.getenv("DISPATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+DISPATCH_INTERVAL_SECONDS = float(os.getenv("DISPATCH_INTERVAL_SECONDS", "3"))
+DISPATCH_BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", "200"))
+DISPATCH_MAX_LOAD = int(os.getenv("DISPATCH_MAX_LOAD", "3"))
+DISPATCH_RADIUS_METERS = float(os.getenv("DISPATCH_RADIUS_METERS", "3000"))
+DISPATCH_CELL_METERS = float(os.getenv("DISPATCH_CELL_METERS", "500"))
+DISPATCH_PRESENCE_TTL_SECONDS = float(os.getenv("DISPATCH_PRESENCE_TTL_SECONDS", "90"))
+# Pending tasks locked and ranked per "claim next" request
+DISPATCH_CLAIM_CANDIDATES = int(os.getenv("DISPATCH_CLAIM_CANDIDATES", "20"))
+DISPATCH_ZONES_FILE = os.getenv("DISPATCH_ZONES_FILE", "")
+DISPATCH_LOCK_PATH = Path(os.getenv("DISPATCH_LOCK_PATH", str(Path(__file__).resolve().parents[1] / "dispatch.lock")))
+
+# Cost weights, in seconds of courier travel
+RIDING_SPEED_MPS = 4.0
+LOAD_PENALTY_SECONDS = 240.0
+RATING_PENALTY_SECONDS = 120.0
+WAIT_BONUS_PER_MINUTE = 30.0
+MAX_WAIT_BONUS_SECONDS = 600.0
+# Assumed distance when a location cannot be placed on the map
+UNKNOWN_DISTANCE_METERS = 1500.0
+
+# Songjiang campus; zone positions are metres east (x) / north (y) of this point
+ORIGIN_LAT, ORIGIN_LNG = 31.0560, 121.2115
+_M_PER_DEG_LAT = 110_540.0
+_M_PER_DEG_LNG = 111_320.0 * math.cos(math.radians(ORIGIN_LAT))
+
+# name -> (x, y, aliases); override with DISPATCH_ZONES_FILE (same shape, JSON)
+DEFAULT_ZONES = {
+    "北门": (0, 900, ["北大门"]),
+    "南门": (0, -900, ["南大门", "正门"]),
+    "西门": (-800, 0, []),
+    "图书馆": (0, 150, ["图书馆前", "图书馆门口"]),
+    "行政楼": (0, -500, []),
+    "一教": (-250, -200, ["第一教学楼", "1教"]),
+    "二教": (250, -200, ["第二教学楼", "2教"]),
+    "三教": (-250, 350, ["第三教学楼", "3教"]),
+    "四教": (250, 350, ["第四教学楼", "4教"]),
+    "体育馆": (600, -350, ["体育场", "操场"]),
+    "大学生活动中心": (450, 150, ["活动中心", "学活"]),
+    "一餐": (-500, 500, ["第一食堂", "一食堂"]),
+    "二餐": (500, 550, ["第二食堂", "二食堂"]),
+    "三餐": (-450, -550, ["第三食堂", "三食堂"]),
+    "西区宿舍": (-650, 650, ["西区"]),
+    "东区宿舍": (650, 700, ["东区"]),
+    "南区宿舍": (-300, -750, ["南区"]),
+}
+
+_LATLNG = re.compile(r"^\s*(-?\d{1,2}\.\d+)\s*,\s*(-?\d{1,3}\.\d+)\s*$")
+
+
+def project(lat: float, lng: float) -> tuple[float, float]:
+    """GPS position -> metres east/north of the campus origin."""
+    return (lng - ORIGIN_LNG) * _M_PER_DEG_LNG, (lat - ORIGIN_LAT) * _M_PER_DEG_LAT
+
+
+class ZoneMap:
+    def __init__(self, zones: dict):
+        self.zones = {name: (float(z[0]), float(z[1])) for name, z in zones.items()}
+        aliases = {}
+        for name, z in zones.items():
+            aliases[name] = name
+            for alias in (z[2] if len(z) > 2 else []):
+                aliases[alias] = name
+        # Longest first, so "第一教学楼" wins over a shorter alias it contains
+        self._aliases = sorted(aliases.items(), key=lambda kv: -len(kv[0]))
+        self._exact = dict(aliases)
+        self.locate = functools.lru_cache(maxsize=4096)(self._locate)
+
+    @classmethod
+    def load(cls, path: str = DISPATCH_ZONES_FILE) -> "ZoneMap":
+        if path:
+            try:
+                return cls(json.loads(Path(path).read_text(encoding="utf-8")))
+            except Exception as e:
+                print("[WARN] Unable to load dispatch zones, using defaults:", e)
+        return cls(DEFAULT_ZONES)
+
+    def zone_of(self, text: str | None) -> str | None:
+        if not text:
+            return None
+        text = text.strip()
+        if text in self._exact:
+            return self._exact[text]
+        for alias, name in self._aliases:
+            if alias in text:
+                return name
+        return None
+
+    def nearest(self, pos: tuple[float, float], max_distance: float = 400.0) -> str | None:
+        """Name of the closest zone, if one is within ``max_distance`` metres."""
+        best = min(self.zones.items(), key=lambda kv: math.dist(pos, kv[1]), default=None)
+        if best is None or math.dist(pos, best[1]) > max_distance:
+            return None
+        return best[0]
+
+    def _locate(self, text: str | None) -> tuple[float, float] | None:
+        """Position of a free-text location, or None if it cannot be placed."""
+        zone = self.zone_of(text)
+        if zone is not None:
+            return self.zones[zone]
+        m = _LATLNG.match(text or "")
+        if m:
+            return project(float(m.group(1)), float(m.group(2)))
+        return None
+
+
+zone_map = ZoneMap.load()
+
+
+class CourierState:
+    __slots__ = ("id", "user_id", "pos", "rating", "load")
+
+    def __init__(self, id, user_id, pos, rating, load):
+        self.id = id
+        self.user_id = user_id
+        self.pos = pos
+        self.rating = float(rating if rating is not None else 5.0)
+        self.load = load
+
+
+class GridIndex:
+    """Uniform-grid spatial hash of courier positions."""
+
+    def __init__(self, cell: float = DISPATCH_CELL_METERS):
+        self.cell = cell
+        self._cells: dict[tuple[int, int], list[CourierState]] = {}
+        self.unplaced: list[CourierState] = []
+
+    def _key(self, x: float, y: float) -> tuple[int, int]:
+        return int(math.floor(x / self.cell)), int(math.floor(y / self.cell))
+
+    def add(self, courier: CourierState):
+        if courier.pos is None:
+            self.unplaced.append(courier)
+        else:
+            self._cells.setdefault(self._key(*courier.pos), []).append(courier)
+
+    def within(self, pos: tuple[float, float], radius: float):
+        """(courier, distance) for placed couriers within ``radius`` metres of ``pos``."""
+        cx, cy = self._key(*pos)
+        span = int(math.ceil(radius / self.cell))
+        for gx in range(cx - span, cx + span + 1):
+            for gy in range(cy - span, cy + span + 1):
+                for courier in self._cells.get((gx, gy), ()):
+                    d = math.dist(pos, courier.pos)
+                    if d <= radius:
+                        yield courier, d
+
+
+def cost(distance: float, courier: CourierState, waited_seconds: float) -> float:
+    wait_bonus = min(MAX_WAIT_BONUS_SECONDS, WAIT_BONUS_PER_MINUTE * waited_seconds / 60)
+    return (
+        distance / RIDING_SPEED_MPS
+        + LOAD_PENALTY_SECONDS * courier.load
+        + RATING_PENALTY_SECONDS * max(0.0, 5.0 - courier.rating)
+        - wait_bonus
+    )
+
+
+ACTIVE_STATUSES = (DeliveryTaskStatus.accepted, DeliveryTaskStatus.picked_up, DeliveryTaskStatus.delivering)
+
+
+def online_couriers(db: Session, now: datetime.datetime) -> list[CourierState]:
+    cutoff = now - datetime.timedelta(seconds=DISPATCH_PRESENCE_TTL_SECONDS)
+    rows = db.query(Courier.id, Courier.user_id, Courier.current_lat, Courier.current_lng, Courier.current_zone, Courier.rating).filter(
+        Courier.is_online.is_(True),
+        Courier.status == CourierStatus.approved,
+        Courier.last_online_time >= cutoff,
+    ).all()
+    if not rows:
+        return []
+    loads = dict(
+        db.query(DeliveryTask.courier_id, func.count())
+        .filter(DeliveryTask.courier_id.in_([r.id for r in rows]), DeliveryTask.status.in_(ACTIVE_STATUSES))
+        .group_by(DeliveryTask.courier_id)
+        .all()
+    )
+    return [CourierState(r.id, r.user_id, position(r), r.rating, loads.get(r.id, 0)) for r in rows]
+
+
+def position(courier) -> tuple[float, float] | None:
+    """Last reported position of a courier row: GPS if known, else its zone."""
+    if courier.current_lat is not None and courier.current_lng is not None:
+        return project(float(courier.current_lat), float(courier.current_lng))
+    return zone_map.zones.get(courier.current_zone)
+
+
+def courier_load(db: Session, courier_id: str) -> int:
+    return db.query(func.count(DeliveryTask.id)).filter(
+        DeliveryTask.courier_id == courier_id,
+        DeliveryTask.status.in_(ACTIVE_STATUSES),
+    ).scalar() or 0
+
+
+def plan(tasks: list, couriers: list[CourierState], now: datetime.datetime, max_load: int = DISPATCH_MAX_LOAD) -> list[tuple[str, str]]:
+    """Greedy cheapest-first matching; returns ``(task_id, courier_id)`` pairs."""
+    index = GridIndex()
+    for c in couriers:
+        if c.load < max_load:
+            index.add(c)
+    pairs = []
+    for t in tasks:
+        waited = (now - t.created_at).total_seconds() if t.created_at else 0.0
+        pos = zone_map.locate(t.pickup_location)
+        if pos is None:
+            candidates = [(c, UNKNOWN_DISTANCE_METERS) for c in couriers if c.load < max_load]
+        else:
+            candidates = list(index.within(pos, DISPATCH_RADIUS_METERS))
+            candidates += [(c, UNKNOWN_DISTANCE_METERS) for c in index.unplaced]
+        for c, d in candidates:
+            pairs.append((cost(d, c, waited), t.id, c))
+    pairs.sort(key=lambda p: p[0])
+    assigned_tasks: set[str] = set()
+    out = []
+    for _, task_id, c in pairs:
+        if task_id in assigned_tasks or c.load >= max_load:
+            continue
+        assigned_tasks.add(task_id)
+        c.load += 1
+        out.append((task_id, c.id))
+    return out
+
+
+def assign(db: Session, task_id: str, courier_id: str, now: datetime.datetime) -> bool:
+    """Hand ``task_id`` to ``courier_id`` unless someone took it first.
+
+    Also counts the task in the courier's ``total_orders``; ``completed_orders``
+    follows on delivery (see ``delivery.advance``).
+    """
+    won = db.query(DeliveryTask).filter(
+        DeliveryTask.id == task_id,
+        DeliveryTask.status == DeliveryTaskStatus.pending,
+        DeliveryTask.courier_id.is_(None),
+    ).update({
+        DeliveryTask.status: DeliveryTaskStatus.accepted,
+        DeliveryTask.courier_id: courier_id,
+        DeliveryTask.accepted_at: now,
+    }, synchronize_session=False)
+    if won != 1:
+        return False
+    db.query(Courier).filter(Courier.id == courier_id).update(
+        {Courier.total_orders: func.coalesce(Courier.total_orders, 0) + 1},
+        synchronize_session=False,
+    )
+    return True
+
+
+def claim_next(db: Session, courier: Courier, now: datetime.datetime | None = None, candidates: int = DISPATCH_CLAIM_CANDIDATES) -> str | None:
+    """Give ``courier`` the best pending task for them; returns its id, or None.
+
+    Reads the ``candidates`` oldest unassigned tasks with ``FOR UPDATE SKIP
+    LOCKED``, so couriers claiming at the same time each lock (and rank) a
+    disjoint set of rows instead of queueing on the same one, then claims the
+    cheapest by :func:`cost` with the same conditional UPDATE the dispatcher
+    uses. Databases without ``SKIP LOCKED`` (SQLite) fall back to trying the
+    ranked tasks in order until an UPDATE wins. The caller commits.
+    """
+    now = now or datetime.datetime.utcnow()
+    rows = db.query(DeliveryTask.id, DeliveryTask.pickup_location, DeliveryTask.created_at).filter(
+        DeliveryTask.status == DeliveryTaskStatus.pending,
+        DeliveryTask.courier_id.is_(None),
+    ).order_by(DeliveryTask.created_at, DeliveryTask.id).limit(candidates).with_for_update(skip_locked=True).all()
+    if not rows:
+        return None
+    state = CourierState(courier.id, courier.user_id, position(courier), courier.rating, 0)
+
+    def rank(t):
+        pos = zone_map.locate(t.pickup_location)
+        d = math.dist(pos, state.pos) if pos is not None and state.pos is not None else UNKNOWN_DISTANCE_METERS
+        return cost(d, state, (now - t.created_at).total_seconds() if t.created_at else 0.0)
+
+    for t in sorted(rows, key=rank):
+        if assign(db, t.id, courier.id, now):
+            return t.id
+    return None
+
+
+def dispatch_once(db: Session, now: datetime.datetime | None = None) -> list[tuple[str, str]]:
+    now = now or datetime.datetime.utcnow()
+    couriers = online_couriers(db, now)
+    if not couriers:
+        return []
+    # Oldest first, served by idx_delivery_tasks_status_created
+    tasks = db.query(DeliveryTask.id, DeliveryTask.pickup_location, DeliveryTask.created_at).filter(
+        DeliveryTask.status == DeliveryTaskStatus.pending,
+        DeliveryTask.courier_id.is_(None),
+    ).order_by(DeliveryTask.created_at, DeliveryTask.id).limit(DISPATCH_BATCH_SIZE).all()
+    if not tasks:
+        return []
+    done = [(t, c) for t, c in plan(tasks, couriers, now) if assign(db, t, c, now)]
+    db.commit()
+    task_feed.removed(*(t for t, _ in done))
+    return done
+
+
+class DispatchMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.assigned = 0
+        self.last_assigned = 0
+        self.last_duration_ms = 0.0
+        self.last_error: str | None = None
+        self.last_run_at: datetime.datetime | None = None
+
+    def record(self, assigned: int, duration_ms: float, error: str | None = None):
+        with self._lock:
+            self.runs += 1
+            self.assigned += assigned
+            self.last_assigned = assigned
+            self.last_duration_ms = duration_ms
+            self.last_error = error
+            self.last_run_at = datetime.datetime.utcnow()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "assigned": self.assigned,
+                "last_assigned": self.last_assigned,
+                "last_duration_ms": round(self.last_duration_ms, 3),
+                "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+                "last_error": self.last_error,
+                "interval_seconds": DISPATCH_INTERVAL_SECONDS,
+            }
+
+
+dispatch_metrics = DispatchMetrics()
+
+
+def run_once() -> list[tuple[str, str]]:
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        done = dispatch_once(db)
+    except Exception as e:
+        db.rollback()
+        dispatch_metrics.record(0, (time.perf_counter() - start) * 1000, error=str(e))
+        print("[WARN] dispatch run failed:", e)
+        return []
+    finally:
+        db.close()
+    dispatch_metrics.record(len(done), (time.perf_counter() - start) * 1000)
+    return done
+
+
+class Dispatcher:
+    """Background thread calling :func:`run_once` while it holds the host lock."""
+
+    def __init__(self, interval: float = DISPATCH_INTERVAL_SECONDS, lock_path: Path = DISPATCH_LOCK_PATH):
+        self.interval = interval
+        self.lock_path = lock_path
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    def _try_lead(self) -> bool:
+        if self._lock_file is not None or fcntl is None:
+            return True
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        f = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f
+        return True
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="courier-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            # Followers keep retrying so one takes over when the leader exits
+            if self._try_lead():
+                run_once()
+            self._stop.wait(self.interval)
+
+
+dispatcher = Dispatcher()
+
+
+if __name__ == "__main__":
+    print(f"[DISPATCH] running every {DISPATCH_INTERVAL_SECONDS}s (batch {DISPATCH_BATCH_SIZE}, max load {DISPATCH_MAX_LOAD})")
+    try:
+        while True:
+            done = run_once()
+            if done:
+                print(f"[DISPATCH] assigned {len(done)} tasks in {dispatch_metrics.last_duration_ms:.1f} ms")
+            time.sleep(DISPATCH_INTERVAL_SECONDS)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,176 @@
+"""Payment-expiry sweeper: cancels overdue pending orders and releases their books.
+
+Runs as a daemon thread inside the API process (started from the FastAPI
+startup hook) or standalone as a companion worker::
+
+    python -m backend.app.expiry
+
+Every statement is a bulk, conditional UPDATE, so several workers sweeping at
+the same time are harmless: an order is only cancelled while it is still
+pending, and only the orders a sweep actually cancelled release their book
+(while it is still reserved) and delivery task.
+"""
+import datetime
+import os
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models.order import Order, OrderStatus, PaymentStatus
+from .purchase import orders_released, release_orders
+
+SWEEP_INTERVAL_SECONDS = float(os.getenv("PAYMENT_SWEEP_INTERVAL_SECONDS", "30"))
+SWEEP_BATCH_SIZE = int(os.getenv("PAYMENT_SWEEP_BATCH_SIZE", "500"))
+SWEEPER_ENABLED = os.getenv("PAYMENT_SWEEPER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class SweepMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.total_swept = 0
+        self.last_swept = 0
+        self.last_duration_ms = 0.0
+        self.max_duration_ms = 0.0
+        self.last_run_at: datetime.datetime | None = None
+        self.last_error: str | None = None
+
+    def record(self, swept: int, duration_ms: float, error: str | None = None):
+        with self._lock:
+            self.runs += 1
+            self.total_swept += swept
+            self.last_swept = swept
+            self.last_duration_ms = duration_ms
+            self.max_duration_ms = max(self.max_duration_ms, duration_ms)
+            self.last_run_at = datetime.datetime.utcnow()
+            self.last_error = error
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "total_swept": self.total_swept,
+                "last_swept": self.last_swept,
+                "last_duration_ms": round(self.last_duration_ms, 3),
+                "max_duration_ms": round(self.max_duration_ms, 3),
+                "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+                "last_error": self.last_error,
+                "interval_seconds": SWEEP_INTERVAL_SECONDS,
+            }
+
+
+sweep_metrics = SweepMetrics()
+
+
+def _overdue(now: datetime.datetime):
+    # Served by idx_orders_status_due (status, payment_due_at)
+    return (
+        Order.status == OrderStatus.pending,
+        Order.payment_due_at.isnot(None),
+        Order.payment_due_at < now,
+        Order.payment_status == PaymentStatus.pending,
+    )
+
+
+def sweep_expired_orders(db: Session, now: datetime.datetime | None = None, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """Cancel every overdue pending order in batches; return how many were cancelled."""
+    # orders.cancelled_at is a TIMESTAMP (whole seconds); the re-select below
+    # compares against it, so the value written must be stored exactly
+    now = (now or datetime.datetime.utcnow()).replace(microsecond=0)
+    swept = 0
+    while True:
+        # SKIP LOCKED: rows another sweeper (or a payment) holds are left for
+        # the next pass instead of being waited on
+        rows = (
+            db.query(Order.id)
+            .filter(*_overdue(now))
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not rows:
+            break
+        candidate_ids = [r.id for r in rows]
+        cancelled = (
+            db.query(Order)
+            .filter(Order.id.in_(candidate_ids), *_overdue(now))
+            .update({
+                Order.status: OrderStatus.cancelled,
+                Order.payment_status: PaymentStatus.failed,
+                Order.cancelled_at: now,
+            }, synchronize_session=False)
+        )
+        # Only orders this UPDATE cancelled give up their book and task; one
+        # paid or changed since the SELECT keeps its reservation (the rows are
+        # locked, the cancelled_at match covers databases without SKIP LOCKED)
+        won = db.query(Order.id).filter(
+            Order.id.in_(candidate_ids), Order.status == OrderStatus.cancelled, Order.cancelled_at == now,
+        ).all()
+        order_ids = [r.id for r in won]
+        book_ids = release_orders(db, order_ids)
+        db.commit()
+        orders_released(order_ids, book_ids)
+        swept += cancelled
+        if len(rows) < batch_size:
+            break
+    return swept
+
+
+def run_once() -> int:
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        swept = sweep_expired_orders(db)
+    except Exception as e:
+        db.rollback()
+        sweep_metrics.record(0, (time.perf_counter() - start) * 1000, error=str(e))
+        print("[WARN] payment expiry sweep failed:", e)
+        return 0
+    finally:
+        db.close()
+    sweep_metrics.record(swept, (time.perf_counter() - start) * 1000)
+    return swept
+
+
+class ExpirySweeper:
+    """Background thread calling :func:`run_once` every ``interval`` seconds."""
+
+    def __init__(self, interval: float = SWEEP_INTERVAL_SECONDS):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="payment-expiry-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            run_once()
+            self._stop.wait(self.interval)
+
+
+expiry_sweeper = ExpirySweeper()
+
+
+if __name__ == "__main__":
+    print(f"[SWEEPER] running every {SWEEP_INTERVAL_SECONDS}s (batch {SWEEP_BATCH_SIZE})")
+    try:
+        while True:
+            swept = run_once()
+            if swept:
+                print(f"[SWEEPER] cancelled {swept} overdue orders in {sweep_metrics.last_duration_ms:.1f} ms")
+            time.sleep(SWEEP_INTERVAL_SECONDS)
+    except KeyboardInterrupt:
+        pass
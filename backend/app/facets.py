@@ -0,0 +1,268 @@
+"""Facet counts for the book list (condition, price range, year, category).
+
+Instead of a ``GROUP BY`` per request, every available book contributes one
+count to a cell keyed by ``(condition, price bucket, publish year,
+category)``. The number of occupied cells depends on how varied the catalogue
+is, not on its size, so computing all four facets for a request is a pass
+over a few hundred cells. Counts are disjunctive: each facet ignores its own
+selection and honours the others, so ticking "良好" still shows how many
+books the other conditions would add.
+
+The cells are kept current incrementally:
+
+* ORM flushes of ``Book`` rows are collected per session and applied on
+  commit (a rollback discards them), which covers create, edit, status
+  changes and deletes made through this process;
+* bulk ``UPDATE`` statements (purchase claims, the expiry sweeper) and
+  writes from other workers are picked up by :meth:`FacetIndex.catch_up_async`,
+  an ``updated_at`` watermark query at most every ``CATCH_UP_INTERVAL_SECONDS``;
+* a book hard-deleted by another worker never shows up in that query, so
+  every ``FACET_FULL_REBUILD_SECONDS`` the catch-up reloads all available
+  books instead and swaps the new cells in whole.
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import and_, event, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .catalog import CONDITIONS
+from .models.book import Book, BookStatus, ConditionLevel
+
+CATCH_UP_INTERVAL_SECONDS = 5.0
+FACET_FULL_REBUILD_SECONDS = float(os.getenv("FACET_FULL_REBUILD_SECONDS", "600"))
+# Lower bound inclusive, upper bound exclusive, in yuan; None = open ended
+PRICE_BUCKETS = {"0-10": (0, 10), "10-20": (10, 20), "20-50": (20, 50), "50-100": (50, 100), "100-": (100, None)}
+DIMENSIONS = ("condition", "price", "publish_year", "category")
+
+
+def price_bucket(price) -> str | None:
+    for key, (low, high) in PRICE_BUCKETS.items():
+        if price >= low and (high is None or price < high):
+            return key
+    return None
+
+
+def facet_key(book) -> tuple:
+    condition = book.condition_level.value if isinstance(book.condition_level, ConditionLevel) else book.condition_level
+    return (condition, price_bucket(book.selling_price), book.publish_year, book.category_id)
+
+
+class Facets(BaseModel):
+    condition: dict[str, int] = {}
+    price: dict[str, int] = {}
+    publish_year: dict[str, int] = {}
+    category: dict[str, int] = {}
+
+
+class FacetFilter:
+    """Selected facet values; ``None`` for a facet means no restriction."""
+
+    def __init__(self, conditions=None, prices=None, years=None, categories=None):
+        self.selected = (conditions, prices, years, categories)
+
+    @classmethod
+    def parse(cls, condition: str | None = None, price: str | None = None, publish_year: str | None = None, category_ids=None) -> "FacetFilter":
+        def split(value):
+            items = {v.strip() for v in (value or "").split(",") if v.strip()}
+            return items or None
+
+        conditions = split(condition)
+        if conditions and not conditions <= {c.value for c in ConditionLevel}:
+            raise HTTPException(status_code=400, detail="Invalid condition filter")
+        prices = split(price)
+        if prices and not prices <= PRICE_BUCKETS.keys():
+            raise HTTPException(status_code=400, detail="Invalid price filter")
+        years = split(publish_year)
+        if years:
+            try:
+                years = {int(y) for y in years}
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid publish_year filter")
+        categories = set(category_ids) if category_ids else None
+        return cls(conditions, prices, years, categories)
+
+    @property
+    def active(self) -> bool:
+        return any(s is not None for s in self.selected)
+
+    def matches(self, key: tuple, skip: int | None = None) -> bool:
+        return all(s is None or i == skip or key[i] in s for i, s in enumerate(self.selected))
+
+    def sql_conditions(self) -> list:
+        conditions, prices, years, categories = self.selected
+        out = []
+        if conditions:
+            out.append(Book.condition_level.in_([ConditionLevel(c) for c in conditions]))
+        if prices:
+            ranges = []
+            for key in prices:
+                low, high = PRICE_BUCKETS[key]
+                ranges.append(Book.selling_price >= low if high is None else and_(Book.selling_price >= low, Book.selling_price < high))
+            out.append(or_(*ranges))
+        if years:
+            out.append(Book.publish_year.in_(years))
+        if categories:
+            out.append(Book.category_id.in_(categories))
+        return out
+
+    def snapshot_predicate(self):
+        """Row test over the catalogue snapshot columns (category is handled by its index)."""
+        conditions, prices, years, _ = self.selected
+        if not (conditions or prices or years):
+            return None
+        cond_idx = {i for i, c in enumerate(CONDITIONS) if c.value in conditions} if conditions else None
+        cents = [(low * 100, high * 100 if high is not None else None) for low, high in (PRICE_BUCKETS[k] for k in prices)] if prices else None
+
+        def predicate(snap, i):
+            if cond_idx is not None and snap.condition[i] not in cond_idx:
+                return False
+            if years is not None and snap.year[i] not in years:
+                return False
+            if cents is not None:
+                p = snap.price[i]
+                return any(p >= low and (high is None or p < high) for low, high in cents)
+            return True
+
+        return predicate
+
+
+class FacetIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: dict[str, tuple] = {}
+        self._cells: Counter = Counter()
+        self.watermark = None
+        self._last_catch_up = 0.0
+        self._last_full = 0.0
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _set_locked(self, book_id: str, key: tuple | None):
+        old = self._keys.pop(book_id, None)
+        if old is not None:
+            self._cells[old] -= 1
+            if not self._cells[old]:
+                del self._cells[old]
+        if key is not None:
+            self._keys[book_id] = key
+            self._cells[key] += 1
+
+    def apply(self, changes: dict[str, tuple | None]):
+        """book id -> facet key, or None once the book is no longer available."""
+        with self._lock:
+            for book_id, key in changes.items():
+                self._set_locked(book_id, key)
+
+    def upsert(self, book):
+        self.apply({book.id: facet_key(book) if book.status == BookStatus.available else None})
+        updated_at = getattr(book, "updated_at", None)
+        if updated_at and (self.watermark is None or updated_at > self.watermark):
+            self.watermark = updated_at
+
+    def remove(self, book_id: str):
+        self.apply({book_id: None})
+
+    def _changed_rows_stmt(self, full: bool):
+        stmt = select(Book.id, Book.status, Book.condition_level, Book.selling_price, Book.publish_year, Book.category_id, Book.updated_at)
+        if full:
+            return stmt.where(Book.status == BookStatus.available)
+        return stmt.where(Book.updated_at >= self.watermark)
+
+    def _full_due(self) -> bool:
+        return self.watermark is None or time.monotonic() - self._last_full >= FACET_FULL_REBUILD_SECONDS
+
+    def _load(self, rows, full: bool):
+        if not full:
+            for row in rows:
+                self.upsert(row)
+            return
+        # Built aside and swapped in, so requests never see a half-loaded index
+        keys = {row.id: facet_key(row) for row in rows}
+        cells = Counter(keys.values())
+        with self._lock:
+            self._keys, self._cells = keys, cells
+        self.watermark = max((row.updated_at for row in rows if row.updated_at), default=None)
+        self._last_full = time.monotonic()
+
+    def _catch_up_due(self, force: bool) -> bool:
+        now = time.monotonic()
+        if not force and now - self._last_catch_up < CATCH_UP_INTERVAL_SECONDS:
+            return False
+        self._last_catch_up = now
+        return True
+
+    def rebuild(self, db: Session):
+        self._load(db.execute(self._changed_rows_stmt(full=True)).all(), full=True)
+        self._last_catch_up = time.monotonic()
+
+    async def catch_up_async(self, db: AsyncSession, force: bool = False):
+        if not self._catch_up_due(force):
+            return
+        full = self._full_due()
+        self._load((await db.execute(self._changed_rows_stmt(full))).all(), full)
+
+    def counts(self, selected: FacetFilter, book_ids=None, lineage=None) -> Facets:
+        """Facet counts over all available books, or only over ``book_ids`` (search hits).
+
+        ``lineage(category_id)`` lists a category and its ancestors; each book
+        then also counts towards every parent category, matching the subtree
+        filter ``list_books`` applies.
+        """
+        with self._lock:
+            if book_ids is None:
+                cells = list(self._cells.items())
+            else:
+                cells = Counter(self._keys[i] for i in book_ids if i in self._keys).items()
+        out = [Counter() for _ in DIMENSIONS]
+        category = DIMENSIONS.index("category")
+        for key, n in cells:
+            for dim in range(len(DIMENSIONS)):
+                if key[dim] is None or not selected.matches(key, skip=dim):
+                    continue
+                if dim == category and lineage is not None:
+                    for cat in lineage(key[dim]):
+                        out[dim][str(cat)] += n
+                else:
+                    out[dim][str(key[dim])] += n
+        return Facets(**{name: dict(c) for name, c in zip(DIMENSIONS, out)})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"books": len(self._keys), "cells": len(self._cells), "watermark": self.watermark.isoformat() if self.watermark else None}
+
+
+facet_index = FacetIndex()
+
+_PENDING = "facet_changes"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_book_changes(session, flush_context):
+    pending = session.info.setdefault(_PENDING, {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Book):
+            # A new row may not have its column default loaded yet
+            available = obj.status in (None, BookStatus.available)
+            pending[obj.id] = facet_key(obj) if available and obj.selling_price is not None else None
+    for obj in session.deleted:
+        if isinstance(obj, Book):
+            pending[obj.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_book_changes(session):
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        facet_index.apply(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_book_changes(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,202 @@
+"""Resized WebP variants of uploaded images.
+
+Every upload gets ``<name>.thumb.webp`` (list cards) and ``<name>.medium.webp``
+(detail page) written next to the original. Resizing runs in a process pool
+so decoding large phone photos never holds the GIL of an API worker; uploads
+only enqueue work and return immediately.
+
+Which variants of a cover exist is recorded on ``books.cover_variants`` when
+they are rendered (upload callback) or when a book is saved with a cover
+(:func:`rendered_variants`), so serializing a book never touches the disk.
+Files uploaded before this existed can be processed, and every book's
+``cover_variants`` refreshed, with::
+
+    python -m backend.app.images --backfill
+
+Pillow is optional: without it variants are skipped and the ``cover_*``
+URLs on ``BookOut`` stay null, so clients fall back to the original.
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models.book import Book
+from .uploads import UPLOAD_DIR
+
+# name -> longest edge in pixels (2x the largest CSS size it is shown at)
+VARIANTS = {"thumb": 240, "medium": 800}
+WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+UPLOAD_URL_PREFIX = "/uploads/"
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+
+def is_variant(path: Path) -> bool:
+    return any(path.name.endswith(f".{name}.webp") for name in VARIANTS)
+
+
+def variant_path(original: Path, name: str) -> Path:
+    return original.with_name(f"{original.stem}.{name}.webp")
+
+
+def _upload_path(url: str | None) -> Path | None:
+    if not url or not url.startswith(UPLOAD_URL_PREFIX):
+        return None
+    return UPLOAD_DIR / url[len(UPLOAD_URL_PREFIX):]
+
+
+def variant_url(url: str | None, name: str, rendered: str | None) -> str | None:
+    """URL of variant ``name`` of an ``/uploads/...`` image, if ``rendered``
+    (the ``cover_variants`` value) lists it. Never touches the disk."""
+    original = _upload_path(url)
+    if original is None or not rendered or name not in rendered.split(","):
+        return None
+    return UPLOAD_URL_PREFIX + variant_path(original, name).relative_to(UPLOAD_DIR).as_posix()
+
+
+def rendered_variants(url: str | None) -> str | None:
+    """``cover_variants`` value for ``url``, from the disk; for write paths only."""
+    original = _upload_path(url)
+    if original is None:
+        return None
+    names = [name for name in VARIANTS if variant_path(original, name).is_file()]
+    return ",".join(names) or None
+
+
+def record_variants(db: Session, url: str) -> list[str]:
+    """Store the rendered variants on every book using ``url`` as its cover;
+    returns their ids. The caller commits."""
+    book_ids = [row.id for row in db.query(Book.id).filter(Book.cover_image == url)]
+    if book_ids:
+        db.query(Book).filter(Book.id.in_(book_ids)).update(
+            {Book.cover_variants: rendered_variants(url)}, synchronize_session=False
+        )
+    return book_ids
+
+
+def render_variants(src: str, force: bool = False) -> list[str]:
+    """Write all variants of ``src``; runs inside a pool process."""
+    original = Path(src)
+    todo = {n: e for n, e in VARIANTS.items() if force or not variant_path(original, n).exists()}
+    if not todo:
+        return []
+    written = []
+    with Image.open(original) as im:
+        im = ImageOps.exif_transpose(im)
+        im = im.convert("RGBA" if im.mode in ("RGBA", "LA", "P") else "RGB")
+        for name, edge in todo.items():
+            out = im.copy()
+            out.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            dest = variant_path(original, name)
+            tmp = dest.with_name(dest.name + ".part")
+            out.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(tmp, dest)
+            written.append(dest.name)
+    return written
+
+
+class ImageWorker:
+    """Lazily started process pool that renders variants in the background."""
+
+    def __init__(self, workers: int = IMAGE_WORKERS):
+        self.workers = workers
+        self._pool: ProcessPoolExecutor | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return Image is not None and self.workers > 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def submit(self, path: Path, on_done=None):
+        """Render ``path`` in the pool; ``on_done(path)`` runs once the files
+        are written (in a pool management thread)."""
+        if not self.enabled:
+            return None
+        future = self._executor().submit(render_variants, str(path))
+        future.add_done_callback(_finished(path, on_done))
+        return future
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+def _finished(path: Path, on_done):
+    def callback(future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            print(f"[WARN] image variants failed for {path.name}:", future.exception())
+            return
+        if on_done is not None:
+            try:
+                on_done(path)
+            except Exception as e:
+                print(f"[WARN] recording image variants failed for {path.name}:", e)
+    return callback
+
+
+image_worker = ImageWorker()
+
+
+def originals(root: Path = UPLOAD_DIR):
+    for path in root.rglob("*"):
+        if path.is_file() and not path.name.startswith(".") and path.suffix != ".part" and ".tmp" not in path.parts and not is_variant(path):
+            yield path
+
+
+def refresh_cover_variants(db: Session) -> int:
+    """Recompute ``cover_variants`` for every book with an uploaded cover;
+    returns how many rows changed."""
+    changed = 0
+    rows = db.query(Book.id, Book.cover_image, Book.cover_variants).filter(Book.cover_image.startswith(UPLOAD_URL_PREFIX)).all()
+    for row in rows:
+        rendered = rendered_variants(row.cover_image)
+        if rendered != row.cover_variants:
+            db.query(Book).filter(Book.id == row.id).update({Book.cover_variants: rendered}, synchronize_session=False)
+            changed += 1
+    db.commit()
+    return changed
+
+
+def backfill(force: bool = False) -> int:
+    if Image is None:
+        raise SystemExit("Pillow is required: pip install Pillow")
+    done = 0
+    with ProcessPoolExecutor(max_workers=max(IMAGE_WORKERS, 1)) as pool:
+        futures = {pool.submit(render_variants, str(p), force): p for p in originals()}
+        for future, path in futures.items():
+            try:
+                if future.result():
+                    done += 1
+            except Exception as e:
+                print(f"[WARN] skipped {path.name}:", e)
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate resized WebP variants for uploaded images")
+    parser.add_argument("--backfill", action="store_true", help="process every existing upload")
+    parser.add_argument("--force", action="store_true", help="re-render variants that already exist")
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do; pass --backfill")
+    print(f"[IMAGES] generated variants for {backfill(args.force)} files in {UPLOAD_DIR}")
+    db = SessionLocal()
+    try:
+        print(f"[IMAGES] updated cover_variants of {refresh_cover_variants(db)} books")
+    finally:
+        db.close()
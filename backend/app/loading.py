@@ -0,0 +1,57 @@
+"""Named loader options for endpoints that render related rows.
+
+Relationships default to lazy loading, so touching ``favorite.book`` or
+``order.buyer.name`` inside a loop issues one SELECT per row. Endpoints that
+need related data pick one of these option sets instead:
+
+* ``selectinload`` for collections and for parents that are wide or shared
+  (one extra ``WHERE id IN (...)`` per relationship, whatever the page size);
+* ``joinedload`` for narrow many-to-one lookups such as a user's name;
+* ``load_only`` so list pages do not pull ``description``/``gallery_images``
+  for rows they only show a title for;
+* ``raiseload('*')`` last, so a template or schema that starts touching a
+  relationship nobody loaded fails loudly instead of quietly going N+1.
+
+``scripts/check_query_counts.py`` checks the resulting statement counts stay
+flat as rows are added.
+"""
+from sqlalchemy.orm import joinedload, load_only, raiseload, selectinload
+
+from .models.book import Book
+from .models.favorite import Favorite
+from .models.order import Order
+from .models.review import Review
+from .models.user import User
+
+
+def user_name(relationship):
+    """Join a many-to-one ``User`` relationship, loading only its name."""
+    return joinedload(relationship).load_only(User.id, User.name)
+
+
+# /api/me/favorites: the full book card plus the seller's name
+FAVORITE_LIST = (
+    selectinload(Favorite.book).options(user_name(Book.seller)),
+    raiseload("*"),
+)
+
+# /api/books/{id}/reviews: reviewer name (hidden again for anonymous reviews)
+REVIEW_LIST = (
+    user_name(Review.reviewer),
+    raiseload("*"),
+)
+
+# /admin: only the columns in the table, plus the seller
+ADMIN_BOOK_LIST = (
+    load_only(Book.id, Book.title, Book.author, Book.isbn, Book.selling_price, Book.status, Book.seller_id, Book.created_at),
+    user_name(Book.seller),
+    raiseload("*"),
+)
+
+# /admin/orders: book title and both parties' names
+ADMIN_ORDER_LIST = (
+    joinedload(Order.book).load_only(Book.id, Book.title),
+    user_name(Order.buyer),
+    user_name(Order.seller),
+    raiseload("*"),
+)
@@ -1,24 +1,53 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, Form, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, Request, Form, Query, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from jinja2 import Environment, FileSystemLoader, select_autoescape
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator, computed_field
 from typing import List
-from .database import get_db, Base, engine, SessionLocal
+from .database import get_db, get_read_db, get_async_db, get_async_read_db, pool_status, Base, engine, SessionLocal
 from sqlalchemy.orm import Session
-from sqlalchemy import text, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import text, and_, select, func
+from sqlalchemy.exc import IntegrityError
 from .models.book import Book, ConditionLevel, BookStatus
 from .models.user import User
 from .models.order import Order, OrderStatus, DeliveryMethod, PaymentMethod, PaymentStatus
 from .models.delivery_task import DeliveryTask, DeliveryTaskStatus
 from .models.favorite import Favorite
 from .models.review import Review, ReviewRole
+from .search import search_index, FIELD_WEIGHTS
+from .pagination import Page, paginate, paginate_async, paginate_ranked_async, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from .expiry import expiry_sweeper, sweep_metrics, SWEEPER_ENABLED
+from .sessions import session_store, user_cache
+from .schema import ensure_schema, boot_info
+from .response_cache import response_cache, json_response, list_cache_key, LIST_TAG
+from .counters import book_counters
+from .purchase import place_order, release_orders, orders_released, PAYMENT_WINDOW_MINUTES
+from .uploads import UPLOAD_DIR, receive_image
+from .images import image_worker, variant_url, rendered_variants, record_variants
+from .blobs import book_image_urls, release as release_blobs
+from .upload_serving import upload_files
+from .catalog import catalog_snapshot
+from .facets import facet_index, FacetFilter, Facets
+from .categories import category_tree
+from .models.category import BookCategory
+from .loading import FAVORITE_LIST, REVIEW_LIST, ADMIN_BOOK_LIST, ADMIN_ORDER_LIST, user_name
+from .querycount import QueryCountMiddleware, DEBUG_QUERY_COUNT
+from .chat import chat_service
+from .models.chat import ChatSession, ChatMessage, MessageType
+from .models.courier import Courier, CourierStatus
+from .taskfeed import task_feed
+from .reputation import record_review, transition_order
+from .delivery import advance, duration_estimator, prepare_task
+from .dispatch import dispatcher, dispatch_metrics, zone_map, project, assign, claim_next, courier_load, ACTIVE_STATUSES, DISPATCH_ENABLED, DISPATCH_MAX_LOAD
 import os
 from pathlib import Path
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.staticfiles import StaticFiles
 import hashlib, uuid, datetime, secrets
 import json
+import time
+
+_BOOT_STARTED = time.perf_counter()
 
 app = FastAPI(title="DHU Secondhand Books API", version="0.2.1")
 
@@ -29,9 +58,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Create tables if not exist for MVP simplicity (in production use alembic)
-Base.metadata.create_all(bind=engine)
+if DEBUG_QUERY_COUNT:
+    app.add_middleware(QueryCountMiddleware)
 
 class BookOut(BaseModel):
     id: str
@@ -41,11 +69,14 @@ class BookOut(BaseModel):
     publisher: str | None = None
     publish_year: int | None = None
     edition: str | None = None
+    category_id: int | None = None
     original_price: float
     selling_price: float
     condition_level: ConditionLevel
     description: str | None = None
     cover_image: str | None = None
+    # Which variants exist, recorded when they were rendered; not serialized
+    cover_variants: str | None = Field(default=None, exclude=True)
     gallery_images: list[str] | None = None
     seller_id: str
     status: BookStatus
@@ -55,6 +86,23 @@ class BookOut(BaseModel):
     class Config:
         from_attributes = True
 
+    @field_validator('gallery_images', mode='before')
+    @classmethod
+    def _parse_gallery(cls, v):
+        # Stored as a JSON string on the ORM row
+        return json.loads(v or '[]') if isinstance(v, str) or v is None else v
+
+    # Resized WebP variants (see images.py); null until generated or for external URLs
+    @computed_field
+    @property
+    def cover_thumb(self) -> str | None:
+        return variant_url(self.cover_image, 'thumb', self.cover_variants)
+
+    @computed_field
+    @property
+    def cover_medium(self) -> str | None:
+        return variant_url(self.cover_image, 'medium', self.cover_variants)
+
 class BookCreate(BaseModel):
     isbn: str
     title: str
@@ -62,6 +110,7 @@ class BookCreate(BaseModel):
     publisher: str | None = None
     publish_year: int | None = None
     edition: str | None = None
+    category_id: int | None = None
     original_price: float
     selling_price: float
     condition_level: ConditionLevel
@@ -82,10 +131,23 @@ class UserOut(BaseModel):
     name: str
     phone: str
     credit_score: int
+    positive_reviews: int | None = 0
+    negative_reviews: int | None = 0
+    total_transactions: int | None = 0
 
     class Config:
         from_attributes = True
 
+class ReputationOut(BaseModel):
+    id: str
+    name: str
+    credit_score: int | None = None
+    positive_reviews: int | None = 0
+    negative_reviews: int | None = 0
+    total_transactions: int | None = 0
+    courier_rating: float | None = None
+    courier_reviews: int | None = None
+
 class UserListOut(BaseModel):
     id: str
     student_id: str
@@ -151,6 +213,7 @@ class BookUpdate(BaseModel):
     publisher: str | None = None
     publish_year: int | None = None
     edition: str | None = None
+    category_id: int | None = None
     original_price: float | None = None
     selling_price: float | None = None
     condition_level: ConditionLevel | None = None
@@ -178,19 +241,14 @@ class AuthToken(BaseModel):
     student_id: str
     name: str
 
-# Simple in-memory token store for MVP
-TOKEN_STORE: dict[str, dict] = {}
 security = HTTPBearer()
 
 TEMPLATE_DIR = Path(__file__).parent / 'templates'
-UPLOAD_DIR = Path(__file__).resolve().parents[1] / 'uploads'
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 _env = Environment(loader=FileSystemLoader(str(TEMPLATE_DIR)), autoescape=select_autoescape(['html','xml']))
 
 # Serve uploaded assets
-app.mount('/uploads', StaticFiles(directory=str(UPLOAD_DIR)), name='uploads')
+app.mount('/uploads', upload_files, name='uploads')
 
-PAYMENT_WINDOW_MINUTES = int(os.getenv("PAYMENT_WINDOW_MINUTES", "15"))
 
 @app.get("/")
 def root():
@@ -198,7 +256,7 @@ def root():
 
 @app.get("/api/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "detail": boot_info}
 
 @app.post("/api/users", response_model=UserOut)
 def create_user(payload: UserCreate, db: Session = Depends(get_db)):
@@ -218,45 +276,87 @@ def create_user(payload: UserCreate, db: Session = Depends(get_db)):
     db.refresh(user)
     return user
 
-@app.get("/api/books", response_model=List[BookOut])
-def list_books(q: str | None = None, category_id: int | None = None, include_status: str | None = None, db: Session = Depends(get_db)):
-    query = db.query(Book)
+# Book fields that decide which list pages a book appears on (and the facet counts)
+_LIST_MEMBERSHIP_FIELDS = {'status', 'category_id', 'isbn', 'selling_price', 'condition_level', 'publish_year', *FIELD_WEIGHTS}
+
+class BookListPage(Page[BookOut]):
+    # Only for lists of available books; null when other statuses are requested
+    facets: Facets | None = None
+
+def _check_category(db: Session, category_id: int | None):
+    if category_id is not None and not db.query(BookCategory.id).filter(BookCategory.id == category_id).first():
+        raise HTTPException(status_code=400, detail="Category not found")
+
+@app.get("/api/books", response_model=BookListPage)
+async def list_books(request: Request, q: str | None = None, category_id: int | None = None, include_status: str | None = None, condition: str | None = None, price: str | None = None, publish_year: str | None = None, cursor: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_async_read_db)):
+    if await category_tree.refresh_async(db):
+        # Pages filtered by a category may now cover a different subtree
+        response_cache.invalidate_tag(LIST_TAG)
+    key = list_cache_key(q=q, category_id=category_id, include_status=include_status, condition=condition, price=price, publish_year=publish_year, cursor=cursor, limit=limit)
+    entry = response_cache.get(key)
+    if entry is not None:
+        return json_response(request, entry)
+    generation = response_cache.generation
+    stmt = select(Book)
     if not include_status:
-        query = query.filter(Book.status == BookStatus.available)
+        stmt = stmt.where(Book.status == BookStatus.available)
     else:
         try:
             statuses = [BookStatus[s.strip()] for s in include_status.split(',') if s.strip()]
             if statuses:
-                query = query.filter(Book.status.in_(statuses))
+                stmt = stmt.where(Book.status.in_(statuses))
         except KeyError:
             raise HTTPException(status_code=400, detail="Invalid status filter")
-    if q:
-        like = f"%{q}%"
-        query = query.filter((Book.title.ilike(like)) | (Book.author.ilike(like)) | (Book.isbn.ilike(like)))
-    if category_id:
-        query = query.filter(Book.category_id == category_id)
-    books = query.order_by(Book.created_at.desc()).limit(50).all()
-    return [
-        BookOut(
-            **{**b.__dict__, 'gallery_images': json.loads(b.gallery_images or '[]')}
-        )
-        for b in books
-    ]
+    # A category includes all of its subcategories
+    category_ids = category_tree.subtree_ids(category_id) if category_id else None
+    selected = FacetFilter.parse(condition, price, publish_year, category_ids)
+    stmt = stmt.where(*selected.sql_conditions())
+    available_only = include_status in (None, '', 'available')
+    if available_only:
+        await facet_index.catch_up_async(db)
+    ranked_ids = None
+    snapshot_page = None
+    if not q and available_only:
+        snapshot_page = await catalog_snapshot.page(db, cursor, limit, category_ids=category_ids, predicate=selected.snapshot_predicate())
+    if snapshot_page is not None:
+        books, next_cursor = snapshot_page
+    elif q:
+        # Search results are ordered by relevance; the cursor is a rank position
+        await search_index.catch_up_async(db)
+        ranked_ids = search_index.search(q)
+        books, next_cursor = await paginate_ranked_async(db, stmt, Book, ranked_ids, cursor, limit)
+    else:
+        books, next_cursor = await paginate_async(db, stmt, Book, cursor, limit)
+    facets = facet_index.counts(selected, ranked_ids, category_tree.lineage) if available_only else None
+    page = BookListPage(items=[BookOut.model_validate(b) for b in books], next_cursor=next_cursor, facets=facets)
+    tags = {LIST_TAG, *(f"book:{b.id}" for b in books)}
+    entry = response_cache.put(key, page.model_dump_json().encode(), tags, generation)
+    return json_response(request, entry)
+
+@app.get("/api/categories/tree")
+async def get_category_tree(request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    await category_tree.refresh_async(db)
+    return json_response(request, category_tree.response)
 
 @app.get("/api/books/{book_id}", response_model=BookOut)
-def get_book(book_id: str, db: Session = Depends(get_db)):
-    b = db.query(Book).filter(Book.id == book_id).first()
-    if not b:
-        raise HTTPException(status_code=404, detail="Book not found")
-    return BookOut(
-        **{**b.__dict__, 'gallery_images': json.loads(b.gallery_images or '[]')}
-    )
+async def get_book(book_id: str, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    key = f"book:{book_id}"
+    entry = response_cache.get(key)
+    if entry is None:
+        generation = response_cache.generation
+        b = await db.get(Book, book_id)
+        if not b:
+            raise HTTPException(status_code=404, detail="Book not found")
+        entry = response_cache.put(key, BookOut.model_validate(b).model_dump_json().encode(), {key}, generation)
+    book_counters.record_view(book_id)
+    return json_response(request, entry)
 
 @app.post("/api/books", response_model=BookOut)
 def create_book(payload: BookCreate, db: Session = Depends(get_db)):
     seller = db.query(User).filter(User.id == payload.seller_id).first()
     if not seller:
         raise HTTPException(status_code=400, detail="Seller not found")
+    _check_category(db, payload.category_id)
     import uuid
     new_book = Book(
         id=str(uuid.uuid4()),
@@ -266,88 +366,29 @@ def create_book(payload: BookCreate, db: Session = Depends(get_db)):
         publisher=payload.publisher,
         publish_year=payload.publish_year,
         edition=payload.edition,
+        category_id=payload.category_id,
         original_price=payload.original_price,
         selling_price=payload.selling_price,
         condition_level=payload.condition_level,
         description=payload.description,
         cover_image=payload.cover_image,
+        cover_variants=rendered_variants(payload.cover_image),
         gallery_images=json.dumps(payload.gallery_images),
         seller_id=payload.seller_id,
     )
     db.add(new_book)
     db.commit()
     db.refresh(new_book)
+    search_index.upsert(new_book)
+    response_cache.invalidate_book(new_book.id, membership_changed=True)
     return new_book
 
 @app.on_event("startup")
 def seed_data():
-    # Ensure missing column hashed_password exists (added after initial schema)
     try:
-        with engine.connect() as conn:
-            db_name = os.getenv("DB_NAME", "dhu_secondhand_platform")
-            try:
-                conn.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS hashed_password VARCHAR(128) NULL"))
-                conn.commit()
-            except Exception:
-                # Fallback: check information_schema then add without IF NOT EXISTS if needed
-                col_exists = conn.execute(text("SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=:db AND TABLE_NAME='users' AND COLUMN_NAME='hashed_password'"), {"db": db_name}).scalar()
-                if col_exists == 0:
-                    conn.execute(text("ALTER TABLE users ADD COLUMN hashed_password VARCHAR(128) NULL"))
-                    conn.commit()
-            order_columns = [
-                ("pickup_location", "VARCHAR(200) NULL"),
-                ("delivery_location", "VARCHAR(200) NULL"),
-                ("payment_due_at", "TIMESTAMP NULL"),
-                ("paid_at", "TIMESTAMP NULL"),
-            ]
-            for column, ddl in order_columns:
-                try:
-                    conn.execute(text(f"ALTER TABLE orders ADD COLUMN IF NOT EXISTS {column} {ddl}"))
-                    conn.commit()
-                except Exception:
-                    exists = conn.execute(text("SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=:db AND TABLE_NAME='orders' AND COLUMN_NAME=:col"), {"db": db_name, "col": column}).scalar()
-                    if exists == 0:
-                        conn.execute(text(f"ALTER TABLE orders ADD COLUMN {column} {ddl}"))
-                        conn.commit()
-            # Ensure books table has newer columns added after initial schema
-            book_columns = [
-                ("publish_date", "DATE NULL"),
-                ("publish_year", "INT NULL"),
-                ("edition", "VARCHAR(50) NULL"),
-                ("category_id", "INT NULL"),
-                ("cover_image", "TEXT NULL"),
-                ("gallery_images", "TEXT NULL"),
-                ("condition_description", "TEXT NULL"),
-            ]
-            for column, ddl in book_columns:
-                try:
-                    conn.execute(text(f"ALTER TABLE books ADD COLUMN IF NOT EXISTS {column} {ddl}"))
-                    conn.commit()
-                except Exception:
-                    exists = conn.execute(text("SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=:db AND TABLE_NAME='books' AND COLUMN_NAME=:col"), {"db": db_name, "col": column}).scalar()
-                    if exists == 0:
-                        conn.execute(text(f"ALTER TABLE books ADD COLUMN {column} {ddl}"))
-                        conn.commit()
-            # Ensure reviews table has book_id column for joins used by ORM
-            review_columns = [
-                ("book_id", "VARCHAR(36) NULL"),
-            ]
-            for column, ddl in review_columns:
-                try:
-                    conn.execute(text(f"ALTER TABLE reviews ADD COLUMN IF NOT EXISTS {column} {ddl}"))
-                    conn.commit()
-                except Exception:
-                    exists = conn.execute(text("SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=:db AND TABLE_NAME='reviews' AND COLUMN_NAME=:col"), {"db": db_name, "col": column}).scalar()
-                    if exists == 0:
-                        conn.execute(text(f"ALTER TABLE reviews ADD COLUMN {column} {ddl}"))
-                        conn.commit()
-            try:
-                conn.execute(text("UPDATE reviews r JOIN orders o ON r.order_id = o.id SET r.book_id = o.book_id WHERE r.book_id IS NULL"))
-                conn.commit()
-            except Exception:
-                pass
+        ensure_schema(engine)
     except Exception as e:
-        print("[WARN] Unable to ensure schema columns:", e)
+        print("[WARN] Unable to verify schema revision:", e)
     db = SessionLocal()
     try:
         seller = db.query(User).filter(User.student_id == 'seed_seller').first()
@@ -393,6 +434,105 @@ def seed_data():
     finally:
         db.close()
 
+@app.on_event("startup")
+def build_search_index():
+    db = SessionLocal()
+    try:
+        search_index.rebuild(db)
+    except Exception as e:
+        print("[WARN] Unable to build search index:", e)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def build_category_tree():
+    db = SessionLocal()
+    try:
+        category_tree.refresh(db, force=True)
+    except Exception as e:
+        print("[WARN] Unable to build category tree:", e)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def build_facet_index():
+    db = SessionLocal()
+    try:
+        facet_index.rebuild(db)
+    except Exception as e:
+        print("[WARN] Unable to build facet index:", e)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def warm_duration_estimator():
+    db = SessionLocal()
+    try:
+        duration_estimator.warm(db)
+    except Exception as e:
+        print("[WARN] Unable to load delivery durations:", e)
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def start_expiry_sweeper():
+    if SWEEPER_ENABLED:
+        expiry_sweeper.start()
+
+@app.on_event("shutdown")
+def stop_expiry_sweeper():
+    expiry_sweeper.stop()
+
+@app.on_event("startup")
+def start_counter_flusher():
+    book_counters.start()
+
+@app.on_event("shutdown")
+def flush_counters():
+    book_counters.stop()
+
+@app.on_event("shutdown")
+def stop_image_worker():
+    image_worker.shutdown()
+
+@app.on_event("startup")
+def start_catalog_snapshot():
+    catalog_snapshot.start()
+
+@app.on_event("shutdown")
+def stop_catalog_snapshot():
+    catalog_snapshot.stop()
+
+@app.on_event("startup")
+def start_dispatcher():
+    if DISPATCH_ENABLED:
+        dispatcher.start()
+
+@app.on_event("shutdown")
+def stop_dispatcher():
+    dispatcher.stop()
+
+@app.on_event("startup")
+async def start_chat():
+    await chat_service.start()
+
+@app.on_event("shutdown")
+async def stop_chat():
+    await chat_service.stop()
+
+@app.on_event("startup")
+async def start_task_feed():
+    await task_feed.start()
+
+@app.on_event("shutdown")
+async def stop_task_feed():
+    await task_feed.stop()
+
+# Keep this the last startup hook so it covers all of the above
+@app.on_event("startup")
+def record_startup_time():
+    boot_info["startup_ms"] = round((time.perf_counter() - _BOOT_STARTED) * 1000, 3)
+
 @app.get("/api/debug/info")
 def debug_info(db: Session = Depends(get_db)):
     return {
@@ -400,9 +540,46 @@ def debug_info(db: Session = Depends(get_db)):
         "books": db.query(Book).count(),
     }
 
-@app.get("/api/users", response_model=List[UserListOut])
-def list_users(db: Session = Depends(get_db)):
-    return db.query(User).order_by(User.created_at.desc()).limit(100).all()
+@app.get("/api/debug/expiry")
+def debug_expiry():
+    return sweep_metrics.snapshot()
+
+@app.get("/api/debug/cache")
+def debug_cache():
+    return {"responses": response_cache.stats(), "uploads": upload_files.cache.stats()}
+
+@app.get("/api/debug/counters")
+def debug_counters():
+    return book_counters.snapshot()
+
+@app.get("/api/debug/catalog")
+def debug_catalog():
+    return {"snapshot": catalog_snapshot.stats(), "facets": facet_index.stats(), "categories": category_tree.stats()}
+
+@app.get("/api/debug/pool")
+def debug_pool():
+    return pool_status()
+
+@app.get("/api/debug/dispatch")
+def debug_dispatch():
+    return dict(dispatch_metrics.snapshot(), leader=dispatcher.is_leader)
+
+@app.get("/api/debug/chat")
+def debug_chat():
+    return chat_service.stats()
+
+@app.get("/api/debug/delivery")
+def debug_delivery():
+    return duration_estimator.stats()
+
+@app.get("/api/debug/task_feed")
+def debug_task_feed():
+    return task_feed.stats()
+
+@app.get("/api/users", response_model=Page[UserListOut])
+def list_users(cursor: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(get_db)):
+    users, next_cursor = paginate(db.query(User), User, cursor, limit)
+    return Page(items=users, next_cursor=next_cursor)
 
 @app.patch("/api/books/{book_id}/status", response_model=BookOut)
 def update_book_status(book_id: str, payload: BookStatusUpdate, db: Session = Depends(get_db)):
@@ -412,74 +589,42 @@ def update_book_status(book_id: str, payload: BookStatusUpdate, db: Session = De
     b.status = payload.status
     db.commit()
     db.refresh(b)
+    response_cache.invalidate_book(book_id, membership_changed=True)
     return b
 
 @app.post("/api/orders", response_model=OrderOut)
 def create_order(payload: OrderCreate, db: Session = Depends(get_db)):
-    book = db.query(Book).filter(Book.id == payload.book_id).first()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    if book.status != BookStatus.available:
-        raise HTTPException(status_code=400, detail="Book not available")
-    if book.seller_id == payload.buyer_id:
-        raise HTTPException(status_code=400, detail="Cannot purchase your own listing")
     buyer = db.query(User).filter(User.id == payload.buyer_id).first()
     if not buyer:
         raise HTTPException(status_code=404, detail="Buyer not found")
-    seller = db.query(User).filter(User.id == book.seller_id).first()
-    if not seller:
-        raise HTTPException(status_code=404, detail="Seller not found")
-    import uuid, datetime
-    # Simple order number: YYYYMMDDHHMMSS + 6 hex
-    order_number = datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S") + uuid.uuid4().hex[:6]
     if payload.delivery_method == DeliveryMethod.delivery and (not payload.pickup_location or not payload.delivery_location):
         raise HTTPException(status_code=400, detail="配送方式需要取书和送书地址")
-    delivery_fee = 0 if payload.delivery_method == DeliveryMethod.meetup else 5
-    total_amount = float(book.selling_price) + delivery_fee
     meetup_time_dt = None
     if payload.meetup_time:
         try:
             meetup_time_dt = datetime.datetime.fromisoformat(payload.meetup_time.replace('Z','+00:00'))
         except Exception:
             raise HTTPException(status_code=400, detail="Invalid meetup_time format")
-    payment_due_at = datetime.datetime.utcnow() + datetime.timedelta(minutes=PAYMENT_WINDOW_MINUTES)
-    new_order = Order(
-        id=str(uuid.uuid4()),
-        order_number=order_number,
-        book_id=book.id,
-        buyer_id=buyer.id,
-        seller_id=seller.id,
-        book_price=book.selling_price,
-        delivery_fee=delivery_fee,
-        total_amount=total_amount,
-        status=OrderStatus.pending,
-        delivery_method=payload.delivery_method,
+    return place_order(
+        db, payload.book_id, buyer.id, payload.delivery_method,
         meetup_location=payload.meetup_location,
         meetup_time=meetup_time_dt,
         pickup_location=payload.pickup_location,
         delivery_location=payload.delivery_location,
         payment_method=payload.payment_method,
-        payment_status=PaymentStatus.pending,
-        payment_due_at=payment_due_at,
     )
-    # Mark book reserved
-    book.status = BookStatus.reserved
-    db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
-    db.refresh(book)
-    return new_order
 
-@app.get("/api/orders", response_model=List[OrderOut])
-def list_orders(buyer_id: str | None = None, seller_id: str | None = None, status: OrderStatus | None = None, db: Session = Depends(get_db)):
-    q = db.query(Order)
+@app.get("/api/orders", response_model=Page[OrderOut])
+async def list_orders(buyer_id: str | None = None, seller_id: str | None = None, status: OrderStatus | None = None, cursor: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_async_db)):
+    stmt = select(Order)
     if buyer_id:
-        q = q.filter(Order.buyer_id == buyer_id)
+        stmt = stmt.where(Order.buyer_id == buyer_id)
     if seller_id:
-        q = q.filter(Order.seller_id == seller_id)
+        stmt = stmt.where(Order.seller_id == seller_id)
     if status:
-        q = q.filter(Order.status == status)
-    return q.order_by(Order.created_at.desc()).limit(100).all()
+        stmt = stmt.where(Order.status == status)
+    orders, next_cursor = await paginate_async(db, stmt, Order, cursor, limit)
+    return Page(items=orders, next_cursor=next_cursor)
 
 @app.get("/api/orders/{order_id}", response_model=OrderOut)
 def get_order(order_id: str, db: Session = Depends(get_db)):
@@ -493,29 +638,31 @@ def update_order(order_id: str, payload: OrderStatusUpdate, db: Session = Depend
     o = db.query(Order).filter(Order.id == order_id).first()
     if not o:
         raise HTTPException(status_code=404, detail="Order not found")
-    # Basic transitions
-    o.status = payload.status
+    # Basic transitions; completions are counted into both parties' total_transactions
+    changed = transition_order(db, o, payload.status)
     if payload.payment_status:
         o.payment_status = payload.payment_status
+    released = []
     if payload.status == OrderStatus.completed:
-        import datetime
-        o.completed_at = datetime.datetime.utcnow()
         book = db.query(Book).filter(Book.id == o.book_id).first()
         if book:
             book.status = BookStatus.sold
     elif payload.status == OrderStatus.cancelled:
-        import datetime
         o.cancelled_at = datetime.datetime.utcnow()
-        book = db.query(Book).filter(Book.id == o.book_id).first()
-        if book and book.status != BookStatus.sold:
-            book.status = BookStatus.available
+        released = release_orders(db, [o.id])
     db.commit()
     db.refresh(o)
+    if changed:
+        user_cache.invalidate(o.buyer_id)
+        user_cache.invalidate(o.seller_id)
+    response_cache.invalidate_book(o.book_id, membership_changed=True)
+    if payload.status == OrderStatus.cancelled:
+        orders_released([o.id], released)
     return o
 
 @app.get('/admin', response_class=HTMLResponse)
 def admin_books(db: Session = Depends(get_db)):
-    books = db.query(Book).order_by(Book.created_at.desc()).limit(100).all()
+    books = db.query(Book).options(*ADMIN_BOOK_LIST).order_by(Book.created_at.desc()).limit(100).all()
     tpl = _env.get_template('admin_books.html')
     return tpl.render(page_title='书籍管理', active='books', books=books, year=__import__('datetime').datetime.utcnow().year)
 
@@ -526,6 +673,7 @@ def admin_book_off(book_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail='Book not found')
     b.status = BookStatus.off_shelf
     db.commit()
+    response_cache.invalidate_book(book_id, membership_changed=True)
     return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin" />书籍已下架, 返回中...')
 
 @app.post('/admin/books/{book_id}/reserve', response_class=HTMLResponse)
@@ -536,6 +684,7 @@ def admin_book_reserve(book_id: str, db: Session = Depends(get_db)):
     if b.status == BookStatus.available:
         b.status = BookStatus.reserved
         db.commit()
+        response_cache.invalidate_book(book_id, membership_changed=True)
     return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin" />操作完成, 返回中...')
 
 @app.get('/admin/users', response_class=HTMLResponse)
@@ -546,21 +695,110 @@ def admin_users(db: Session = Depends(get_db)):
 
 @app.get('/admin/orders', response_class=HTMLResponse)
 def admin_orders(db: Session = Depends(get_db)):
-    orders = db.query(Order).order_by(Order.created_at.desc()).limit(100).all()
+    orders = db.query(Order).options(*ADMIN_ORDER_LIST).order_by(Order.created_at.desc()).limit(100).all()
     tpl = _env.get_template('admin_orders.html')
     return tpl.render(page_title='订单管理', active='orders', orders=orders, year=__import__('datetime').datetime.utcnow().year)
 
+@app.get('/admin/couriers', response_class=HTMLResponse)
+def admin_couriers(db: Session = Depends(get_db)):
+    couriers = db.query(Courier).options(user_name(Courier.user)).order_by(Courier.created_at.desc()).limit(200).all()
+    loads = dict(db.query(DeliveryTask.courier_id, func.count()).filter(DeliveryTask.courier_id.in_([c.id for c in couriers]), DeliveryTask.status.in_(ACTIVE_STATUSES)).group_by(DeliveryTask.courier_id).all()) if couriers else {}
+    tpl = _env.get_template('admin_couriers.html')
+    return tpl.render(page_title='配送员管理', active='couriers', couriers=couriers, loads=loads, dispatch=dispatch_metrics.snapshot(), durations=duration_estimator.stats(), year=__import__('datetime').datetime.utcnow().year)
+
+@app.post('/admin/couriers/{courier_id}/status/{new_status}', response_class=HTMLResponse)
+def admin_courier_status(courier_id: str, new_status: str, db: Session = Depends(get_db)):
+    c = db.query(Courier).filter(Courier.id == courier_id).first()
+    if not c:
+        raise HTTPException(status_code=404, detail='Courier not found')
+    if new_status not in [s.value for s in CourierStatus]:
+        raise HTTPException(status_code=400, detail='invalid status')
+    c.status = CourierStatus(new_status)
+    if c.status != CourierStatus.approved:
+        c.is_online = False
+    db.commit()
+    return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin/couriers" />状态已更新')
+
+@app.get('/admin/categories', response_class=HTMLResponse)
+def admin_categories(db: Session = Depends(get_db)):
+    category_tree.refresh(db, force=True)
+    tpl = _env.get_template('admin_categories.html')
+    return tpl.render(page_title='分类管理', active='categories', categories=category_tree.flat(), year=__import__('datetime').datetime.utcnow().year)
+
+def _category_parent(db: Session, value) -> int | None:
+    if not value:
+        return None
+    parent_id = int(value)
+    if not db.query(BookCategory.id).filter(BookCategory.id == parent_id).first():
+        raise HTTPException(status_code=400, detail='parent category not found')
+    return parent_id
+
+@app.post('/admin/categories/create', response_class=HTMLResponse)
+async def admin_create_category(request: Request, db: Session = Depends(get_db)):
+    form = await request.form()
+    name = (form.get('name') or '').strip()
+    if not name:
+        raise HTTPException(status_code=400, detail='name required')
+    db.add(BookCategory(name=name, parent_id=_category_parent(db, form.get('parent_id')), sort_order=int(form.get('sort_order') or 0)))
+    db.commit()
+    return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin/categories" />分类已创建')
+
+@app.post('/admin/categories/{category_id}/move', response_class=HTMLResponse)
+async def admin_move_category(category_id: int, request: Request, db: Session = Depends(get_db)):
+    form = await request.form()
+    c = db.query(BookCategory).filter(BookCategory.id == category_id).first()
+    if not c:
+        raise HTTPException(status_code=404, detail='Category not found')
+    parent_id = _category_parent(db, form.get('parent_id'))
+    category_tree.refresh(db, force=True)
+    if parent_id is not None and parent_id in category_tree.subtree_ids(category_id):
+        raise HTTPException(status_code=400, detail='不能移动到自身或子分类下')
+    c.parent_id = parent_id
+    db.commit()
+    response_cache.invalidate_tag(LIST_TAG)
+    return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin/categories" />分类已移动')
+
+@app.post('/admin/categories/{category_id}/toggle', response_class=HTMLResponse)
+def admin_toggle_category(category_id: int, db: Session = Depends(get_db)):
+    c = db.query(BookCategory).filter(BookCategory.id == category_id).first()
+    if not c:
+        raise HTTPException(status_code=404, detail='Category not found')
+    c.is_active = not c.is_active
+    db.commit()
+    return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin/categories" />已切换状态')
+
+@app.post('/admin/categories/{category_id}/delete', response_class=HTMLResponse)
+def admin_delete_category(category_id: int, db: Session = Depends(get_db)):
+    c = db.query(BookCategory).filter(BookCategory.id == category_id).first()
+    if not c:
+        raise HTTPException(status_code=404, detail='Category not found')
+    if db.query(BookCategory.id).filter(BookCategory.parent_id == category_id).first():
+        raise HTTPException(status_code=400, detail='请先删除或移动子分类')
+    if db.query(Book.id).filter(Book.category_id == category_id).first():
+        raise HTTPException(status_code=400, detail='该分类下仍有书籍')
+    db.delete(c)
+    db.commit()
+    return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin/categories" />已删除')
+
 @app.patch('/api/books/{book_id}', response_model=BookOut)
 def api_update_book(book_id: str, payload: BookUpdate, db: Session = Depends(get_db)):
     b = db.query(Book).filter(Book.id == book_id).first()
     if not b:
         raise HTTPException(status_code=404, detail='Book not found')
-    for field, value in payload.dict(exclude_unset=True).items():
+    changes = payload.dict(exclude_unset=True)
+    _check_category(db, changes.get('category_id'))
+    old_urls = book_image_urls(b)
+    for field, value in changes.items():
         if field == 'gallery_images' and value is not None:
             setattr(b, field, json.dumps(value))
         else:
             setattr(b, field, value)
+    if 'cover_image' in changes:
+        b.cover_variants = rendered_variants(b.cover_image)
     db.commit(); db.refresh(b)
+    search_index.upsert(b)
+    response_cache.invalidate_book(book_id, membership_changed=bool(_LIST_MEMBERSHIP_FIELDS & changes.keys()))
+    release_blobs(db, old_urls - book_image_urls(b))
     return b
 
 @app.delete('/api/books/{book_id}')
@@ -568,7 +806,11 @@ def api_delete_book(book_id: str, db: Session = Depends(get_db)):
     b = db.query(Book).filter(Book.id == book_id).first()
     if not b:
         raise HTTPException(status_code=404, detail='Book not found')
+    urls = book_image_urls(b)
     db.delete(b); db.commit()
+    search_index.remove(book_id)
+    response_cache.invalidate_book(book_id)
+    release_blobs(db, urls)
     return {'deleted': True}
 
 @app.patch('/api/users/{user_id}', response_model=UserOut)
@@ -579,6 +821,7 @@ def api_update_user(user_id: str, payload: UserUpdate, db: Session = Depends(get
     for field, value in payload.dict(exclude_unset=True).items():
         setattr(u, field, value)
     db.commit(); db.refresh(u)
+    user_cache.invalidate(user_id)
     return u
 
 @app.delete('/api/users/{user_id}')
@@ -587,6 +830,8 @@ def api_delete_user(user_id: str, db: Session = Depends(get_db)):
     if not u:
         raise HTTPException(status_code=404, detail='User not found')
     db.delete(u); db.commit()
+    session_store.revoke_user(user_id)
+    user_cache.invalidate(user_id)
     return {'deleted': True}
 
 # Admin create book
@@ -612,7 +857,9 @@ async def admin_create_book(request: Request, db: Session = Depends(get_db)):
         description=form.get('description'),
         seller_id=form['seller_id']
     )
-    db.add(b); db.commit()
+    db.add(b); db.commit(); db.refresh(b)
+    search_index.upsert(b)
+    response_cache.invalidate_book(b.id, membership_changed=True)
     return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin" />创建成功')
 
 @app.post('/admin/books/{book_id}/delete', response_class=HTMLResponse)
@@ -620,7 +867,11 @@ def admin_delete_book(book_id: str, db: Session = Depends(get_db)):
     b = db.query(Book).filter(Book.id == book_id).first()
     if not b:
         raise HTTPException(status_code=404, detail='Book not found')
+    urls = book_image_urls(b)
     db.delete(b); db.commit()
+    search_index.remove(book_id)
+    response_cache.invalidate_book(book_id)
+    release_blobs(db, urls)
     return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin" />已删除')
 
 @app.post('/admin/books/{book_id}/status/{new_status}', response_class=HTMLResponse)
@@ -631,7 +882,8 @@ def admin_set_book_status(book_id: str, new_status: str, db: Session = Depends(g
     if new_status not in [s.value for s in BookStatus]:
         raise HTTPException(status_code=400, detail='invalid status')
     b.status = BookStatus(new_status)
-    db.commit();
+    db.commit()
+    response_cache.invalidate_book(book_id, membership_changed=True)
     return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin" />状态已更新')
 
 # Admin user create
@@ -662,6 +914,7 @@ def admin_toggle_user(user_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail='User not found')
     u.is_active = not u.is_active
     db.commit()
+    user_cache.invalidate(user_id)
     return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin/users" />已切换状态')
 
 @app.post('/admin/users/{user_id}/delete', response_class=HTMLResponse)
@@ -670,6 +923,8 @@ def admin_delete_user(user_id: str, db: Session = Depends(get_db)):
     if not u:
         raise HTTPException(status_code=404, detail='User not found')
     db.delete(u); db.commit()
+    session_store.revoke_user(user_id)
+    user_cache.invalidate(user_id)
     return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin/users" />已删除')
 
 # Admin order create
@@ -680,32 +935,11 @@ async def admin_create_order(request: Request, db: Session = Depends(get_db)):
     for f in required:
         if not form.get(f):
             raise HTTPException(status_code=400, detail=f'{f} required')
-    book = db.query(Book).filter(Book.id == form['book_id']).first()
-    if not book:
-        raise HTTPException(status_code=404, detail='Book not found')
     buyer = db.query(User).filter(User.id == form['buyer_id']).first()
     if not buyer:
         raise HTTPException(status_code=404, detail='Buyer not found')
-    seller = db.query(User).filter(User.id == book.seller_id).first()
-    import uuid, datetime
-    order_number = datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S') + uuid.uuid4().hex[:6]
-    delivery_fee = 0 if form['delivery_method'] == 'meetup' else 5
-    total_amount = float(book.selling_price) + delivery_fee
-    o = Order(
-        id=str(uuid.uuid4()),
-        order_number=order_number,
-        book_id=book.id,
-        buyer_id=buyer.id,
-        seller_id=seller.id,
-        book_price=book.selling_price,
-        delivery_fee=delivery_fee,
-        total_amount=total_amount,
-        status=OrderStatus.pending,
-        delivery_method=DeliveryMethod(form['delivery_method']),
-        payment_status=PaymentStatus.pending
-    )
-    book.status = BookStatus.reserved
-    db.add(o); db.commit()
+    # No payment deadline: admin-created orders were never auto-cancelled
+    place_order(db, form['book_id'], buyer.id, DeliveryMethod(form['delivery_method']), payment_deadline=False)
     return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin/orders" />订单创建成功')
 
 @app.post('/admin/orders/{order_id}/status/{new_status}', response_class=HTMLResponse)
@@ -715,16 +949,19 @@ def admin_order_status(order_id: str, new_status: str, db: Session = Depends(get
         raise HTTPException(status_code=404, detail='Order not found')
     if new_status not in [s.value for s in OrderStatus]:
         raise HTTPException(status_code=400, detail='invalid status')
-    o.status = OrderStatus(new_status)
+    changed = transition_order(db, o, OrderStatus(new_status))
     if o.status == OrderStatus.completed:
         book = db.query(Book).filter(Book.id == o.book_id).first()
         if book:
             book.status = BookStatus.sold
-    if o.status == OrderStatus.cancelled:
-        book = db.query(Book).filter(Book.id == o.book_id).first()
-        if book and book.status == BookStatus.reserved:
-            book.status = BookStatus.available
+    released = release_orders(db, [o.id]) if o.status == OrderStatus.cancelled else []
     db.commit()
+    if changed:
+        user_cache.invalidate(o.buyer_id)
+        user_cache.invalidate(o.seller_id)
+    response_cache.invalidate_book(o.book_id, membership_changed=True)
+    if o.status == OrderStatus.cancelled:
+        orders_released([o.id], released)
     return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin/orders" />状态更新成功')
 
 @app.post('/admin/orders/{order_id}/delete', response_class=HTMLResponse)
@@ -735,7 +972,10 @@ def admin_order_delete(order_id: str, db: Session = Depends(get_db)):
     book = db.query(Book).filter(Book.id == o.book_id).first()
     if book and book.status == BookStatus.reserved:
         book.status = BookStatus.available
+    book_id = o.book_id
     db.delete(o); db.commit()
+    response_cache.invalidate_book(book_id, membership_changed=True)
+    task_feed.orders_closed([order_id])
     return HTMLResponse('<meta http-equiv="refresh" content="0; url=/admin/orders" />订单已删除')
 
 @app.post('/api/login', response_model=AuthToken)
@@ -746,71 +986,40 @@ def login(payload: LoginPayload, db: Session = Depends(get_db)):
     expected = hashlib.sha256(payload.password.encode()).hexdigest()
     if u.hashed_password != expected:
         raise HTTPException(status_code=400, detail='student_id or password error')
-    token = secrets.token_hex(32)
-    TOKEN_STORE[token] = {'user_id': u.id, 'ts': datetime.datetime.utcnow().isoformat()}
+    token = session_store.create(u.id)
     return AuthToken(access_token=token, user_id=u.id, student_id=u.student_id, name=u.name)
 
 def get_current_user(creds: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    token = creds.credentials
-    data = TOKEN_STORE.get(token)
-    if not data:
+    user_id = session_store.get(creds.credentials)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    u = user_cache.resolve(db, user_id)
+    if not u:
+        raise HTTPException(status_code=401, detail="User not found")
+    return u
+
+async def get_current_user_async(creds: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
+    # Session lookup is a local indexed SQLite/dict read, cheap enough for the event loop
+    user_id = session_store.get(creds.credentials)
+    if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token")
-    u = db.query(User).filter(User.id == data['user_id']).first()
+    u = await user_cache.resolve_async(db, user_id)
     if not u:
         raise HTTPException(status_code=401, detail="User not found")
     return u
 
 @app.post('/api/books/{book_id}/purchase', response_model=OrderOut)
 def purchase_book(book_id: str, delivery_method: DeliveryMethod = DeliveryMethod.meetup, meetup_location: str | None = None, pickup_location: str | None = None, delivery_location: str | None = None, delivery_fee: float | None = None, desired_delivery_time: str | None = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    book = db.query(Book).filter(Book.id == book_id).first()
-    if not book:
-        raise HTTPException(status_code=404, detail='Book not found')
-    if book.status != BookStatus.available:
-        raise HTTPException(status_code=400, detail='Book not available')
-    seller = db.query(User).filter(User.id == book.seller_id).first()
-    if not seller:
-        raise HTTPException(status_code=400, detail='Seller missing')
-    if book.seller_id == current_user.id:
-        raise HTTPException(status_code=400, detail='Cannot purchase your own listing')
-    order_number = datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S') + uuid.uuid4().hex[:6]
     if delivery_method == DeliveryMethod.delivery and (not pickup_location or not delivery_location):
         raise HTTPException(status_code=400, detail='配送方式需要填写取书和送书地点')
-    auto_fee = 0 if delivery_method == DeliveryMethod.meetup else 5
-    final_fee = delivery_fee if delivery_fee is not None else auto_fee
-    total_amount = float(book.selling_price) + float(final_fee)
-    payment_due_at = datetime.datetime.utcnow() + datetime.timedelta(minutes=PAYMENT_WINDOW_MINUTES)
-    order = Order(
-        id=str(uuid.uuid4()),
-        order_number=order_number,
-        book_id=book.id,
-        buyer_id=current_user.id,
-        seller_id=seller.id,
-        book_price=book.selling_price,
-        delivery_fee=final_fee,
-        total_amount=total_amount,
-        status=OrderStatus.pending,
-        delivery_method=delivery_method,
+    return place_order(
+        db, book_id, current_user.id, delivery_method,
         meetup_location=meetup_location,
         pickup_location=pickup_location,
         delivery_location=delivery_location,
-        payment_status=PaymentStatus.pending,
-        payment_due_at=payment_due_at,
+        delivery_fee=delivery_fee,
+        create_delivery_task=True,
     )
-    book.status = BookStatus.reserved
-    db.add(order)
-    db.commit(); db.refresh(order); db.refresh(book)
-    if delivery_method == DeliveryMethod.delivery:
-        task = DeliveryTask(
-            id=str(uuid.uuid4()),
-            order_id=order.id,
-            pickup_location=pickup_location,
-            delivery_location=delivery_location,
-            delivery_fee=final_fee,
-            status=DeliveryTaskStatus.pending
-        )
-        db.add(task)
-    db.commit(); db.refresh(order); db.refresh(book)
-    return order
 
 @app.delete("/api/orders/{order_id}")
 def delete_order(order_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -825,8 +1034,11 @@ def delete_order(order_id: str, db: Session = Depends(get_db), current_user: Use
     delivery_task = db.query(DeliveryTask).filter(DeliveryTask.order_id == order_id).first()
     if delivery_task:
         db.delete(delivery_task)
+    book_id = o.book_id
     db.delete(o)
     db.commit()
+    response_cache.invalidate_book(book_id, membership_changed=True)
+    task_feed.orders_closed([order_id])
     return {"deleted": True}
 
 class DeliveryTaskOut(BaseModel):
@@ -837,8 +1049,13 @@ class DeliveryTaskOut(BaseModel):
     delivery_location: str
     delivery_fee: float
     status: DeliveryTaskStatus
-    created_at: str | None = None
-    updated_at: str | None = None
+    estimated_duration: int | None = None
+    actual_duration: int | None = None
+    accepted_at: datetime.datetime | None = None
+    picked_up_at: datetime.datetime | None = None
+    delivered_at: datetime.datetime | None = None
+    created_at: datetime.datetime | None = None
+    updated_at: datetime.datetime | None = None
     class Config:
         from_attributes = True
 
@@ -863,30 +1080,187 @@ def create_delivery_task(payload: DeliveryTaskCreate, db: Session = Depends(get_
         delivery_fee=payload.delivery_fee,
         status=DeliveryTaskStatus.pending
     )
+    prepare_task(task)
     db.add(task); db.commit(); db.refresh(task)
+    task_feed.added(task)
     return task
 
-@app.get('/api/delivery_tasks', response_model=List[DeliveryTaskOut])
-def list_delivery_tasks(status: DeliveryTaskStatus | None = None, db: Session = Depends(get_db)):
+class DeliveryTransition(BaseModel):
+    status: DeliveryTaskStatus
+    code: str | None = None
+
+class OrderDeliveryOut(DeliveryTaskOut):
+    # Only the party who hands over: the seller gets pickup_code, the buyer delivery_code
+    pickup_code: str | None = None
+    delivery_code: str | None = None
+
+@app.get('/api/delivery_tasks/stream')
+async def stream_delivery_tasks():
+    # Server-Sent Events: snapshot of claimable tasks, then added/removed as they change
+    return StreamingResponse(task_feed.stream(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.get('/api/delivery_tasks', response_model=Page[DeliveryTaskOut])
+def list_delivery_tasks(status: DeliveryTaskStatus | None = None, cursor: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(get_read_db)):
     q = db.query(DeliveryTask)
     if status:
         q = q.filter(DeliveryTask.status == status)
-    return q.order_by(DeliveryTask.created_at.desc()).limit(200).all()
+    tasks, next_cursor = paginate(q, DeliveryTask, cursor, limit)
+    return Page(items=tasks, next_cursor=next_cursor)
+
+def _claiming_courier(db: Session, user: User) -> Courier:
+    c = _my_courier(db, user)
+    if c.status != CourierStatus.approved:
+        raise HTTPException(status_code=403, detail='配送员资格未通过审核')
+    if courier_load(db, c.id) >= DISPATCH_MAX_LOAD:
+        raise HTTPException(status_code=409, detail='进行中的配送任务已达上限')
+    return c
 
 @app.post('/api/delivery_tasks/{task_id}/accept', response_model=DeliveryTaskOut)
 def accept_delivery_task(task_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    task = db.query(DeliveryTask).filter(DeliveryTask.id == task_id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail='Task not found')
-    if task.status != DeliveryTaskStatus.pending:
+    c = _claiming_courier(db, current_user)
+    # Conditional UPDATE: of any number of concurrent accepts exactly one matches
+    if not assign(db, task_id, c.id, datetime.datetime.utcnow()):
+        db.rollback()
+        if not db.query(DeliveryTask.id).filter(DeliveryTask.id == task_id).first():
+            raise HTTPException(status_code=404, detail='Task not found')
         raise HTTPException(status_code=400, detail='Task already accepted')
-    task.status = DeliveryTaskStatus.accepted
-    task.courier_id = current_user.id
+    db.commit()
+    task_feed.removed(task_id)
+    return db.query(DeliveryTask).filter(DeliveryTask.id == task_id).one()
+
+@app.post('/api/delivery_tasks/claim', response_model=DeliveryTaskOut)
+def claim_delivery_task(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # "Claim next best task": concurrent callers each get a different task
+    c = _claiming_courier(db, current_user)
+    task_id = claim_next(db, c)
+    db.commit()
+    if task_id is None:
+        raise HTTPException(status_code=404, detail='暂无可接任务')
+    task_feed.removed(task_id)
+    return db.query(DeliveryTask).filter(DeliveryTask.id == task_id).one()
+
+class CourierApply(BaseModel):
+    id_card_number: str
+    student_card: str | None = None
+
+class CourierOut(BaseModel):
+    id: str
+    user_id: str
+    status: CourierStatus
+    total_orders: int | None = 0
+    completed_orders: int | None = 0
+    rating: float | None = None
+    is_online: bool | None = False
+    last_online_time: datetime.datetime | None = None
+    current_zone: str | None = None
+
+    class Config:
+        from_attributes = True
+
+class CourierPresence(BaseModel):
+    online: bool = True
+    lat: float | None = None
+    lng: float | None = None
+    zone: str | None = None
+
+class CourierPresenceOut(BaseModel):
+    online: bool
+    zone: str | None = None
+    tasks: list[DeliveryTaskOut]
+
+def _my_courier(db: Session, user: User) -> Courier:
+    c = db.query(Courier).filter(Courier.user_id == user.id).first()
+    if not c:
+        raise HTTPException(status_code=403, detail='尚未注册为配送员')
+    return c
+
+def _active_tasks(db: Session, courier_id: str) -> list[DeliveryTask]:
+    return db.query(DeliveryTask).filter(DeliveryTask.courier_id == courier_id, DeliveryTask.status.in_(ACTIVE_STATUSES)).order_by(DeliveryTask.accepted_at).all()
+
+@app.post('/api/couriers/me', response_model=CourierOut)
+def apply_courier(payload: CourierApply, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    if db.query(Courier.id).filter(Courier.user_id == current_user.id).first():
+        raise HTTPException(status_code=400, detail='已提交配送员申请')
+    c = Courier(user_id=current_user.id, id_card_number=payload.id_card_number.strip(), student_card=payload.student_card, status=CourierStatus.pending)
+    db.add(c)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail='已提交配送员申请')
+    db.refresh(c)
+    return c
+
+@app.get('/api/couriers/me', response_model=CourierOut)
+def get_my_courier(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return _my_courier(db, current_user)
+
+@app.put('/api/couriers/me/presence', response_model=CourierPresenceOut)
+def update_courier_presence(payload: CourierPresence, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # Heartbeat: keeps the courier in the dispatch pool and returns their current tasks
+    c = _my_courier(db, current_user)
+    if payload.online and c.status != CourierStatus.approved:
+        raise HTTPException(status_code=403, detail='配送员资格未通过审核')
+    if payload.online:
+        if payload.lat is not None and payload.lng is not None:
+            c.current_lat, c.current_lng, c.current_zone = payload.lat, payload.lng, zone_map.nearest(project(payload.lat, payload.lng))
+        elif payload.zone:
+            zone = zone_map.zone_of(payload.zone)
+            if zone is None:
+                raise HTTPException(status_code=400, detail='Unknown zone')
+            c.current_lat = c.current_lng = None
+            c.current_zone = zone
+    c.is_online = payload.online
+    c.last_online_time = datetime.datetime.utcnow()
+    db.commit()
+    return CourierPresenceOut(online=bool(c.is_online), zone=c.current_zone, tasks=_active_tasks(db, c.id))
+
+@app.get('/api/couriers/me/tasks', response_model=list[DeliveryTaskOut])
+def list_my_courier_tasks(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return _active_tasks(db, _my_courier(db, current_user).id)
+
+@app.post('/api/delivery_tasks/{task_id}/status', response_model=DeliveryTaskOut)
+def update_delivery_status(task_id: str, payload: DeliveryTransition, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    # accepted -> picked_up (seller's pickup code) -> delivering -> delivered (buyer's delivery code)
+    c = _my_courier(db, current_user)
+    task = advance(db, task_id, c.id, payload.status, payload.code)
     db.commit(); db.refresh(task)
+    if task.status == DeliveryTaskStatus.delivered:
+        duration_estimator.record(task.pickup_location, task.actual_duration)
     return task
 
+@app.get('/api/orders/{order_id}/delivery', response_model=OrderDeliveryOut)
+def get_order_delivery(order_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    order = db.query(Order.buyer_id, Order.seller_id).filter(Order.id == order_id).first()
+    if not order:
+        raise HTTPException(status_code=404, detail='Order not found')
+    if current_user.id not in (order.buyer_id, order.seller_id):
+        raise HTTPException(status_code=403, detail='无权查看该订单')
+    task = db.query(DeliveryTask).filter(DeliveryTask.order_id == order_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail='Delivery task not found')
+    return OrderDeliveryOut.model_validate(task).model_copy(update={
+        'pickup_code': task.pickup_code if current_user.id == order.seller_id else None,
+        'delivery_code': task.delivery_code if current_user.id == order.buyer_id else None,
+    })
+
+@app.get('/api/couriers/zones')
+def list_courier_zones():
+    return [{'name': name, 'x': x, 'y': y} for name, (x, y) in zone_map.zones.items()]
+
+@app.get('/api/users/{user_id}/reputation', response_model=ReputationOut)
+def get_user_reputation(user_id: str, db: Session = Depends(get_read_db)):
+    # Seller badges and profiles: one row lookup, the aggregates are kept by reputation.py
+    row = db.query(
+        User.id, User.name, User.credit_score, User.positive_reviews, User.negative_reviews, User.total_transactions,
+        Courier.rating.label('courier_rating'), Courier.review_count.label('courier_reviews'),
+    ).outerjoin(Courier, Courier.user_id == User.id).filter(User.id == user_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail='User not found')
+    return ReputationOut.model_validate(row._asdict())
+
 @app.get('/api/me', response_model=UserOut)
-def api_me(current_user: User = Depends(get_current_user)):
+async def api_me(current_user: User = Depends(get_current_user_async)):
     return current_user
 
 @app.patch('/api/me', response_model=UserOut)
@@ -894,6 +1268,7 @@ def api_me_update(payload: UserUpdate, db: Session = Depends(get_db), current_us
     for field, value in payload.dict(exclude_unset=True).items():
         setattr(current_user, field, value)
     db.commit(); db.refresh(current_user)
+    user_cache.invalidate(current_user.id)
     return current_user
 
 @app.patch('/api/me/password')
@@ -905,25 +1280,24 @@ def api_me_password(payload: UserPasswordUpdate, db: Session = Depends(get_db),
         raise HTTPException(status_code=400, detail='新密码长度至少6位')
     current_user.hashed_password = hashlib.sha256(payload.new_password.encode()).hexdigest()
     db.commit()
+    user_cache.invalidate(current_user.id)
     return {'status': 'ok'}
 
-@app.get('/api/me/books', response_model=List[BookOut])
-def api_me_books(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    books = db.query(Book).filter(Book.seller_id == current_user.id, Book.status.in_([BookStatus.available, BookStatus.reserved])).order_by(Book.created_at.desc()).all()
-    return [
-        BookOut(
-            **{**b.__dict__, 'gallery_images': json.loads(b.gallery_images or '[]')}
-        )
-        for b in books
-    ]
+@app.get('/api/me/books', response_model=Page[BookOut])
+async def api_me_books(cursor: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    stmt = select(Book).where(Book.seller_id == current_user.id, Book.status.in_([BookStatus.available, BookStatus.reserved]))
+    books, next_cursor = await paginate_async(db, stmt, Book, cursor, limit)
+    return Page(items=[BookOut.model_validate(b) for b in books], next_cursor=next_cursor)
 
-@app.get('/api/me/orders', response_model=List[OrderOut])
-def api_me_orders(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return db.query(Order).filter(Order.buyer_id == current_user.id).order_by(Order.created_at.desc()).all()
+@app.get('/api/me/orders', response_model=Page[OrderOut])
+async def api_me_orders(cursor: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    orders, next_cursor = await paginate_async(db, select(Order).where(Order.buyer_id == current_user.id), Order, cursor, limit)
+    return Page(items=orders, next_cursor=next_cursor)
 
-@app.get('/api/me/sales', response_model=List[OrderOut])
-def api_me_sales(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return db.query(Order).filter(Order.seller_id == current_user.id).order_by(Order.created_at.desc()).all()
+@app.get('/api/me/sales', response_model=Page[OrderOut])
+async def api_me_sales(cursor: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    orders, next_cursor = await paginate_async(db, select(Order).where(Order.seller_id == current_user.id), Order, cursor, limit)
+    return Page(items=orders, next_cursor=next_cursor)
 
 @app.delete('/api/me/books/{book_id}')
 def api_me_delete_book(book_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -933,8 +1307,12 @@ def api_me_delete_book(book_id: str, db: Session = Depends(get_db), current_user
     if db.query(Order).filter(Order.book_id == book.id).count() > 0:
         # safety: prevent deleting if orders reference it
         raise HTTPException(status_code=400, detail='存在关联订单，无法删除')
+    urls = book_image_urls(book)
     db.delete(book)
     db.commit()
+    search_index.remove(book_id)
+    response_cache.invalidate_book(book_id)
+    release_blobs(db, urls)
     return {'deleted': True}
 
 @app.post('/api/orders/{order_id}/pay', response_model=OrderOut)
@@ -955,26 +1333,31 @@ def pay_order(order_id: str, payload: PaymentConfirmPayload, db: Session = Depen
     if book:
         book.status = BookStatus.sold
         db.commit(); db.refresh(book)
+        response_cache.invalidate_book(book.id, membership_changed=True)
     return order
 
-@app.post('/api/uploads/images')
-async def upload_image(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
-    if not file.filename:
-        raise HTTPException(status_code=400, detail='文件名无效')
-    ext = Path(file.filename).suffix.lower()
-    allowed = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
-    if ext not in allowed:
-        raise HTTPException(status_code=400, detail='不支持的图片格式')
-    data = await file.read()
-    max_size = 5 * 1024 * 1024
-    if len(data) > max_size:
-        raise HTTPException(status_code=400, detail='图片大小不能超过5MB')
-    filename = f"{uuid.uuid4().hex}{ext}"
-    dest = UPLOAD_DIR / filename
-    with open(dest, 'wb') as f:
-        f.write(data)
-    url_path = f"/uploads/{filename}"
-    return {'url': url_path, 'filename': filename}
+_UPLOAD_FORM_SCHEMA = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}},
+}}}}}
+
+def _record_variants(path: Path):
+    # Covers saved before the variants were written get them now
+    db = SessionLocal()
+    try:
+        book_ids = record_variants(db, f"/uploads/{path.relative_to(UPLOAD_DIR).as_posix()}")
+        db.commit()
+    finally:
+        db.close()
+    for book_id in book_ids:
+        response_cache.invalidate_book(book_id)
+
+@app.post('/api/uploads/images', openapi_extra=_UPLOAD_FORM_SCHEMA)
+async def upload_image(request: Request, current_user: User = Depends(get_current_user)):
+    # Body is streamed to disk by receive_image rather than read by an UploadFile param
+    dest = await receive_image(request)
+    image_worker.submit(dest, on_done=_record_variants)
+    rel = dest.relative_to(UPLOAD_DIR).as_posix()
+    return {'url': f"/uploads/{rel}", 'filename': dest.name}
 
 class FavoriteOut(BaseModel):
     id: int
@@ -982,10 +1365,17 @@ class FavoriteOut(BaseModel):
     book_id: str
     created_at: datetime.datetime | None = None
     book: BookOut
+    seller_name: str | None = None
 
     class Config:
         from_attributes = True
 
+    @classmethod
+    def from_favorite(cls, fav: Favorite) -> 'FavoriteOut':
+        # Expects fav.book.seller loaded (loading.FAVORITE_LIST)
+        seller = fav.book.seller
+        return cls.model_validate(fav).model_copy(update={'seller_name': seller.name if seller else None})
+
 class ReviewOut(BaseModel):
     id: str
     order_id: str
@@ -998,15 +1388,24 @@ class ReviewOut(BaseModel):
     tags: list[str] | None = None
     is_anonymous: bool
     created_at: datetime.datetime | None = None
+    reviewer_name: str | None = None
 
     class Config:
         from_attributes = True
 
+    @classmethod
+    def from_review(cls, review: Review) -> 'ReviewOut':
+        # Expects review.reviewer loaded (loading.REVIEW_LIST); anonymous reviews stay nameless
+        name = None if review.is_anonymous or review.reviewer is None else review.reviewer.name
+        return cls.model_validate(review).model_copy(update={'reviewer_name': name})
+
 class ReviewCreate(BaseModel):
     rating: int
     content: str | None = None
     tags: list[str] | None = None
     is_anonymous: bool = False
+    # Review the order's courier instead of the other party
+    courier: bool = False
 
 @app.post("/api/books/{book_id}/favorite", response_model=FavoriteOut)
 def favorite_book(book_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -1015,29 +1414,35 @@ def favorite_book(book_id: str, db: Session = Depends(get_db), current_user: Use
         raise HTTPException(status_code=404, detail='Book not found')
     fav = db.query(Favorite).filter(Favorite.book_id == book_id, Favorite.user_id == current_user.id).first()
     if fav:
-        return FavoriteOut(book=fav.book, **fav.__dict__)
+        return FavoriteOut.model_validate(fav)
     fav = Favorite(book_id=book_id, user_id=current_user.id)
-    book.favorite_count += 1
     db.add(fav)
-    db.commit(); db.refresh(fav); db.refresh(book)
-    return FavoriteOut(book=fav.book, **fav.__dict__)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request favorited first (unique_user_book)
+        db.rollback()
+        fav = db.query(Favorite).filter(Favorite.book_id == book_id, Favorite.user_id == current_user.id).one()
+        return FavoriteOut.model_validate(fav)
+    db.refresh(fav)
+    book_counters.record_favorite(book_id, 1)
+    return FavoriteOut.model_validate(fav)
 
 @app.delete('/api/books/{book_id}/favorite')
 def unfavorite_book(book_id: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    fav = db.query(Favorite).filter(Favorite.book_id == book_id, Favorite.user_id == current_user.id).first()
-    if not fav:
+    # Only the request whose DELETE removed the row counts the unfavorite
+    deleted = db.query(Favorite).filter(Favorite.book_id == book_id, Favorite.user_id == current_user.id).delete(synchronize_session=False)
+    if not deleted:
         raise HTTPException(status_code=404, detail='Favorite not found')
-    book = fav.book
-    db.delete(fav)
-    if book.favorite_count > 0:
-        book.favorite_count -= 1
-    db.commit(); db.refresh(book)
+    db.commit()
+    book_counters.record_favorite(book_id, -1)
     return {'deleted': True}
 
-@app.get('/api/me/favorites', response_model=List[FavoriteOut])
-def list_my_favorites(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    favs = db.query(Favorite).filter(Favorite.user_id == current_user.id).order_by(Favorite.created_at.desc()).all()
-    return [FavoriteOut(book=f.book, **f.__dict__) for f in favs]
+@app.get('/api/me/favorites', response_model=Page[FavoriteOut])
+def list_my_favorites(cursor: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    query = db.query(Favorite).options(*FAVORITE_LIST).filter(Favorite.user_id == current_user.id)
+    favs, next_cursor = paginate(query, Favorite, cursor, limit)
+    return Page(items=[FavoriteOut.from_favorite(f) for f in favs], next_cursor=next_cursor)
 
 @app.post('/api/orders/{order_id}/reviews', response_model=ReviewOut)
 def create_review(order_id: str, payload: ReviewCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -1046,25 +1451,52 @@ def create_review(order_id: str, payload: ReviewCreate, db: Session = Depends(ge
         raise HTTPException(status_code=404, detail='Order not found')
     if current_user.id not in (order.buyer_id, order.seller_id):
         raise HTTPException(status_code=403, detail='无权评价该订单')
+    if order.status != OrderStatus.completed:
+        # Reviews move credit_score, so only finished trades may leave one
+        raise HTTPException(status_code=400, detail='订单完成后才能评价')
+    if not 1 <= payload.rating <= 5:
+        raise HTTPException(status_code=400, detail='评分需为 1-5')
+    if payload.courier:
+        reviewed_id = db.query(Courier.user_id).join(DeliveryTask, DeliveryTask.courier_id == Courier.id).filter(
+            DeliveryTask.order_id == order_id, DeliveryTask.status == DeliveryTaskStatus.delivered,
+        ).scalar()
+        if reviewed_id is None:
+            raise HTTPException(status_code=400, detail='该订单没有已送达的配送任务')
+        role = ReviewRole.courier
+    else:
+        reviewed_id = order.seller_id if current_user.id == order.buyer_id else order.buyer_id
+        role = ReviewRole.buyer if current_user.id == order.buyer_id else ReviewRole.seller
     review = Review(
         order_id=order_id,
         reviewer_id=current_user.id,
-        reviewed_id=order.seller_id if current_user.id == order.buyer_id else order.buyer_id,
+        reviewed_id=reviewed_id,
         book_id=order.book_id,
-        role=ReviewRole.buyer if current_user.id == order.buyer_id else ReviewRole.seller,
+        role=role,
         rating=payload.rating,
         content=payload.content,
         tags=payload.tags,
         is_anonymous=payload.is_anonymous,
     )
     db.add(review)
-    db.commit(); db.refresh(review)
+    try:
+        # Flushed first so a duplicate fails here rather than in record_review's UPDATE
+        db.flush()
+        # Same transaction: the aggregates move only if the review is stored
+        record_review(db, reviewed_id, payload.rating, role)
+        db.commit()
+    except IntegrityError:
+        # unique_order_reviewer: this order was already reviewed in this role
+        db.rollback()
+        raise HTTPException(status_code=400, detail='已评价过该订单')
+    db.refresh(review)
+    user_cache.invalidate(reviewed_id)
     return review
 
-@app.get('/api/books/{book_id}/reviews', response_model=List[ReviewOut])
-def list_book_reviews(book_id: str, db: Session = Depends(get_db)):
-    reviews = db.query(Review).filter(Review.book_id == book_id).order_by(Review.created_at.desc()).all()
-    return reviews
+@app.get('/api/books/{book_id}/reviews', response_model=Page[ReviewOut])
+async def list_book_reviews(book_id: str, cursor: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_async_read_db)):
+    stmt = select(Review).options(*REVIEW_LIST).where(Review.book_id == book_id)
+    reviews, next_cursor = await paginate_async(db, stmt, Review, cursor, limit)
+    return Page(items=[ReviewOut.from_review(r) for r in reviews], next_cursor=next_cursor)
 
 class DeliveryRequestPayload(BaseModel):
     pickup_location: str
@@ -1099,7 +1531,11 @@ def request_delivery(order_id: str, payload: DeliveryRequestPayload, db: Session
     payment_window = datetime.datetime.utcnow() + datetime.timedelta(minutes=PAYMENT_WINDOW_MINUTES)
     if not order.payment_due_at or order.payment_due_at < datetime.datetime.utcnow():
         order.payment_due_at = payment_window
-    task = db.query(DeliveryTask).filter(DeliveryTask.order_id == order.id).first()
+    # Locked so a courier cannot accept it between this check and the commit
+    task = db.query(DeliveryTask).filter(DeliveryTask.order_id == order.id).with_for_update().first()
+    if task and task.status not in (DeliveryTaskStatus.pending, DeliveryTaskStatus.cancelled):
+        # A courier holds it (or has delivered it); re-opening would strand them
+        raise HTTPException(status_code=409, detail='配送任务已被接单，无法重新安排')
     if not task:
         task = DeliveryTask(
             id=str(uuid.uuid4()),
@@ -1116,7 +1552,11 @@ def request_delivery(order_id: str, payload: DeliveryRequestPayload, db: Session
         task.delivery_fee = order.delivery_fee
         task.status = DeliveryTaskStatus.pending
         task.courier_id = None
+        task.accepted_at = task.picked_up_at = task.delivered_at = None
+        task.actual_duration = None
+    prepare_task(task)
     db.commit(); db.refresh(order)
+    task_feed.added(task)
     return order
 
 @app.post('/api/orders/{order_id}/cancel', response_model=OrderOut)
@@ -1131,13 +1571,100 @@ def cancel_order(order_id: str, db: Session = Depends(get_db), current_user: Use
     order.status = OrderStatus.cancelled
     order.payment_status = PaymentStatus.failed if order.payment_status == PaymentStatus.pending else order.payment_status
     order.cancelled_at = datetime.datetime.utcnow()
-    book = db.query(Book).filter(Book.id == order.book_id).first()
-    if book and book.status in [BookStatus.reserved, BookStatus.off_shelf]:
-        book.status = BookStatus.available
-    task = db.query(DeliveryTask).filter(DeliveryTask.order_id == order.id).first()
-    if task:
-        task.status = DeliveryTaskStatus.cancelled
-        task.courier_id = None
+    released = release_orders(db, [order.id])
     db.commit(); db.refresh(order)
+    orders_released([order.id], released)
     return order
 
+
+class ChatSessionCreate(BaseModel):
+    peer_id: str
+    book_id: str | None = None
+
+class ChatSessionOut(BaseModel):
+    id: str
+    user1_id: str
+    user2_id: str
+    peer_id: str
+    book_id: str | None = None
+    last_message: str | None = None
+    last_message_at: datetime.datetime | None = None
+    unread_count: int = 0
+    created_at: datetime.datetime | None = None
+
+    @classmethod
+    def for_user(cls, s: ChatSession, user_id: str) -> 'ChatSessionOut':
+        mine = s.unread_count_user1 if user_id == s.user1_id else s.unread_count_user2
+        return cls(
+            id=s.id, user1_id=s.user1_id, user2_id=s.user2_id,
+            peer_id=s.user2_id if user_id == s.user1_id else s.user1_id,
+            book_id=s.book_id, last_message=s.last_message, last_message_at=s.last_message_at,
+            unread_count=mine or 0, created_at=s.created_at,
+        )
+
+class ChatMessageOut(BaseModel):
+    id: str
+    session_id: str
+    sender_id: str
+    message_type: MessageType
+    content: str
+    image_url: str | None = None
+    is_read: bool = False
+    read_at: datetime.datetime | None = None
+    created_at: datetime.datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+class ChatMessageCreate(BaseModel):
+    content: str
+    message_type: MessageType = MessageType.text
+    image_url: str | None = None
+
+@app.websocket('/api/chat/ws')
+async def chat_socket(websocket: WebSocket, token: str = ''):
+    # Browsers cannot set headers on a WebSocket handshake, so the token comes in the query string
+    user_id = session_store.get(token) if token else None
+    if not user_id:
+        await websocket.close(code=4401)
+        return
+    await chat_service.serve(websocket, user_id)
+
+@app.post('/api/chat/sessions', response_model=ChatSessionOut)
+async def open_chat_session(payload: ChatSessionCreate, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    if payload.peer_id == current_user.id:
+        raise HTTPException(status_code=400, detail='不能与自己聊天')
+    if await db.get(User, payload.peer_id) is None:
+        raise HTTPException(status_code=404, detail='User not found')
+    if payload.book_id and await db.get(Book, payload.book_id) is None:
+        raise HTTPException(status_code=404, detail='Book not found')
+    s = await chat_service.open_session(db, current_user.id, payload.peer_id, payload.book_id)
+    return ChatSessionOut.for_user(s, current_user.id)
+
+@app.get('/api/chat/sessions', response_model=Page[ChatSessionOut])
+async def list_chat_sessions(cursor: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    # Inbox: most recent conversation first
+    sessions, next_cursor = await chat_service.inbox(db, current_user.id, cursor, limit)
+    return Page(items=[ChatSessionOut.for_user(s, current_user.id) for s in sessions], next_cursor=next_cursor)
+
+@app.get('/api/chat/unread')
+async def chat_unread_total(db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    return {'total': await chat_service.unread_total(db, current_user.id)}
+
+@app.get('/api/chat/sessions/{session_id}/messages', response_model=Page[ChatMessageOut])
+async def list_chat_messages(session_id: str, cursor: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    await chat_service.participants(db, session_id, current_user.id)
+    # Read-your-writes for messages this worker has not flushed yet
+    await chat_service.writer.flush()
+    # Newest first, keyset on (session_id, created_at, id): idx_chat_messages_session_created
+    messages, next_cursor = await paginate_async(db, select(ChatMessage).where(ChatMessage.session_id == session_id), ChatMessage, cursor, limit)
+    return Page(items=messages, next_cursor=next_cursor)
+
+@app.post('/api/chat/sessions/{session_id}/messages', response_model=ChatMessageOut)
+async def send_chat_message(session_id: str, payload: ChatMessageCreate, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    return await chat_service.send(db, current_user.id, session_id, payload.content, payload.message_type, payload.image_url)
+
+@app.post('/api/chat/sessions/{session_id}/read')
+async def read_chat_session(session_id: str, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    await chat_service.mark_read(db, current_user.id, session_id)
+    return {'ok': True}
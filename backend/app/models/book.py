@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, DECIMAL, Enum, Text, ForeignKey, TIMESTAMP, DATE
+from sqlalchemy import Column, String, Integer, Boolean, DECIMAL, Enum, Text, ForeignKey, TIMESTAMP, DATE, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
@@ -19,6 +19,11 @@ class BookStatus(enum.Enum):
 
 class Book(Base, UUIDPrimaryKeyMixin, TimestampMixin):
     __tablename__ = 'books'
+    __table_args__ = (
+        Index('idx_books_status_created', 'status', 'created_at', 'id'),
+        Index('idx_books_seller_created', 'seller_id', 'created_at', 'id'),
+        Index('idx_books_updated_at', 'updated_at'),
+    )
     isbn = Column(String(20), nullable=False)
     title = Column(String(200), nullable=False)
     author = Column(String(100), nullable=False)
@@ -28,6 +33,8 @@ class Book(Base, UUIDPrimaryKeyMixin, TimestampMixin):
     edition = Column(String(50))
     category_id = Column(Integer, ForeignKey('book_categories.id'))
     cover_image = Column(String(500))
+    # Comma-separated names of the rendered WebP variants of cover_image (images.py)
+    cover_variants = Column(String(50))
     gallery_images = Column(Text)
     description = Column(Text)
     original_price = Column(DECIMAL(10,2), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Text, TIMESTAMP, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, String, Integer, Text, TIMESTAMP, ForeignKey, Enum, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
@@ -12,9 +12,17 @@ class MessageType(enum.Enum):
 
 class ChatSession(Base, UUIDPrimaryKeyMixin, TimestampMixin):
     __tablename__ = 'chat_sessions'
+    __table_args__ = (
+        Index('idx_chat_sessions_user1_last', 'user1_id', 'last_message_at', 'id'),
+        Index('idx_chat_sessions_user2_last', 'user2_id', 'last_message_at', 'id'),
+        # "<user1_id>:<user2_id>:<book_id or ''>": one session per pair and book,
+        # including book-less ones (a NULL book_id would not collide in an index)
+        Index('uq_chat_sessions_pair_key', 'pair_key', unique=True),
+    )
     user1_id = Column(String(36), ForeignKey('users.id'), nullable=False)
     user2_id = Column(String(36), ForeignKey('users.id'), nullable=False)
     book_id = Column(String(36), ForeignKey('books.id'))
+    pair_key = Column(String(110))
     last_message = Column(Text)
     last_message_at = Column(TIMESTAMP)
     unread_count_user1 = Column(Integer, default=0)
@@ -23,10 +31,14 @@ class ChatSession(Base, UUIDPrimaryKeyMixin, TimestampMixin):
     user1 = relationship('User', back_populates='chat_sessions_user1', foreign_keys=[user1_id])
     user2 = relationship('User', back_populates='chat_sessions_user2', foreign_keys=[user2_id])
     book = relationship('Book')
-    messages = relationship('ChatMessage', back_populates='session', cascade='all, delete-orphan')
+    # Never loaded whole; history is paged by /api/chat/sessions/{id}/messages
+    messages = relationship('ChatMessage', back_populates='session', lazy='write_only', cascade='all, delete-orphan', passive_deletes=True)
 
 class ChatMessage(Base, UUIDPrimaryKeyMixin):
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        Index('idx_chat_messages_session_created', 'session_id', 'created_at', 'id'),
+    )
     session_id = Column(String(36), ForeignKey('chat_sessions.id', ondelete='CASCADE'), nullable=False)
     sender_id = Column(String(36), ForeignKey('users.id'), nullable=False)
     message_type = Column(Enum(MessageType), default=MessageType.text)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, DECIMAL, Enum, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, String, Integer, Boolean, DECIMAL, Enum, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .mixins import UUIDPrimaryKeyMixin, TimestampMixin
 from ..database import Base
@@ -12,6 +12,9 @@ class CourierStatus(enum.Enum):
 
 class Courier(Base, UUIDPrimaryKeyMixin, TimestampMixin):
     __tablename__ = 'couriers'
+    __table_args__ = (
+        Index('idx_couriers_online_seen', 'is_online', 'last_online_time'),
+    )
     user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, unique=True)
     id_card_number = Column(String(20), nullable=False)
     id_card_front = Column(String(500))
@@ -21,8 +24,14 @@ class Courier(Base, UUIDPrimaryKeyMixin, TimestampMixin):
     total_orders = Column(Integer, default=0)
     completed_orders = Column(Integer, default=0)
     rating = Column(DECIMAL(3,2), default=5.0)
+    # Number of courier reviews behind ``rating`` (maintained by reputation.py)
+    review_count = Column(Integer, default=0)
     is_online = Column(Boolean, default=False)
     last_online_time = Column(TIMESTAMP)
+    # Last reported position: GPS, or a campus zone name (see dispatch.py)
+    current_lat = Column(DECIMAL(9,6))
+    current_lng = Column(DECIMAL(9,6))
+    current_zone = Column(String(50))
 
     user = relationship('User', back_populates='courier_profile')
     tasks = relationship('DeliveryTask', back_populates='courier')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DECIMAL, Enum, TIMESTAMP, ForeignKey, Integer
+from sqlalchemy import Column, String, DECIMAL, Enum, TIMESTAMP, ForeignKey, Integer, Index
 from sqlalchemy.orm import relationship
 from ..database import Base
 from .mixins import UUIDPrimaryKeyMixin, TimestampMixin
@@ -14,6 +14,9 @@ class DeliveryTaskStatus(enum.Enum):
 
 class DeliveryTask(Base, UUIDPrimaryKeyMixin, TimestampMixin):
     __tablename__ = 'delivery_tasks'
+    __table_args__ = (
+        Index('idx_delivery_tasks_status_created', 'status', 'created_at', 'id'),
+    )
     id = Column(String(36), primary_key=True)
     order_id = Column(String(36), ForeignKey('orders.id', ondelete='CASCADE'), nullable=False)
     courier_id = Column(String(36), ForeignKey('couriers.id'))
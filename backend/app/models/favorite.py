@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey
+from sqlalchemy import Column, Integer, String, TIMESTAMP, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
 
 class Favorite(Base):
     __tablename__ = 'favorites'
+    __table_args__ = (
+        Index('unique_user_book', 'user_id', 'book_id', unique=True),
+        Index('idx_favorites_user_created', 'user_id', 'created_at', 'id'),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     book_id = Column(String(36), ForeignKey('books.id', ondelete='CASCADE'), nullable=False)
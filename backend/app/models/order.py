@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DECIMAL, Enum, TIMESTAMP, ForeignKey, VARCHAR
+from sqlalchemy import Column, String, DECIMAL, Enum, TIMESTAMP, ForeignKey, VARCHAR, Index
 from sqlalchemy.orm import relationship
 from ..database import Base
 from .mixins import UUIDPrimaryKeyMixin, TimestampMixin
@@ -30,6 +30,11 @@ class PaymentStatus(enum.Enum):
 
 class Order(Base, UUIDPrimaryKeyMixin, TimestampMixin):
     __tablename__ = 'orders'
+    __table_args__ = (
+        Index('idx_orders_buyer_created', 'buyer_id', 'created_at', 'id'),
+        Index('idx_orders_seller_created', 'seller_id', 'created_at', 'id'),
+        Index('idx_orders_status_due', 'status', 'payment_due_at'),
+    )
     order_number = Column(String(50), unique=True, nullable=False)
     book_id = Column(String(36), ForeignKey('books.id'), nullable=False)
     buyer_id = Column(String(36), ForeignKey('users.id'), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, Enum, TIMESTAMP, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, Boolean, Enum, TIMESTAMP, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
@@ -12,6 +12,10 @@ class ReviewRole(enum.Enum):
 
 class Review(Base, UUIDPrimaryKeyMixin):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        Index('idx_reviews_book_created', 'book_id', 'created_at', 'id'),
+        Index('idx_reviews_reviewed_role', 'reviewed_id', 'role', 'rating'),
+    )
     order_id = Column(String(36), ForeignKey('orders.id', ondelete='CASCADE'), nullable=False)
     reviewer_id = Column(String(36), ForeignKey('users.id'), nullable=False)
     reviewed_id = Column(String(36), ForeignKey('users.id'), nullable=False)
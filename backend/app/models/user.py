@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, TIMESTAMP
+from sqlalchemy import Column, String, Integer, Boolean, TIMESTAMP, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
@@ -6,6 +6,9 @@ from .mixins import UUIDPrimaryKeyMixin, TimestampMixin
 
 class User(Base, UUIDPrimaryKeyMixin, TimestampMixin):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('idx_users_created', 'created_at', 'id'),
+    )
     student_id = Column(String(20), unique=True, nullable=False)
     name = Column(String(50), nullable=False)
     email = Column(String(100), unique=True)
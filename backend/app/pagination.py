@@ -0,0 +1,140 @@
+"""Keyset (cursor) pagination helpers for list endpoints.
+
+Every list is ordered by ``(created_at DESC, id DESC)`` -- or another
+timestamp column passed as ``sort_key``, e.g. the chat inbox's
+``last_message_at`` -- and the cursor is the opaque encoding of the last row
+returned, so page N costs the same index range scan as page 1 (no OFFSET).
+"""
+import base64
+import datetime
+import json
+from typing import Generic, TypeVar
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+T = TypeVar('T')
+
+
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: str | None = None
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime.datetime) else v for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(values, list):
+            raise ValueError(cursor)
+        return values
+    except Exception:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+def decode_keyset(cursor: str) -> tuple[datetime.datetime, object]:
+    values = decode_cursor(cursor)
+    try:
+        created_at, last_id = values
+        return datetime.datetime.fromisoformat(created_at), last_id
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+def keyset_condition(model, cursor: str | None, sort_key: str = 'created_at'):
+    """``(sort_key, id) < cursor`` in DESC order, or None for the first page."""
+    if not cursor:
+        return None
+    value, last_id = decode_keyset(cursor)
+    column = getattr(model, sort_key)
+    return or_(
+        column < value,
+        and_(column == value, model.id < last_id),
+    )
+
+
+def keyset_page(rows: list, limit: int, sort_key: str = 'created_at') -> tuple[list, str | None]:
+    """Trim the ``limit + 1`` rows fetched to a page and build the next cursor."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_key), last.id)
+
+
+def paginate(query: Query, model, cursor: str | None, limit: int, sort_key: str = 'created_at') -> tuple[list, str | None]:
+    """Return one page of ``query`` plus the cursor for the next page (or None)."""
+    cond = keyset_condition(model, cursor, sort_key)
+    if cond is not None:
+        query = query.filter(cond)
+    rows = query.order_by(getattr(model, sort_key).desc(), model.id.desc()).limit(limit + 1).all()
+    return keyset_page(rows, limit, sort_key)
+
+
+async def paginate_async(db: AsyncSession, stmt: Select, model, cursor: str | None, limit: int, sort_key: str = 'created_at') -> tuple[list, str | None]:
+    """:func:`paginate` for an ``AsyncSession`` and a ``select()`` statement."""
+    cond = keyset_condition(model, cursor, sort_key)
+    if cond is not None:
+        stmt = stmt.where(cond)
+    result = await db.execute(stmt.order_by(getattr(model, sort_key).desc(), model.id.desc()).limit(limit + 1))
+    return keyset_page(list(result.scalars().all()), limit, sort_key)
+
+
+def _rank_start(cursor: str | None) -> int:
+    if not cursor:
+        return 0
+    values = decode_cursor(cursor)
+    if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    return values[0]
+
+
+def _take_ranked(chunk: list, found: dict, rows: list, pos: int, limit: int) -> int:
+    for row_id in chunk:
+        pos += 1
+        if row_id in found:
+            rows.append(found[row_id])
+            if len(rows) == limit:
+                break
+    return pos
+
+
+def _ranked_cursor(pos: int, ranked_ids: list, rows: list, limit: int) -> str | None:
+    return encode_cursor(pos) if pos < len(ranked_ids) and len(rows) == limit else None
+
+
+def paginate_ranked(query: Query, model, ranked_ids: list, cursor: str | None, limit: int) -> tuple[list, str | None]:
+    """Page through an externally ranked id list (e.g. search results).
+
+    The cursor is the position in ``ranked_ids`` after the last row returned;
+    ids filtered out by ``query`` are skipped without costing a page slot.
+    """
+    rows: list = []
+    pos = _rank_start(cursor)
+    while pos < len(ranked_ids) and len(rows) < limit:
+        chunk = ranked_ids[pos:pos + limit * 2]
+        found = {row.id: row for row in query.filter(model.id.in_(chunk)).all()}
+        pos = _take_ranked(chunk, found, rows, pos, limit)
+    return rows, _ranked_cursor(pos, ranked_ids, rows, limit)
+
+
+async def paginate_ranked_async(db: AsyncSession, stmt: Select, model, ranked_ids: list, cursor: str | None, limit: int) -> tuple[list, str | None]:
+    rows: list = []
+    pos = _rank_start(cursor)
+    while pos < len(ranked_ids) and len(rows) < limit:
+        chunk = ranked_ids[pos:pos + limit * 2]
+        result = await db.execute(stmt.where(model.id.in_(chunk)))
+        found = {row.id: row for row in result.scalars().all()}
+        pos = _take_ranked(chunk, found, rows, pos, limit)
+    return rows, _ranked_cursor(pos, ranked_ids, rows, limit)
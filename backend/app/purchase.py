@@ -0,0 +1,161 @@
+"""Single-transaction purchase path shared by every order-creating endpoint.
+
+The book is claimed with a conditional UPDATE::
+
+    UPDATE books SET status = 'reserved' WHERE id = :id AND status = 'available'
+
+and only the request whose UPDATE matched a row goes on to insert the order
+(and its delivery task) in the same transaction. Losers get a 400 without
+ever having read a stale ``status``, so two buyers can never both win the
+same book, and no explicit ``SELECT ... FOR UPDATE`` is needed.
+
+Cancelling is the reverse, and every cancelling path (buyer/seller cancel,
+``PATCH /api/orders/{id}``, the admin status form, the payment sweeper) goes
+through :func:`release_orders` before its commit and :func:`orders_released`
+after it, so the book, the delivery task and the courier feed always agree.
+"""
+import datetime
+import os
+import uuid
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from .models.book import Book, BookStatus
+from .models.order import Order, OrderStatus, DeliveryMethod, PaymentMethod, PaymentStatus
+from .models.delivery_task import DeliveryTask, DeliveryTaskStatus
+from .response_cache import response_cache
+from .taskfeed import task_feed
+from .delivery import prepare_task
+
+PAYMENT_WINDOW_MINUTES = int(os.getenv("PAYMENT_WINDOW_MINUTES", "15"))
+
+
+def default_delivery_fee(method: DeliveryMethod) -> float:
+    return 0 if method == DeliveryMethod.meetup else 5
+
+
+def new_order_number() -> str:
+    # YYYYMMDDHHMMSS + 6 hex
+    return datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S") + uuid.uuid4().hex[:6]
+
+
+def claim_book(db: Session, book_id: str) -> bool:
+    """Flip ``available`` -> ``reserved``; True only for the caller that won."""
+    claimed = db.query(Book).filter(Book.id == book_id, Book.status == BookStatus.available).update(
+        {Book.status: BookStatus.reserved}, synchronize_session=False
+    )
+    return claimed == 1
+
+
+def release_orders(db: Session, order_ids) -> list[str]:
+    """Undo the side effects of orders cancelled in this transaction.
+
+    Books still ``reserved`` go back to ``available`` and unfinished delivery
+    tasks are cancelled. Returns the book ids; the caller commits and then
+    calls :func:`orders_released`.
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return []
+    book_ids = list({row.book_id for row in db.query(Order.book_id).filter(Order.id.in_(order_ids))})
+    if book_ids:
+        db.query(Book).filter(Book.id.in_(book_ids), Book.status == BookStatus.reserved).update(
+            {Book.status: BookStatus.available}, synchronize_session=False
+        )
+    db.query(DeliveryTask).filter(
+        DeliveryTask.order_id.in_(order_ids),
+        DeliveryTask.status.notin_([DeliveryTaskStatus.delivered, DeliveryTaskStatus.cancelled]),
+    ).update({DeliveryTask.status: DeliveryTaskStatus.cancelled, DeliveryTask.courier_id: None}, synchronize_session=False)
+    return book_ids
+
+
+def orders_released(order_ids, book_ids):
+    """After the commit: drop cached pages of the books and the tasks from the courier feed."""
+    for book_id in book_ids:
+        response_cache.invalidate_book(book_id, membership_changed=True)
+    task_feed.orders_closed(order_ids)
+
+
+def place_order(
+    db: Session,
+    book_id: str,
+    buyer_id: str,
+    delivery_method: DeliveryMethod,
+    *,
+    meetup_location: str | None = None,
+    meetup_time: datetime.datetime | None = None,
+    pickup_location: str | None = None,
+    delivery_location: str | None = None,
+    delivery_fee: float | None = None,
+    payment_method: PaymentMethod | None = None,
+    create_delivery_task: bool = False,
+    payment_due_at: datetime.datetime | None = None,
+    payment_deadline: bool = True,
+) -> Order:
+    """Reserve ``book_id`` for ``buyer_id`` and create its order in one commit.
+
+    ``payment_due_at`` defaults to now + ``PAYMENT_WINDOW_MINUTES``; with
+    ``payment_deadline=False`` it stays NULL, so the expiry sweeper never
+    cancels the order (admin-created orders). Raises
+    ``HTTPException`` (404 unknown book, 400 own listing / not available);
+    the session is rolled back on any failure so the reservation never leaks.
+    """
+    # Unlocked pre-check: rejects the common failures without touching the row lock
+    row = db.query(Book.seller_id, Book.status).filter(Book.id == book_id).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Book not found")
+    if row.seller_id == buyer_id:
+        raise HTTPException(status_code=400, detail="Cannot purchase your own listing")
+    if row.status != BookStatus.available:
+        raise HTTPException(status_code=400, detail="Book not available")
+    try:
+        if not claim_book(db, book_id):
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Book not available")
+        # The claimed row is now locked by this transaction, so the price read
+        # here is the one the buyer is charged
+        seller_id, price = db.query(Book.seller_id, Book.selling_price).filter(Book.id == book_id).one()
+        fee = delivery_fee if delivery_fee is not None else default_delivery_fee(delivery_method)
+        now = datetime.datetime.utcnow()
+        order = Order(
+            id=str(uuid.uuid4()),
+            order_number=new_order_number(),
+            book_id=book_id,
+            buyer_id=buyer_id,
+            seller_id=seller_id,
+            book_price=price,
+            delivery_fee=fee,
+            total_amount=float(price) + float(fee),
+            status=OrderStatus.pending,
+            delivery_method=delivery_method,
+            meetup_location=meetup_location,
+            meetup_time=meetup_time,
+            pickup_location=pickup_location,
+            delivery_location=delivery_location,
+            payment_method=payment_method,
+            payment_status=PaymentStatus.pending,
+            payment_due_at=(payment_due_at or now + datetime.timedelta(minutes=PAYMENT_WINDOW_MINUTES)) if payment_deadline else None,
+        )
+        db.add(order)
+        task = None
+        if create_delivery_task and delivery_method == DeliveryMethod.delivery:
+            task = DeliveryTask(
+                id=str(uuid.uuid4()),
+                order_id=order.id,
+                pickup_location=pickup_location,
+                delivery_location=delivery_location,
+                delivery_fee=fee,
+                status=DeliveryTaskStatus.pending,
+            )
+            prepare_task(task)
+            db.add(task)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    db.refresh(order)
+    response_cache.invalidate_book(book_id, membership_changed=True)
+    if task is not None:
+        task_feed.added(task)
+    return order
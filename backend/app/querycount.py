@@ -0,0 +1,68 @@
+"""Per-request SQL statement counter.
+
+Every statement sent by any engine (sync or async) is counted into the
+counter active in the current context, so N+1 patterns show up as a count
+that grows with the number of rows. With ``DEBUG_QUERY_COUNT`` enabled each
+response carries ``X-Query-Count``; ``scripts/check_query_counts.py`` uses it
+to assert fixed per-endpoint counts. Contexts are copied into the thread pool
+and preserved across the async engine's greenlets, so sync and async
+endpoints are both covered.
+"""
+import contextlib
+import contextvars
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEBUG_QUERY_COUNT = os.getenv("DEBUG_QUERY_COUNT", "false").lower() in ("1", "true", "yes")
+
+
+class QueryCount:
+    __slots__ = ("count", "statements")
+
+    def __init__(self, record: bool = False):
+        self.count = 0
+        self.statements: list[str] | None = [] if record else None
+
+
+_current: contextvars.ContextVar[QueryCount | None] = contextvars.ContextVar("query_count", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    if counter is not None:
+        counter.count += 1
+        if counter.statements is not None:
+            counter.statements.append(statement)
+
+
+@contextlib.contextmanager
+def count_queries(record: bool = False):
+    """Count the statements executed inside the block (same context only)."""
+    counter = QueryCount(record)
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
+
+
+class QueryCountMiddleware:
+    """Adds ``X-Query-Count`` to every HTTP response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with count_queries() as counter:
+            async def send_with_count(message):
+                if message["type"] == "http.response.start":
+                    message.setdefault("headers", [])
+                    message["headers"] = [*message["headers"], (b"x-query-count", str(counter.count).encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_with_count)
@@ -0,0 +1,200 @@
+"""Reputation aggregates stored on the profile rows.
+
+``users.positive_reviews`` / ``negative_reviews`` / ``credit_score`` /
+``total_transactions`` and ``couriers.rating`` / ``review_count`` are kept up
+to date as reviews and orders are written, so a profile or seller badge reads
+one row instead of running AVG/COUNT over ``reviews``:
+
+* :func:`record_review` runs in the transaction that inserts a review (only
+  completed orders can be reviewed). It is one additive ``UPDATE`` on the
+  reviewed user (``col = col + k``, with ``credit_score`` derived from the new
+  counts in the same statement), plus one on their courier row for courier
+  reviews (incremental average).
+* :func:`transition_order` changes an order's status with a conditional
+  ``UPDATE ... WHERE status = <old>``. Only the request that actually moves it
+  into (or out of) ``completed`` adjusts both parties' ``total_transactions``.
+
+Because every change is computed in SQL from the current row, concurrent
+writers never lose increments. :func:`reconcile` repairs whatever still
+drifts (deleted reviews or orders, orders moved out of ``completed``, manual
+edits) by recomputing from ``reviews`` of completed orders and ``orders`` in
+chunks of users. Each chunk locks its user and
+courier rows first, so increments committed meanwhile are neither lost nor
+double counted::
+
+    python -m backend.app.reputation reconcile [--chunk 500] [--dry-run]
+"""
+import argparse
+import datetime
+import os
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, update
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models.courier import Courier
+from .models.order import Order, OrderStatus
+from .models.review import Review, ReviewRole
+from .models.user import User
+
+REPUTATION_RECONCILE_CHUNK = int(os.getenv("REPUTATION_RECONCILE_CHUNK", "500"))
+POSITIVE_MIN_RATING = 4
+NEGATIVE_MAX_RATING = 2
+CREDIT_BASE = 100
+CREDIT_PER_POSITIVE = 1
+CREDIT_PER_NEGATIVE = 5
+CREDIT_MIN, CREDIT_MAX = 0, 200
+DEFAULT_COURIER_RATING = 5.0
+
+
+def credit_score(positive: int, negative: int) -> int:
+    raw = CREDIT_BASE + CREDIT_PER_POSITIVE * positive - CREDIT_PER_NEGATIVE * negative
+    return max(CREDIT_MIN, min(CREDIT_MAX, raw))
+
+
+def _credit_sql(positive, negative):
+    raw = CREDIT_BASE + CREDIT_PER_POSITIVE * positive - CREDIT_PER_NEGATIVE * negative
+    return case((raw < CREDIT_MIN, CREDIT_MIN), (raw > CREDIT_MAX, CREDIT_MAX), else_=raw)
+
+
+def record_review(db: Session, reviewed_id: str, rating: int, role: ReviewRole):
+    """Fold a new review into the reviewed user's (and courier's) aggregates."""
+    dp = int(rating >= POSITIVE_MIN_RATING)
+    dn = int(rating <= NEGATIVE_MAX_RATING)
+    if dp or dn:
+        positive = func.coalesce(User.positive_reviews, 0) + dp
+        negative = func.coalesce(User.negative_reviews, 0) + dn
+        # MySQL applies SET assignments left to right, so the score (which reads
+        # the old counts plus the delta) must come before the counts themselves
+        db.execute(update(User).where(User.id == reviewed_id).ordered_values(
+            (User.credit_score, _credit_sql(positive, negative)),
+            (User.positive_reviews, positive),
+            (User.negative_reviews, negative),
+        ))
+    if role == ReviewRole.courier:
+        count = func.coalesce(Courier.review_count, 0)
+        db.execute(update(Courier).where(Courier.user_id == reviewed_id).ordered_values(
+            (Courier.rating, (func.coalesce(Courier.rating, 0) * count + rating) / (count + 1)),
+            (Courier.review_count, count + 1),
+        ))
+
+
+def transition_order(db: Session, order: Order, new_status: OrderStatus, now: datetime.datetime | None = None) -> bool:
+    """Set ``order.status``, counting completions; the caller commits.
+
+    Returns False when the order already has ``new_status``; raises 409 if a
+    concurrent request changed it first.
+    """
+    old_status = order.status
+    if new_status == old_status:
+        return False
+    values = {Order.status: new_status}
+    if new_status == OrderStatus.completed:
+        values[Order.completed_at] = now or datetime.datetime.utcnow()
+    won = db.query(Order).filter(Order.id == order.id, Order.status == old_status).update(values, synchronize_session=False)
+    if won != 1:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="订单状态已变化，请刷新")
+    delta = int(new_status == OrderStatus.completed) - int(old_status == OrderStatus.completed)
+    if delta:
+        db.query(User).filter(User.id.in_([order.buyer_id, order.seller_id])).update(
+            {User.total_transactions: func.coalesce(User.total_transactions, 0) + delta},
+            synchronize_session=False,
+        )
+    db.expire(order, ["status", "completed_at"])
+    return True
+
+
+def _reconcile_chunk(db: Session, users: list, dry_run: bool) -> tuple[int, int]:
+    ids = [u.id for u in users]
+    reviews = {
+        r.reviewed_id: r for r in db.query(
+            Review.reviewed_id,
+            func.sum(case((Review.rating >= POSITIVE_MIN_RATING, 1), else_=0)).label("positive"),
+            func.sum(case((Review.rating <= NEGATIVE_MAX_RATING, 1), else_=0)).label("negative"),
+        ).join(Order, Order.id == Review.order_id).filter(
+            Review.reviewed_id.in_(ids), Order.status == OrderStatus.completed,
+        ).group_by(Review.reviewed_id)
+    }
+    transactions = dict.fromkeys(ids, 0)
+    for column in (Order.buyer_id, Order.seller_id):
+        for user_id, n in db.query(column, func.count()).filter(column.in_(ids), Order.status == OrderStatus.completed).group_by(column):
+            transactions[user_id] += n
+    repaired_users = 0
+    for u in users:
+        r = reviews.get(u.id)
+        positive, negative = (int(r.positive or 0), int(r.negative or 0)) if r else (0, 0)
+        want = (positive, negative, credit_score(positive, negative), transactions[u.id])
+        if (u.positive_reviews, u.negative_reviews, u.credit_score, u.total_transactions) != want:
+            repaired_users += 1
+            if not dry_run:
+                db.query(User).filter(User.id == u.id).update({
+                    User.positive_reviews: want[0],
+                    User.negative_reviews: want[1],
+                    User.credit_score: want[2],
+                    User.total_transactions: want[3],
+                }, synchronize_session=False)
+
+    couriers = db.query(Courier.id, Courier.user_id, Courier.rating, Courier.review_count).filter(
+        Courier.user_id.in_(ids)
+    ).with_for_update().all()
+    repaired_couriers = 0
+    if couriers:
+        ratings = {
+            r.reviewed_id: r for r in db.query(Review.reviewed_id, func.count().label("n"), func.avg(Review.rating).label("avg")).join(
+                Order, Order.id == Review.order_id
+            ).filter(
+                Review.reviewed_id.in_([c.user_id for c in couriers]), Review.role == ReviewRole.courier,
+                Order.status == OrderStatus.completed,
+            ).group_by(Review.reviewed_id)
+        }
+        for c in couriers:
+            r = ratings.get(c.user_id)
+            count = int(r.n) if r else 0
+            rating = round(float(r.avg), 2) if r else DEFAULT_COURIER_RATING
+            if c.review_count != count or c.rating is None or abs(float(c.rating) - rating) >= 0.01:
+                repaired_couriers += 1
+                if not dry_run:
+                    db.query(Courier).filter(Courier.id == c.id).update(
+                        {Courier.rating: rating, Courier.review_count: count}, synchronize_session=False
+                    )
+    return repaired_users, repaired_couriers
+
+
+def reconcile(db: Session, chunk_size: int = REPUTATION_RECONCILE_CHUNK, dry_run: bool = False) -> dict:
+    """Recompute every user's and courier's aggregates; returns counts of repaired rows."""
+    stats = {"users": 0, "repaired_users": 0, "repaired_couriers": 0}
+    last_id = ""
+    while True:
+        # Locking the chunk's rows makes writers of these profiles wait, so the
+        # aggregates read below include everything they will not add themselves
+        users = db.query(User.id, User.positive_reviews, User.negative_reviews, User.credit_score, User.total_transactions).filter(
+            User.id > last_id
+        ).order_by(User.id).limit(chunk_size).with_for_update().all()
+        if not users:
+            break
+        repaired_users, repaired_couriers = _reconcile_chunk(db, users, dry_run)
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+        stats["users"] += len(users)
+        stats["repaired_users"] += repaired_users
+        stats["repaired_couriers"] += repaired_couriers
+        last_id = users[-1].id
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain reputation aggregates")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("reconcile", help="recompute review counts, credit scores, transactions and courier ratings")
+    rec.add_argument("--chunk", type=int, default=REPUTATION_RECONCILE_CHUNK)
+    rec.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        print("[REPUTATION]", reconcile(db, chunk_size=args.chunk, dry_run=args.dry_run))
+    finally:
+        db.close()
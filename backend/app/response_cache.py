@@ -0,0 +1,155 @@
+"""Pre-encoded JSON response cache for the book detail and list endpoints.
+
+Entries hold the final response bytes plus a strong ETag, expire after a TTL
+and are evicted LRU once either the entry count or the byte budget is
+exceeded. Each entry is tagged with the book ids it contains so a write to one
+book drops exactly the detail page and the list pages that show it; writes
+that can change *which* books a list contains (create, status change) drop
+every list page as well.
+
+The cache is per process: other workers only see a write once their own
+entry expires, so keep ``RESPONSE_CACHE_TTL_SECONDS`` short.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import Request, Response
+
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+LIST_TAG = "books:list"
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "expires_at", "tags")
+
+    def __init__(self, body: bytes, tags: set[str], ttl: float):
+        self.body = body
+        self.etag = make_etag(body)
+        self.expires_at = time.monotonic() + ttl
+        self.tags = tags
+
+
+class ResponseCache:
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL_SECONDS, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        # tag -> keys, so invalidation never scans the whole cache
+        self._tags: dict[str, set[str]] = {}
+        self._bytes = 0
+        # Bumped by every invalidation; see put()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    self._drop_locked(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, body: bytes, tags: set[str], generation: int | None = None) -> CachedResponse:
+        """Cache ``body`` under ``key`` and return the entry.
+
+        Pass the :attr:`generation` read *before* querying the database: if
+        anything was invalidated in between, the body may predate that write
+        and is returned to the caller without being cached.
+        """
+        entry = CachedResponse(body, tags, self.ttl)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return entry
+            self._drop_locked(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop_locked(next(iter(self._entries)))
+        return entry
+
+    def _drop_locked(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate_tag(self, tag: str):
+        with self._lock:
+            self.generation += 1
+            for key in list(self._tags.get(tag, ())):
+                self._drop_locked(key)
+
+    def invalidate_book(self, book_id: str, membership_changed: bool = False):
+        """Drop cached responses that contain ``book_id``.
+
+        ``membership_changed`` means the write may add the book to list pages
+        it is not on yet (new listing, status or category change), so every
+        cached list page goes too.
+        """
+        self.invalidate_tag(f"book:{book_id}")
+        if membership_changed:
+            self.invalidate_tag(LIST_TAG)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+def json_response(request: Request, entry: CachedResponse) -> Response:
+    """200 with the cached bytes, or 304 when the client already has them."""
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and entry.etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def list_cache_key(**params) -> str:
+    norm = []
+    for k in sorted(params):
+        v = params[k]
+        if v is None or v == "":
+            continue
+        if k == "q":
+            v = " ".join(str(v).lower().split())
+        elif k == "include_status":
+            v = ",".join(sorted(s.strip() for s in str(v).split(",") if s.strip()))
+        norm.append(f"{k}={v}")
+    return "books:list?" + "&".join(norm)
+
+
+response_cache = ResponseCache()
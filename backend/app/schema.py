@@ -0,0 +1,114 @@
+"""Migration-aware schema boot.
+
+Each worker reads ``alembic_version`` once at startup. When it already matches
+the newest revision under ``backend/alembic/versions`` no DDL is issued at
+all; otherwise (and only if ``SCHEMA_AUTO_MIGRATE`` is on) one worker upgrades
+the schema while holding a MySQL advisory lock and the others wait, re-check
+and skip.
+"""
+import contextlib
+import os
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from .database import Base
+
+SCHEMA_AUTO_MIGRATE = os.getenv("SCHEMA_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+MIGRATION_LOCK_NAME = "dhu_schema_migrate"
+MIGRATION_LOCK_TIMEOUT = int(os.getenv("SCHEMA_MIGRATE_LOCK_TIMEOUT", "120"))
+ALEMBIC_INI = Path(__file__).resolve().parents[1] / "alembic.ini"
+BASELINE_REVISION = "80bac37d379c"
+# Adds columns SecondHandData.sql lacks but later revisions index
+LEGACY_COLUMNS_REVISION = "c5d83f1e9a02"
+
+# Filled in during startup, reported by /api/health
+boot_info: dict = {"schema": None, "revision": None, "schema_check_ms": None, "startup_ms": None}
+
+
+def _alembic_config(conn: Connection | None = None):
+    from alembic.config import Config
+
+    cfg = Config(str(ALEMBIC_INI))
+    cfg.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    if conn is not None:
+        cfg.attributes["connection"] = conn
+    return cfg
+
+
+def head_revision() -> str | None:
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(_alembic_config()).get_current_head()
+
+
+def current_revision(conn: Connection) -> str | None:
+    from alembic.runtime.migration import MigrationContext
+
+    return MigrationContext.configure(conn).get_current_revision()
+
+
+@contextlib.contextmanager
+def _migration_lock(conn: Connection):
+    if conn.dialect.name != "mysql":
+        yield
+        return
+    got = conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {"name": MIGRATION_LOCK_NAME, "timeout": MIGRATION_LOCK_TIMEOUT}).scalar()
+    if got != 1:
+        raise RuntimeError("timed out waiting for the schema migration lock")
+    try:
+        yield
+    finally:
+        conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK_NAME})
+
+
+def _run_revision(cfg, conn: Connection, revision: str):
+    """Run one revision's ``upgrade()`` outside the chain, without stamping it."""
+    from alembic.operations import Operations
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+
+    script = ScriptDirectory.from_config(cfg).get_revision(revision)
+    with Operations.context(MigrationContext.configure(conn)):
+        script.module.upgrade()
+
+
+def upgrade_to_head(conn: Connection):
+    from alembic import command
+
+    cfg = _alembic_config(conn)
+    if current_revision(conn) is None:
+        # Schema from database/SecondHandData.sql or an old create_all(): fill in
+        # missing tables and columns and adopt it at the baseline. Later
+        # revisions are written to tolerate objects that already exist.
+        Base.metadata.create_all(bind=conn)
+        _run_revision(cfg, conn, LEGACY_COLUMNS_REVISION)
+        command.stamp(cfg, BASELINE_REVISION)
+    command.upgrade(cfg, "head")
+
+
+def ensure_schema(engine: Engine) -> str:
+    """Return ``current``, ``migrated`` or ``outdated``; only the latter two touched DDL paths."""
+    start = time.perf_counter()
+    head = head_revision()
+    with engine.connect() as conn:
+        current = current_revision(conn)
+        if current == head:
+            status = "current"
+        elif not SCHEMA_AUTO_MIGRATE:
+            status = "outdated"
+            print(f"[WARN] schema at {current}, expected {head}; run `alembic upgrade head`")
+        else:
+            with _migration_lock(conn):
+                # Another worker may have finished the upgrade while we waited
+                if current_revision(conn) != head:
+                    upgrade_to_head(conn)
+                    conn.commit()
+                    status = "migrated"
+                else:
+                    status = "current"
+            current = current_revision(conn)
+    boot_info.update(schema=status, revision=current, schema_check_ms=round((time.perf_counter() - start) * 1000, 3))
+    return status
@@ -0,0 +1,254 @@
+"""In-process inverted index for catalogue search.
+
+Replaces the ``%q%`` ILIKE scan in ``list_books``: title/author/publisher/
+description are tokenized once at write time (ASCII words + CJK bigrams) and
+queries are scored with BM25, so lookup cost depends on the number of matching
+postings rather than on the size of the ``books`` table. ISBNs and ASCII terms
+are kept in sorted lists so prefix queries are a bisect instead of a scan:
+the last ASCII word of a query also matches longer words (``pyth`` finds
+"Python"), as the old ILIKE did while the user is still typing.
+"""
+import bisect
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models.book import Book
+
+# Field weights: a hit in the title matters more than one in the description
+FIELD_WEIGHTS = {'title': 3.0, 'author': 2.0, 'publisher': 1.0, 'description': 0.5}
+BM25_K1 = 1.2
+BM25_B = 0.75
+ISBN_BOOST = 10.0
+# Last query word: shortest prefix expanded, how many terms it may expand to,
+# and the weight of a prefix hit relative to a whole-word hit
+PREFIX_MIN_CHARS = 2
+PREFIX_EXPANSIONS = 50
+PREFIX_WEIGHT = 0.8
+# Upper bound of ranked ids handed to SQL for the status filter / hydration
+CANDIDATE_LIMIT = 1000
+# Other workers may have written books; catch up via updated_at at most this often
+CATCH_UP_INTERVAL_SECONDS = 5.0
+
+_TOKEN_RE = re.compile(r'[0-9a-z]+|[\u3400-\u9fff\uf900-\ufaff]+')
+_ISBN_QUERY_RE = re.compile(r'^[0-9xX\- ]{3,}$')
+
+
+def _is_cjk(ch: str) -> bool:
+    return '\u3400' <= ch <= '\u9fff' or '\uf900' <= ch <= '\ufaff'
+
+
+def tokenize(text: str | None) -> list[str]:
+    """Lower-cased ASCII words plus overlapping bigrams for CJK runs.
+
+    ``数据结构`` -> ``数据, 据结, 结构``; a single CJK character is kept as a
+    unigram so one-character queries still match.
+    """
+    if not text:
+        return []
+    tokens: list[str] = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if not _is_cjk(run[0]):
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def normalize_isbn(value: str | None) -> str:
+    return re.sub(r'[^0-9x]', '', (value or '').lower())
+
+
+class SearchIndex:
+    """Thread-safe BM25 index keyed by book id."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+        self._last_catch_up = 0.0
+
+    def _reset(self):
+        # term -> {book_id: weighted term frequency}
+        self._postings: dict[str, dict[str, float]] = defaultdict(dict)
+        self._doc_terms: dict[str, dict[str, float]] = {}
+        self._doc_len: dict[str, float] = {}
+        self._total_len = 0.0
+        # sorted ASCII terms for prefix lookups
+        self._ascii_terms: list[str] = []
+        # sorted (normalized_isbn, book_id) pairs for prefix lookups
+        self._isbns: list[tuple[str, str]] = []
+        self._doc_isbn: dict[str, str] = {}
+        self.watermark = None
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def upsert(self, book: Book):
+        """(Re)index a single book; safe to call for new and updated rows."""
+        terms: dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for tok in tokenize(getattr(book, field, None)):
+                terms[tok] += weight
+        isbn = normalize_isbn(book.isbn)
+        with self._lock:
+            self._remove_locked(book.id)
+            for tok, tf in terms.items():
+                if tok not in self._postings and not _is_cjk(tok[0]):
+                    bisect.insort(self._ascii_terms, tok)
+                self._postings[tok][book.id] = tf
+            self._doc_terms[book.id] = dict(terms)
+            length = sum(terms.values())
+            self._doc_len[book.id] = length
+            self._total_len += length
+            if isbn:
+                bisect.insort(self._isbns, (isbn, book.id))
+                self._doc_isbn[book.id] = isbn
+            updated_at = getattr(book, 'updated_at', None)
+            if updated_at and (self.watermark is None or updated_at > self.watermark):
+                self.watermark = updated_at
+
+    def remove(self, book_id: str):
+        with self._lock:
+            self._remove_locked(book_id)
+
+    def _remove_locked(self, book_id: str):
+        terms = self._doc_terms.pop(book_id, None)
+        if terms is None:
+            return
+        for tok in terms:
+            posting = self._postings.get(tok)
+            if posting is not None:
+                posting.pop(book_id, None)
+                if not posting:
+                    del self._postings[tok]
+                    if not _is_cjk(tok[0]):
+                        i = bisect.bisect_left(self._ascii_terms, tok)
+                        if i < len(self._ascii_terms) and self._ascii_terms[i] == tok:
+                            del self._ascii_terms[i]
+        self._total_len -= self._doc_len.pop(book_id, 0.0)
+        isbn = self._doc_isbn.pop(book_id, None)
+        if isbn is not None:
+            i = bisect.bisect_left(self._isbns, (isbn, book_id))
+            if i < len(self._isbns) and self._isbns[i] == (isbn, book_id):
+                del self._isbns[i]
+
+    def _isbn_prefix(self, prefix: str, limit: int) -> list[str]:
+        i = bisect.bisect_left(self._isbns, (prefix, ''))
+        out = []
+        while i < len(self._isbns) and self._isbns[i][0].startswith(prefix) and len(out) < limit:
+            out.append(self._isbns[i][1])
+            i += 1
+        return out
+
+    def _term_prefix(self, prefix: str, limit: int) -> list[str]:
+        i = bisect.bisect_left(self._ascii_terms, prefix)
+        out = []
+        while i < len(self._ascii_terms) and self._ascii_terms[i].startswith(prefix) and len(out) < limit:
+            if self._ascii_terms[i] != prefix:
+                out.append(self._ascii_terms[i])
+            i += 1
+        return out
+
+    def _bm25(self, tok: str, n_docs: int, avg_len: float) -> dict[str, float]:
+        posting = self._postings.get(tok)
+        if not posting:
+            return {}
+        idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+        out = {}
+        for book_id, tf in posting.items():
+            norm = 1 - BM25_B + BM25_B * self._doc_len[book_id] / avg_len
+            out[book_id] = idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+        return out
+
+    def search(self, q: str, limit: int = CANDIDATE_LIMIT) -> list[str]:
+        """Return book ids ordered by relevance (best first)."""
+        scores: dict[str, float] = defaultdict(float)
+        tokens = tokenize(q)
+        query_terms = set(tokens)
+        last = tokens[-1] if tokens and not _is_cjk(tokens[-1][0]) and len(tokens[-1]) >= PREFIX_MIN_CHARS else None
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if _ISBN_QUERY_RE.match(q.strip()):
+                prefix = normalize_isbn(q)
+                if prefix:
+                    for book_id in self._isbn_prefix(prefix, limit):
+                        scores[book_id] += ISBN_BOOST
+            if n_docs and query_terms:
+                avg_len = (self._total_len / n_docs) or 1.0
+                for tok in query_terms:
+                    for book_id, score in self._bm25(tok, n_docs, avg_len).items():
+                        scores[book_id] += score
+                if last is not None:
+                    # Best expansion per book, so "algo" does not count twice
+                    # for a book with both "algorithm" and "algorithms"
+                    best: dict[str, float] = {}
+                    for tok in self._term_prefix(last, PREFIX_EXPANSIONS):
+                        for book_id, score in self._bm25(tok, n_docs, avg_len).items():
+                            best[book_id] = max(best.get(book_id, 0.0), score)
+                    for book_id, score in best.items():
+                        scores[book_id] += PREFIX_WEIGHT * score
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        return [book_id for book_id, _ in ranked[:limit]]
+
+    def _replace(self, rows):
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self.upsert(row)
+
+    def _catch_up_due(self, force: bool) -> bool:
+        now = time.monotonic()
+        if not force and now - self._last_catch_up < CATCH_UP_INTERVAL_SECONDS:
+            return False
+        self._last_catch_up = now
+        return True
+
+    def _changed_rows_stmt(self):
+        stmt = select(Book.id, Book.isbn, Book.title, Book.author, Book.publisher, Book.description, Book.updated_at)
+        if self.watermark is not None:
+            stmt = stmt.where(Book.updated_at >= self.watermark)
+        return stmt
+
+    def rebuild(self, db: Session):
+        """Load every book from the database, replacing the current contents."""
+        self.watermark = None
+        self._replace(db.execute(self._changed_rows_stmt()).all())
+        self._last_catch_up = time.monotonic()
+
+    def catch_up(self, db: Session, force: bool = False):
+        """Index rows written by other workers since the last seen ``updated_at``.
+
+        Deletions made elsewhere are not observed here, but stale ids are
+        harmless because ``list_books`` re-reads candidates from the database.
+        """
+        if not self._catch_up_due(force):
+            return
+        full = self.watermark is None
+        rows = db.execute(self._changed_rows_stmt()).all()
+        if full:
+            self._replace(rows)
+        else:
+            for row in rows:
+                self.upsert(row)
+
+    async def catch_up_async(self, db: AsyncSession, force: bool = False):
+        if not self._catch_up_due(force):
+            return
+        full = self.watermark is None
+        rows = (await db.execute(self._changed_rows_stmt())).all()
+        if full:
+            self._replace(rows)
+        else:
+            for row in rows:
+                self.upsert(row)
+
+
+search_index = SearchIndex()
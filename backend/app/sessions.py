@@ -0,0 +1,202 @@
+"""Pluggable token/session storage and a small LRU cache of authenticated users.
+
+``SESSION_BACKEND=memory`` keeps tokens in a process-local dict (single worker,
+lost on restart); ``SESSION_BACKEND=sqlite`` (default) stores them in a SQLite
+file in WAL mode so every uvicorn worker on the host shares the same sessions
+and they survive restarts. Both expire tokens after ``SESSION_TTL_SECONDS``.
+"""
+import abc
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .models.user import User
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite").lower()
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", str(Path(__file__).resolve().parents[1] / "sessions.sqlite3"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+# Other workers cannot invalidate this process's cache, so entries also age out
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+
+
+class SessionBackend(abc.ABC):
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS):
+        self.ttl = ttl
+
+    def create(self, user_id: str) -> str:
+        token = secrets.token_hex(32)
+        self._put(token, user_id, time.time() + self.ttl)
+        return token
+
+    @abc.abstractmethod
+    def _put(self, token: str, user_id: str, expires_at: float):
+        ...
+
+    @abc.abstractmethod
+    def get(self, token: str) -> str | None:
+        """Return the user id for a live token, or None if unknown/expired."""
+
+    @abc.abstractmethod
+    def revoke(self, token: str):
+        ...
+
+    @abc.abstractmethod
+    def revoke_user(self, user_id: str):
+        ...
+
+
+class MemorySessionBackend(SessionBackend):
+    def __init__(self, ttl: int = SESSION_TTL_SECONDS):
+        super().__init__(ttl)
+        self._lock = threading.Lock()
+        self._tokens: dict[str, tuple[str, float]] = {}
+
+    def _put(self, token, user_id, expires_at):
+        with self._lock:
+            self._purge_locked()
+            self._tokens[token] = (user_id, expires_at)
+
+    def _purge_locked(self):
+        now = time.time()
+        for token in [t for t, (_, exp) in self._tokens.items() if exp <= now]:
+            del self._tokens[token]
+
+    def get(self, token):
+        with self._lock:
+            entry = self._tokens.get(token)
+            if not entry:
+                return None
+            user_id, expires_at = entry
+            if expires_at <= time.time():
+                del self._tokens[token]
+                return None
+            return user_id
+
+    def revoke(self, token):
+        with self._lock:
+            self._tokens.pop(token, None)
+
+    def revoke_user(self, user_id):
+        with self._lock:
+            for token in [t for t, (uid, _) in self._tokens.items() if uid == user_id]:
+                del self._tokens[token]
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Sessions in a SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path: str = SESSION_DB_PATH, ttl: int = SESSION_TTL_SECONDS):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS sessions (token TEXT PRIMARY KEY, user_id TEXT NOT NULL, expires_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _put(self, token, user_id, expires_at):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO sessions (token, user_id, expires_at) VALUES (?, ?, ?)", (token, user_id, expires_at))
+        conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+
+    def get(self, token):
+        row = self._conn().execute(
+            "SELECT user_id FROM sessions WHERE token = ? AND expires_at > ?", (token, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def revoke(self, token):
+        self._conn().execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+    def revoke_user(self, user_id):
+        self._conn().execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+
+def make_session_backend(kind: str = SESSION_BACKEND) -> SessionBackend:
+    if kind == "memory":
+        return MemorySessionBackend()
+    if kind == "sqlite":
+        return SQLiteSessionBackend()
+    raise ValueError(f"Unknown SESSION_BACKEND: {kind}")
+
+
+class UserCache:
+    """Bounded LRU of detached ``User`` snapshots keyed by user id.
+
+    ``resolve`` merges the snapshot into the request session with
+    ``load=False``, so endpoints get an attached, writable instance without a
+    SELECT. Callers that modify a user must call :meth:`invalidate`.
+    """
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[User, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _snapshot(self, u: User) -> User:
+        copy = User(**{c.key: getattr(u, c.key) for c in User.__table__.columns})
+        make_transient_to_detached(copy)
+        return copy
+
+    def _lookup(self, user_id: str) -> User | None:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def _store(self, u: User):
+        with self._lock:
+            self._entries[u.id] = (self._snapshot(u), time.monotonic() + self.ttl)
+            self._entries.move_to_end(u.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def resolve(self, db: Session, user_id: str) -> User | None:
+        snapshot = self._lookup(user_id)
+        if snapshot is not None:
+            return db.merge(snapshot, load=False)
+        u = db.query(User).filter(User.id == user_id).first()
+        if u is not None:
+            self._store(u)
+        return u
+
+    async def resolve_async(self, db: AsyncSession, user_id: str) -> User | None:
+        snapshot = self._lookup(user_id)
+        if snapshot is not None:
+            return await db.merge(snapshot, load=False)
+        u = await db.get(User, user_id)
+        if u is not None:
+            self._store(u)
+        return u
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+session_store = make_session_backend()
+user_cache = UserCache()
@@ -0,0 +1,240 @@
+"""Push feed of claimable delivery tasks (``GET /api/delivery_tasks/stream``).
+
+Couriers used to poll ``GET /api/delivery_tasks?status=pending``; each poll
+ran the same ORDER BY/LIMIT query. Now every worker keeps the set of
+unassigned pending tasks in memory (:class:`TaskFeed`) and streams it over
+Server-Sent Events:
+
+* on connect the client gets one ``snapshot`` event (the whole set, from
+  memory, no query), then ``added`` / ``removed`` events as tasks appear and
+  are claimed, cancelled or deleted;
+* endpoints that change task state publish on the feed right after their
+  commit (``added`` / ``removed`` / ``orders_closed``), from request threads,
+  the dispatcher thread or the payment sweeper; events reach every open
+  stream through its event loop, so couriers see a new task immediately;
+* while anyone is connected, one query per ``TASK_FEED_RESYNC_SECONDS``
+  reconciles the set with the database and publishes the difference. That
+  covers changes made by other workers or processes (the bus is in-process
+  only) and keeps query load per worker constant however many couriers are
+  watching.
+
+A stream whose client falls ``TASK_FEED_QUEUE_SIZE`` events behind is closed;
+``EventSource`` reconnects and starts again from a fresh snapshot.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import threading
+import time
+
+from .database import SessionLocal
+from .models.delivery_task import DeliveryTask, DeliveryTaskStatus
+
+TASK_FEED_RESYNC_SECONDS = float(os.getenv("TASK_FEED_RESYNC_SECONDS", "15"))
+TASK_FEED_LIMIT = int(os.getenv("TASK_FEED_LIMIT", "500"))
+# Events buffered per stream before a slow client is disconnected
+TASK_FEED_QUEUE_SIZE = int(os.getenv("TASK_FEED_QUEUE_SIZE", "256"))
+# Comment line sent on idle streams so proxies do not time them out
+KEEPALIVE_SECONDS = 15.0
+RECONNECT_MS = 2000
+
+
+def task_dict(task) -> dict:
+    """Same fields as ``DeliveryTaskOut`` for a task row or ORM object."""
+    return {
+        "id": task.id,
+        "order_id": task.order_id,
+        "courier_id": None,
+        "pickup_location": task.pickup_location,
+        "delivery_location": task.delivery_location,
+        "delivery_fee": float(task.delivery_fee or 0),
+        "status": DeliveryTaskStatus.pending.value,
+        "estimated_duration": task.estimated_duration,
+        "created_at": task.created_at.isoformat() if task.created_at else None,
+    }
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue: asyncio.Queue[str] = asyncio.Queue(TASK_FEED_QUEUE_SIZE)
+        self.closed = False
+
+    def offer(self, frame: str):
+        # Runs on the subscriber's loop
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.closed = True
+
+
+class TaskFeed:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resync_lock = threading.Lock()
+        self._tasks: dict[str, dict] = {}
+        self._loaded_at: float | None = None
+        # Ids changed by local events while a resync query is running; the
+        # resync must not revert them to what it read
+        self._touched: set[str] | None = None
+        self._subscribers: set[Subscriber] = set()
+        self._resync_task: asyncio.Task | None = None
+        self.events = 0
+        self.resyncs = 0
+        self.dropped = 0
+
+    # -- publishing (any thread) ----------------------------------------
+
+    def added(self, task):
+        self._publish([("added", task_dict(task))])
+
+    def removed(self, *task_ids: str):
+        self._publish([("removed", {"id": task_id}) for task_id in task_ids])
+
+    def orders_closed(self, order_ids):
+        """Remove the tasks of cancelled or deleted orders."""
+        order_ids = set(order_ids)
+        with self._lock:
+            task_ids = [t["id"] for t in self._tasks.values() if t["order_id"] in order_ids]
+        self.removed(*task_ids)
+
+    def _apply(self, changes, touch: bool = True) -> list[str]:
+        """Update the set (lock held); returns frames for the effective changes."""
+        frames = []
+        for kind, data in changes:
+            if touch and self._touched is not None:
+                self._touched.add(data["id"])
+            if kind == "added":
+                if self._tasks.get(data["id"]) == data:
+                    continue
+                self._tasks[data["id"]] = data
+            elif self._tasks.pop(data["id"], None) is None:
+                continue
+            frames.append(sse(kind, data))
+        self.events += len(frames)
+        return frames
+
+    def _publish(self, changes):
+        if not changes:
+            return
+        with self._lock:
+            frames = self._apply(changes)
+            subscribers = list(self._subscribers)
+        self._fanout(frames, subscribers)
+
+    def _fanout(self, frames: list[str], subscribers: list[Subscriber]):
+        for sub in subscribers:
+            for frame in frames:
+                try:
+                    sub.loop.call_soon_threadsafe(sub.offer, frame)
+                except RuntimeError:  # loop already closed
+                    break
+
+    # -- reconciliation ---------------------------------------------------
+
+    def resync(self, max_age: float = 0.0):
+        """Reload the pending set from the database and publish the difference."""
+        with self._resync_lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < max_age:
+                return
+            with self._lock:
+                self._touched = set()
+            db = SessionLocal()
+            try:
+                rows = db.query(
+                    DeliveryTask.id, DeliveryTask.order_id, DeliveryTask.pickup_location,
+                    DeliveryTask.delivery_location, DeliveryTask.delivery_fee, DeliveryTask.estimated_duration,
+                    DeliveryTask.created_at,
+                ).filter(
+                    DeliveryTask.status == DeliveryTaskStatus.pending,
+                    DeliveryTask.courier_id.is_(None),
+                ).order_by(DeliveryTask.created_at, DeliveryTask.id).limit(TASK_FEED_LIMIT).all()
+                fresh = {r.id: task_dict(r) for r in rows}
+            except Exception:
+                with self._lock:
+                    self._touched = None
+                raise
+            finally:
+                db.close()
+            with self._lock:
+                touched, self._touched = self._touched, None
+                changes = [("removed", {"id": i}) for i in self._tasks if i not in fresh and i not in touched]
+                changes += [("added", t) for i, t in fresh.items() if i not in touched]
+                frames = self._apply(changes, touch=False)
+                subscribers = list(self._subscribers)
+                self._loaded_at = time.monotonic()
+                self.resyncs += 1
+            self._fanout(frames, subscribers)
+
+    async def _resync_loop(self):
+        while True:
+            await asyncio.sleep(TASK_FEED_RESYNC_SECONDS)
+            if not self._subscribers:
+                continue
+            try:
+                await asyncio.to_thread(self.resync, TASK_FEED_RESYNC_SECONDS / 2)
+            except Exception as e:
+                print("[WARN] task feed resync failed:", e)
+
+    async def start(self):
+        if self._resync_task is None:
+            self._resync_task = asyncio.create_task(self._resync_loop())
+
+    async def stop(self):
+        if self._resync_task is not None:
+            self._resync_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._resync_task
+            self._resync_task = None
+
+    # -- streaming ----------------------------------------------------------
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self):
+        """Yields ``(snapshot, subscriber)``; no event falls between the two."""
+        await asyncio.to_thread(self.resync, TASK_FEED_RESYNC_SECONDS)
+        sub = Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            snapshot = sorted(self._tasks.values(), key=lambda t: (t["created_at"] or "", t["id"]))
+            self._subscribers.add(sub)
+        try:
+            yield snapshot, sub
+        finally:
+            with self._lock:
+                self._subscribers.discard(sub)
+            if sub.closed:
+                self.dropped += 1
+
+    async def stream(self):
+        """SSE body: one ``snapshot`` event, then ``added``/``removed`` events."""
+        async with self.subscribe() as (snapshot, sub):
+            yield f"retry: {RECONNECT_MS}\n" + sse("snapshot", snapshot)
+            while True:
+                try:
+                    frame = await asyncio.wait_for(sub.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    frame = ": keepalive\n\n"
+                if sub.closed:
+                    return
+                yield frame
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._tasks),
+                "subscribers": len(self._subscribers),
+                "events": self.events,
+                "resyncs": self.resyncs,
+                "dropped": self.dropped,
+                "resync_seconds": TASK_FEED_RESYNC_SECONDS,
+            }
+
+
+task_feed = TaskFeed()
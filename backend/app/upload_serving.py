@@ -0,0 +1,233 @@
+"""ASGI app serving ``/uploads`` with cache-friendly semantics.
+
+Originals are named by the SHA-256 of their bytes and never change, so they
+are ``immutable`` for a year with that hash as a strong ETag. Everything else
+(resized variants, which ``images --force`` re-renders in place, and legacy
+uuid files) gets a size+mtime ETag and must be revalidated, which costs a 304
+when nothing changed. On top of ``StaticFiles`` this adds:
+
+* ``If-None-Match`` -> 304 and single ``Range`` requests -> 206 (multi-range
+  requests get the full body, which RFC 9110 allows);
+* ``<file>.br`` / ``<file>.gz`` siblings served with ``Content-Encoding``
+  when ``Accept-Encoding`` gives them a non-zero q-value;
+* a byte-bounded LRU of small, hot files (list-page thumbnails) so they are
+  answered without touching the disk;
+* the ASGI ``http.response.pathsend`` extension for uncached full bodies when
+  the server supports it (uvicorn does not; it gets chunked reads instead).
+"""
+import email.utils
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import anyio
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+from .uploads import UPLOAD_DIR
+
+UPLOAD_HOT_CACHE_BYTES = int(os.getenv("UPLOAD_HOT_CACHE_BYTES", str(32 * 1024 * 1024)))
+UPLOAD_HOT_ITEM_MAX_BYTES = int(os.getenv("UPLOAD_HOT_ITEM_MAX_BYTES", str(256 * 1024)))
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+CHUNK_SIZE = 64 * 1024
+
+_CONTENT_HASH = re.compile(r"^[0-9a-f]{64}$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+_TYPES = {".webp": "image/webp", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".gif": "image/gif"}
+
+
+class HotFileCache:
+    """LRU of small file bodies keyed by path, invalidated by mtime."""
+
+    def __init__(self, max_bytes: int = UPLOAD_HOT_CACHE_BYTES, item_max_bytes: int = UPLOAD_HOT_ITEM_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.item_max_bytes = item_max_bytes
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[int, bytes]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str, mtime_ns: int) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != mtime_ns:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, path: str, mtime_ns: int, body: bytes):
+        if len(body) > self.item_max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[path] = (mtime_ns, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+def _is_content_addressed(path: Path) -> bool:
+    # Only originals are named by their hash; variants and legacy files are not
+    return bool(_CONTENT_HASH.match(path.name.split(".")[0])) and path.name.count(".") == 1
+
+
+def _etag(path: Path, st: os.stat_result, encoding: str | None) -> str:
+    tag = path.name.split(".")[0] if _is_content_addressed(path) else f"{st.st_size:x}-{st.st_mtime_ns:x}"
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def _accepted_encodings(value: str) -> dict[str, float]:
+    """``Accept-Encoding`` as {coding: q}; ``br;q=0`` is a refusal, not a match."""
+    accepted = {}
+    for item in value.split(","):
+        coding, *params = [p.strip() for p in item.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, val = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(val)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def _parse_range(value: str | None, size: int) -> tuple[int, int] | None | bool:
+    """(start, end_exclusive), None for no/ignored range, False if unsatisfiable."""
+    if not value:
+        return None
+    m = _RANGE.match(value.strip())
+    if not m or m.groups() == ("", ""):
+        return None
+    first, last = m.groups()
+    if first:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+        if last and int(last) < start:
+            return None
+    else:
+        start, end = max(size - int(last), 0), size
+    if start >= size:
+        return False
+    return start, end
+
+
+class UploadFiles:
+    def __init__(self, directory: Path, cache: HotFileCache | None = None):
+        self.directory = Path(directory).resolve()
+        self.cache = cache or HotFileCache()
+
+    def _resolve(self, scope) -> Path | None:
+        # Mount keeps the full path and moves the prefix into root_path
+        root_path = scope.get("root_path", "")
+        route_path = scope["path"][len(root_path):] if scope["path"].startswith(root_path) else scope["path"]
+        parts = [p for p in route_path.split("/") if p]
+        if not parts or any(p.startswith(".") for p in parts):
+            return None
+        path = self.directory.joinpath(*parts).resolve()
+        return path if self.directory in path.parents else None
+
+    async def __call__(self, scope, receive, send):
+        assert scope["type"] == "http"
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            return await self._send(send, 405, [(b"allow", b"GET, HEAD")])
+        path = self._resolve(scope)
+        if path is None:
+            return await self._send(send, 404)
+        headers = Headers(scope=scope)
+
+        encoding = None
+        accept = _accepted_encodings(headers.get("accept-encoding", ""))
+        for name, suffix in _ENCODINGS:
+            if accept.get(name, accept.get("*", 0.0)) > 0 and os.path.isfile(str(path) + suffix):
+                encoding, path_to_send = name, Path(str(path) + suffix)
+                break
+        else:
+            path_to_send = path
+        try:
+            st = await run_in_threadpool(os.stat, path_to_send)
+        except (FileNotFoundError, NotADirectoryError):
+            return await self._send(send, 404)
+        if not os.path.isfile(path_to_send):
+            return await self._send(send, 404)
+
+        etag = _etag(path, st, encoding)
+        content_type = _TYPES.get(path.suffix.lower()) or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        base = [
+            (b"cache-control", (IMMUTABLE if _is_content_addressed(path) else REVALIDATE).encode()),
+            (b"etag", etag.encode()),
+            (b"last-modified", email.utils.formatdate(st.st_mtime, usegmt=True).encode()),
+            (b"accept-ranges", b"bytes"),
+            (b"vary", b"Accept-Encoding"),
+        ]
+        if encoding:
+            base.append((b"content-encoding", encoding.encode()))
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return await self._send(send, 304, base)
+
+        size = st.st_size
+        byte_range = None
+        if_range = headers.get("if-range")
+        if not if_range or if_range == etag:
+            byte_range = _parse_range(headers.get("range"), size)
+        if byte_range is False:
+            return await self._send(send, 416, base + [(b"content-range", f"bytes */{size}".encode())])
+        start, end = byte_range or (0, size)
+        status = 206 if byte_range else 200
+        out = base + [(b"content-type", content_type.encode()), (b"content-length", str(end - start).encode())]
+        if byte_range:
+            out.append((b"content-range", f"bytes {start}-{end - 1}/{size}".encode()))
+
+        await send({"type": "http.response.start", "status": status, "headers": out})
+        if method == "HEAD":
+            return await send({"type": "http.response.body", "body": b""})
+
+        key = str(path_to_send)
+        body = self.cache.get(key, st.st_mtime_ns)
+        if body is None and size <= self.cache.item_max_bytes:
+            body = await anyio.Path(path_to_send).read_bytes()
+            self.cache.put(key, st.st_mtime_ns, body)
+        if body is not None:
+            return await send({"type": "http.response.body", "body": body[start:end]})
+        if not byte_range and "http.response.pathsend" in scope.get("extensions", {}):
+            return await send({"type": "http.response.pathsend", "path": key})
+        async with await anyio.open_file(path_to_send, "rb") as f:
+            await f.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+
+    @staticmethod
+    async def _send(send, status: int, headers=None):
+        await send({"type": "http.response.start", "status": status, "headers": (headers or []) + [(b"content-length", b"0")]})
+        await send({"type": "http.response.body", "body": b""})
+
+
+upload_files = UploadFiles(UPLOAD_DIR)
@@ -0,0 +1,194 @@
+"""Streaming image uploads.
+
+The multipart body is parsed straight off ``request.stream()`` instead of
+being spooled by ``UploadFile`` first, so an upload costs one network chunk
+of memory regardless of its size, the size cap is enforced while the bytes
+arrive, and file writes run in the thread pool rather than on the event loop.
+Data lands in a temp file under ``UPLOAD_DIR`` and is renamed into place only
+once complete, so a half-written image is never served.
+
+Files are content-addressed: the name is the SHA-256 of the bytes, sharded
+as ``ab/cd/abcd....ext`` so no directory grows past 256 entries per level.
+Re-uploading an identical image reuses the existing blob (and refreshes its
+mtime, which the garbage collector in ``blobs.py`` treats as a grace period).
+The stored extension comes from the file's magic bytes, not the client's
+file name.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, MultipartParseError, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", str(Path(__file__).resolve().parents[1] / "uploads")))
+UPLOAD_TMP_DIR = UPLOAD_DIR / ".tmp"
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+# Multipart framing around the file itself (boundaries, part headers)
+_MULTIPART_SLACK = 16 * 1024
+
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+UPLOAD_TMP_DIR.mkdir(parents=True, exist_ok=True)
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+SNIFF_BYTES = 12
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """Return the file extension for a supported image, judged by content."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    for magic, ext in _SIGNATURES:
+        if head.startswith(magic):
+            return ext
+    return None
+
+
+class _FilePart:
+    """Parser state for the single file field we are interested in."""
+
+    def __init__(self, field: str):
+        self.field = field
+        self.header_field = b""
+        self.header_value = b""
+        self.disposition: dict = {}
+        self.active = False
+        self.seen = False
+        self.filename: str | None = None
+        self.size = 0
+        self.pending: list[bytes] = []
+
+    def callbacks(self):
+        def on_part_begin():
+            self.disposition = {}
+            self.active = False
+
+        def on_header_field(data, start, end):
+            self.header_field += data[start:end]
+
+        def on_header_value(data, start, end):
+            self.header_value += data[start:end]
+
+        def on_header_end():
+            if self.header_field.lower() == b"content-disposition":
+                _, self.disposition = parse_options_header(self.header_value)
+            self.header_field = b""
+            self.header_value = b""
+
+        def on_headers_finished():
+            name = self.disposition.get(b"name", b"").decode("utf-8", "replace")
+            if name == self.field and not self.seen:
+                self.active = self.seen = True
+                self.filename = self.disposition.get(b"filename", b"").decode("utf-8", "replace")
+
+        def on_part_data(data, start, end):
+            if self.active:
+                self.size += end - start
+                self.pending.append(data[start:end])
+
+        def on_part_end():
+            self.active = False
+
+        return {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+        }
+
+
+def blob_relpath(digest: str, ext: str) -> str:
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=400, detail=f"图片大小不能超过{UPLOAD_MAX_BYTES // (1024 * 1024)}MB")
+
+
+async def receive_image(request: Request, field: str = "file") -> Path:
+    """Stream the image in multipart field ``field`` to ``UPLOAD_DIR``.
+
+    Returns the blob path (``ab/cd/<sha256><sniffed ext>``). Raises ``HTTPException``
+    400 for a missing/oversized/non-image file; nothing is left on disk then.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="需要 multipart/form-data 上传")
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > UPLOAD_MAX_BYTES + _MULTIPART_SLACK:
+        raise _too_large()
+
+    part = _FilePart(field)
+    parser = MultipartParser(params[b"boundary"], part.callbacks())
+    tmp = await run_in_threadpool(tempfile.NamedTemporaryFile, dir=UPLOAD_TMP_DIR, delete=False)
+    ext = None
+    head = b""
+    digest = hashlib.sha256()
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except MultipartParseError:
+                raise HTTPException(status_code=400, detail="上传内容格式错误")
+            if part.size > UPLOAD_MAX_BYTES:
+                raise _too_large()
+            if not part.pending:
+                continue
+            data = b"".join(part.pending)
+            part.pending.clear()
+            if ext is None:
+                head += data[:SNIFF_BYTES - len(head)]
+                if len(head) >= SNIFF_BYTES:
+                    ext = sniff_image_type(head)
+                    if ext is None:
+                        raise HTTPException(status_code=400, detail="不支持的图片格式")
+            await run_in_threadpool(_write, tmp, digest, data)
+        parser.finalize()
+        if not part.seen or not part.filename:
+            raise HTTPException(status_code=400, detail="文件名无效")
+        if ext is None:
+            ext = sniff_image_type(head)
+            if ext is None:
+                raise HTTPException(status_code=400, detail="不支持的图片格式")
+        dest = UPLOAD_DIR / blob_relpath(digest.hexdigest(), ext)
+        await run_in_threadpool(_publish, tmp, dest)
+        return dest
+    except BaseException:
+        await run_in_threadpool(_discard, tmp)
+        raise
+
+
+def _write(tmp, digest, data: bytes):
+    digest.update(data)
+    tmp.write(data)
+
+
+def _publish(tmp, dest: Path):
+    tmp.close()
+    if dest.exists():
+        # Same content already stored: keep one copy, mark it recently used
+        os.unlink(tmp.name)
+        os.utime(dest)
+        return
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    # NamedTemporaryFile is created 0600; uploads are served to everyone
+    os.chmod(tmp.name, 0o644)
+    os.replace(tmp.name, dest)
+
+
+def _discard(tmp):
+    tmp.close()
+    try:
+        os.unlink(tmp.name)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,85 @@
+"""Concurrent load benchmark for the hot read endpoints.
+
+Opens ``--concurrency`` keep-alive clients (default 500) that hammer each path
+for ``--duration`` seconds and reports requests/sec and latency percentiles.
+Run it once against a build with the sync handlers and once against the async
+ones, with the same uvicorn worker count and database, to compare:
+
+    uvicorn backend.app.main:app --workers 1 --port 8000
+    python scripts/bench_async.py --token <token>
+
+Requires ``httpx`` (pip install httpx).
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import statistics
+import time
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - dev tool
+    raise SystemExit("bench_async.py requires httpx: pip install httpx")
+
+DEFAULT_PATHS = ["/api/books", "/api/books?q=数据结构", "/api/orders"]
+AUTH_PATHS = ["/api/me", "/api/me/orders", "/api/me/sales"]
+
+
+async def _worker(client: httpx.AsyncClient, path: str, deadline: float, latencies: list[float], errors: list[int]):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            resp = await client.get(path)
+            if resp.status_code >= 400:
+                errors.append(resp.status_code)
+        except httpx.HTTPError:
+            errors.append(0)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def bench_path(base_url: str, path: str, concurrency: int, duration: float, headers: dict) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies: list[float] = []
+    errors: list[int] = []
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=30.0) as client:
+        await client.get(path)  # warm-up
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*[_worker(client, path, deadline, latencies, errors) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return {
+        "path": path,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": pct(0.50),
+        "p99_ms": pct(0.99),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--token", help="Bearer token; enables the /api/me* paths")
+    parser.add_argument("paths", nargs="*", help="paths to benchmark (defaults to the hot read endpoints)")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    paths = args.paths or DEFAULT_PATHS + (AUTH_PATHS if args.token else [])
+    print(f"{'path':40} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    for path in paths:
+        r = await bench_path(args.base_url, path, args.concurrency, args.duration, headers)
+        print(f"{r['path']:40} {r['rps']:10.1f} {r['p50_ms']:10.1f} {r['p99_ms']:10.1f} {r['errors']:8d}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
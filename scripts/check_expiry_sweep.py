@@ -0,0 +1,111 @@
+"""Check that the payment sweeper releases exactly what it cancels.
+
+Seeds a seller, a buyer and two delivery orders through ``place_order``: one
+whose payment window has passed and one still inside it. After one
+:func:`sweep_expired_orders` pass the overdue order must be cancelled, its
+book back to ``available`` and its delivery task cancelled, while the other
+order keeps its reservation and its pending task::
+
+    python scripts/check_expiry_sweep.py
+
+Runs against the database configured for the app (``DATABASE_URL`` etc.),
+so MySQL's whole-second ``TIMESTAMP`` columns are exercised; the fixture is
+deleted again afterwards, but point it at a scratch database.
+"""
+from __future__ import annotations
+import datetime
+import hashlib
+import sys
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.app.database import SessionLocal  # noqa: E402
+from backend.app.expiry import sweep_expired_orders  # noqa: E402
+from backend.app.models.book import Book, BookStatus, ConditionLevel  # noqa: E402
+from backend.app.models.delivery_task import DeliveryTask, DeliveryTaskStatus  # noqa: E402
+from backend.app.models.order import DeliveryMethod, Order, OrderStatus  # noqa: E402
+from backend.app.models.user import User  # noqa: E402
+from backend.app.purchase import place_order  # noqa: E402
+
+
+def make_user(db, name: str) -> str:
+    user = User(
+        id=str(uuid.uuid4()),
+        student_id=f"ex{uuid.uuid4().hex[:10]}",
+        name=name,
+        phone="0",
+        hashed_password=hashlib.sha256(b"expiry123").hexdigest(),
+    )
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def make_book(db, seller_id: str) -> str:
+    book = Book(
+        id=str(uuid.uuid4()),
+        isbn="9780000000000",
+        title="expiry check",
+        author="check",
+        original_price=10,
+        selling_price=5,
+        condition_level=ConditionLevel.good,
+        seller_id=seller_id,
+        status=BookStatus.available,
+    )
+    db.add(book)
+    db.commit()
+    return book.id
+
+
+def main():
+    db = SessionLocal()
+    users, books, orders = [], [], []
+    try:
+        seller, buyer = make_user(db, "expiry-seller"), make_user(db, "expiry-buyer")
+        users += [seller, buyer]
+        now = datetime.datetime.utcnow()
+        for due in (now - datetime.timedelta(minutes=1), now + datetime.timedelta(hours=1)):
+            book_id = make_book(db, seller)
+            books.append(book_id)
+            order = place_order(
+                db, book_id, buyer, DeliveryMethod.delivery,
+                pickup_location="北门", delivery_location="三教",
+                create_delivery_task=True, payment_due_at=due,
+            )
+            orders.append(order.id)
+
+        swept = sweep_expired_orders(db)
+        db.expire_all()
+
+        def state(i):
+            order = db.query(Order).filter(Order.id == orders[i]).one()
+            book = db.query(Book).filter(Book.id == books[i]).one()
+            task = db.query(DeliveryTask).filter(DeliveryTask.order_id == orders[i]).one()
+            return order.status, book.status, task.status
+
+        checks = [
+            ("overdue order", state(0), (OrderStatus.cancelled, BookStatus.available, DeliveryTaskStatus.cancelled)),
+            ("order in window", state(1), (OrderStatus.pending, BookStatus.reserved, DeliveryTaskStatus.pending)),
+        ]
+        failed = swept < 1
+        print(f"swept {swept}")
+        for name, got, want in checks:
+            ok = got == want
+            failed |= not ok
+            print(f"{name:<16} {'ok' if ok else 'FAILED'}  order={got[0].value} book={got[1].value} task={got[2].value}")
+        sys.exit(1 if failed else 0)
+    finally:
+        db.rollback()
+        db.query(DeliveryTask).filter(DeliveryTask.order_id.in_(orders)).delete(synchronize_session=False)
+        db.query(Order).filter(Order.id.in_(orders)).delete(synchronize_session=False)
+        db.query(Book).filter(Book.id.in_(books)).delete(synchronize_session=False)
+        db.query(User).filter(User.id.in_(users)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Check that list endpoints run a fixed number of SQL statements.
+
+Seeds two independent fixtures of different sizes (a seller, a user who
+favourites every book, and one order + review per reviewer on one book),
+reads ``X-Query-Count`` for each endpoint against both, and fails if any count
+grows with the number of rows, i.e. if something went N+1::
+
+    DEBUG_QUERY_COUNT=true uvicorn backend.app.main:app --port 8000
+    python scripts/check_query_counts.py --small 2 --large 12
+
+Each endpoint is requested twice and the second count is used, so warm-up
+work (user cache fills, tree refreshes) does not skew the comparison. The
+fixtures are deleted again afterwards; still, point it at a scratch database.
+Requires ``httpx``.
+"""
+from __future__ import annotations
+import argparse
+import sys
+import uuid
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - dev tool
+    raise SystemExit("check_query_counts.py requires httpx: pip install httpx")
+
+PASSWORD = "count123"
+
+
+class Fixture:
+    def __init__(self, client: httpx.Client, size: int):
+        self.client = client
+        self.size = size
+        self.users: list[str] = []
+        self.books: list[str] = []
+        self.orders: list[str] = []
+
+    def register(self, name: str) -> tuple[str, dict]:
+        student_id = f"qc{uuid.uuid4().hex[:10]}"
+        resp = self.client.post("/api/users", json={"student_id": student_id, "name": name, "phone": "0", "password": PASSWORD})
+        resp.raise_for_status()
+        user_id = resp.json()["id"]
+        self.users.append(user_id)
+        resp = self.client.post("/api/login", json={"student_id": student_id, "password": PASSWORD})
+        resp.raise_for_status()
+        return user_id, {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+    def seed(self):
+        seller_id, _ = self.register("qc-seller")
+        _, self.fan_auth = self.register("qc-fan")
+        for n in range(self.size):
+            resp = self.client.post("/api/books", json={
+                "isbn": f"978{n:010d}", "title": f"计数教材 {n}", "author": "qc",
+                "original_price": 50, "selling_price": 20, "condition_level": "good",
+                "cover_image": "", "gallery_images": [], "seller_id": seller_id,
+            })
+            resp.raise_for_status()
+            self.books.append(resp.json()["id"])
+            self.client.post(f"/api/books/{self.books[-1]}/favorite", headers=self.fan_auth).raise_for_status()
+        # One book reviewed by `size` different buyers: order, complete, review,
+        # put the book back on sale, repeat (only completed orders can be reviewed)
+        self.reviewed = self.books[0]
+        for n in range(self.size):
+            buyer_id, auth = self.register(f"qc-buyer-{n}")
+            resp = self.client.post("/api/orders", json={"book_id": self.reviewed, "buyer_id": buyer_id, "delivery_method": "meetup"})
+            resp.raise_for_status()
+            order_id = resp.json()["id"]
+            self.orders.append(order_id)
+            self.client.patch(f"/api/orders/{order_id}", json={"status": "completed"}).raise_for_status()
+            self.client.post(f"/api/orders/{order_id}/reviews", json={"rating": 5, "content": "ok", "is_anonymous": n % 2 == 1}, headers=auth).raise_for_status()
+            self.client.post(f"/admin/books/{self.reviewed}/status/available").raise_for_status()
+
+    def counts(self) -> dict[str, int]:
+        endpoints = {
+            "favorites": ("/api/me/favorites", self.fan_auth),
+            "reviews": (f"/api/books/{self.reviewed}/reviews", None),
+            "admin books": ("/admin", None),
+            "admin orders": ("/admin/orders", None),
+        }
+        out = {}
+        for name, (url, headers) in endpoints.items():
+            for _ in range(2):
+                resp = self.client.get(url, headers=headers, params={"limit": 50} if url.startswith("/api") else None)
+                resp.raise_for_status()
+            if "x-query-count" not in resp.headers:
+                raise SystemExit("no X-Query-Count header: start the server with DEBUG_QUERY_COUNT=true")
+            out[name] = int(resp.headers["x-query-count"])
+        return out
+
+    def cleanup(self):
+        for order_id in self.orders:
+            self.client.post(f"/admin/orders/{order_id}/delete")
+        for book_id in self.books:
+            self.client.post(f"/admin/books/{book_id}/delete")
+        for user_id in self.users:
+            self.client.post(f"/admin/users/{user_id}/delete")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--small", type=int, default=2)
+    parser.add_argument("--large", type=int, default=12)
+    args = parser.parse_args()
+
+    results = {}
+    with httpx.Client(base_url=args.base_url, timeout=30) as client:
+        for size in (args.small, args.large):
+            fixture = Fixture(client, size)
+            try:
+                fixture.seed()
+                results[size] = fixture.counts()
+            finally:
+                fixture.cleanup()
+
+    failed = False
+    print(f"{'endpoint':<14} {args.small:>6} {args.large:>6}")
+    for name, small in results[args.small].items():
+        large = results[args.large][name]
+        flag = "" if small == large else "  <- grows with rows"
+        failed |= small != large
+        print(f"{name:<14} {small:>6} {large:>6}{flag}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
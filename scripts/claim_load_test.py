@@ -0,0 +1,211 @@
+"""Load-test delivery task claiming: no double assignments, throughput per courier count.
+
+Two phases against a running server:
+
+* **race** -- every courier fires ``POST /api/delivery_tasks/{id}/accept`` at
+  the same task at the same moment (a thread barrier per task); exactly one
+  may succeed.
+* **claim** -- for each courier count in ``--couriers`` a fresh batch of tasks
+  is drained with ``POST /api/delivery_tasks/claim``; every task must be
+  handed out exactly once, and claims/s should grow with the courier count.
+
+Afterwards the server's view (``GET /api/delivery_tasks?status=accepted``) is
+compared with what the clients were told. Start the server with dispatching
+off and no load cap, point it at a scratch MySQL database (SQLite serialises
+writers, so it only proves correctness, not scaling)::
+
+    DISPATCH_ENABLED=false DISPATCH_MAX_LOAD=1000000 uvicorn backend.app.main:app --port 8000 --workers 4
+    python scripts/claim_load_test.py --couriers 1 2 4 8 16 --tasks 400
+
+Requires ``httpx``.
+"""
+from __future__ import annotations
+import argparse
+import collections
+import sys
+import threading
+import time
+import uuid
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - dev tool
+    raise SystemExit("claim_load_test.py requires httpx: pip install httpx")
+
+PASSWORD = "claim123"
+
+
+class Fixture:
+    def __init__(self, client: httpx.Client):
+        self.client = client
+        self.users: list[str] = []
+        self.orders: list[str] = []
+
+    def register(self, name: str) -> tuple[str, dict]:
+        student_id = f"cl{uuid.uuid4().hex[:10]}"
+        resp = self.client.post("/api/users", json={"student_id": student_id, "name": name, "phone": "0", "password": PASSWORD})
+        resp.raise_for_status()
+        user_id = resp.json()["id"]
+        self.users.append(user_id)
+        resp = self.client.post("/api/login", json={"student_id": student_id, "password": PASSWORD})
+        resp.raise_for_status()
+        return user_id, {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+    def couriers(self, count: int) -> list[dict]:
+        out = []
+        for n in range(count):
+            _, auth = self.register(f"cl-courier-{n}")
+            resp = self.client.post("/api/couriers/me", json={"id_card_number": uuid.uuid4().hex[:18]}, headers=auth)
+            resp.raise_for_status()
+            self.client.post(f"/admin/couriers/{resp.json()['id']}/status/approved").raise_for_status()
+            # Online with a position so "claim next" ranks by distance as in production
+            self.client.put("/api/couriers/me/presence", json={"zone": "图书馆"}, headers=auth).raise_for_status()
+            out.append(auth)
+        return out
+
+    def seed_order(self):
+        seller_id, self.seller_auth = self.register("cl-seller")
+        buyer_id, _ = self.register("cl-buyer")
+        resp = self.client.post("/api/books", json={
+            "isbn": "9780000000000", "title": "抢单压测", "author": "cl",
+            "original_price": 50, "selling_price": 20, "condition_level": "good",
+            "cover_image": "", "gallery_images": [], "seller_id": seller_id,
+        })
+        resp.raise_for_status()
+        resp = self.client.post("/api/orders", json={"book_id": resp.json()["id"], "buyer_id": buyer_id, "delivery_method": "meetup"})
+        resp.raise_for_status()
+        self.order_id = resp.json()["id"]
+        self.orders.append(self.order_id)
+        self.book_id = resp.json()["book_id"]
+
+    def tasks(self, count: int) -> list[str]:
+        # All on one order: enough for claiming, and deleting the order removes them
+        ids = []
+        pickups = ["一食堂", "三教", "北门", "东区宿舍", "体育馆"]
+        for n in range(count):
+            resp = self.client.post("/api/delivery_tasks", json={
+                "order_id": self.order_id, "pickup_location": pickups[n % len(pickups)],
+                "delivery_location": "图书馆", "delivery_fee": 3,
+            }, headers=self.seller_auth)
+            resp.raise_for_status()
+            ids.append(resp.json()["id"])
+        return ids
+
+    def accepted(self) -> dict[str, str]:
+        out, cursor = {}, None
+        while True:
+            resp = self.client.get("/api/delivery_tasks", params={"status": "accepted", "limit": 100, "cursor": cursor})
+            resp.raise_for_status()
+            page = resp.json()
+            out.update((t["id"], t["courier_id"]) for t in page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                return out
+
+    def cleanup(self):
+        for order_id in self.orders:
+            self.client.post(f"/admin/orders/{order_id}/delete")
+        self.client.post(f"/admin/books/{self.book_id}/delete")
+        for user_id in self.users:
+            self.client.post(f"/admin/users/{user_id}/delete")
+
+
+def run_threads(target, auths: list[dict]):
+    threads = [threading.Thread(target=target, args=(auth,)) for auth in auths]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def race(base_url: str, auths: list[dict], task_ids: list[str]) -> dict[str, list[str]]:
+    """Everyone accepts each task at once; returns task id -> winning courier ids."""
+    winners: dict[str, list[str]] = collections.defaultdict(list)
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(auths))
+
+    def worker(auth):
+        with httpx.Client(base_url=base_url, timeout=30, headers=auth) as client:
+            for task_id in task_ids:
+                barrier.wait()
+                resp = client.post(f"/api/delivery_tasks/{task_id}/accept")
+                if resp.status_code == 200:
+                    with lock:
+                        winners[task_id].append(resp.json()["courier_id"])
+                elif resp.status_code != 400:
+                    resp.raise_for_status()
+
+    run_threads(worker, auths)
+    return winners
+
+
+def drain(base_url: str, auths: list[dict]) -> tuple[list[tuple[str, str]], float]:
+    """Claim until nothing is left; returns (task id, courier id) pairs and seconds."""
+    claims: list[tuple[str, str]] = []
+    lock = threading.Lock()
+
+    def worker(auth):
+        with httpx.Client(base_url=base_url, timeout=30, headers=auth) as client:
+            while True:
+                resp = client.post("/api/delivery_tasks/claim")
+                if resp.status_code == 404:
+                    return
+                resp.raise_for_status()
+                task = resp.json()
+                with lock:
+                    claims.append((task["id"], task["courier_id"]))
+
+    start = time.perf_counter()
+    run_threads(worker, auths)
+    return claims, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--couriers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--tasks", type=int, default=400, help="tasks drained per courier count")
+    parser.add_argument("--race-tasks", type=int, default=20)
+    args = parser.parse_args()
+
+    failed = False
+    with httpx.Client(base_url=args.base_url, timeout=30) as client:
+        fixture = Fixture(client)
+        try:
+            fixture.seed_order()
+            auths = fixture.couriers(max(args.couriers))
+            told: dict[str, str] = {}
+
+            race_ids = fixture.tasks(args.race_tasks)
+            winners = race(args.base_url, auths, race_ids)
+            doubles = sum(1 for w in winners.values() if len(w) > 1)
+            missing = sum(1 for t in race_ids if not winners.get(t))
+            told.update((t, w[0]) for t, w in winners.items() if w)
+            failed |= bool(doubles or missing)
+            print(f"race: {len(auths)} couriers x {len(race_ids)} tasks, double assignments {doubles}, unassigned {missing}")
+
+            print(f"{'couriers':>8} {'claims':>7} {'seconds':>8} {'claims/s':>9} {'speedup':>8} {'doubles':>8}")
+            base_rate = None
+            for n in args.couriers:
+                task_ids = fixture.tasks(args.tasks)
+                claims, seconds = drain(args.base_url, auths[:n])
+                counts = collections.Counter(t for t, _ in claims)
+                doubles = sum(1 for c in counts.values() if c > 1)
+                missing = len(set(task_ids) - set(counts))
+                told.update(claims)
+                rate = len(claims) / seconds if seconds else 0.0
+                base_rate = base_rate or rate
+                failed |= bool(doubles or missing)
+                print(f"{n:>8} {len(claims):>7} {seconds:>8.2f} {rate:>9.1f} {rate / base_rate:>7.2f}x {doubles:>8}")
+
+            stored = fixture.accepted()
+            mismatched = sum(1 for t, c in told.items() if stored.get(t) != c)
+            failed |= bool(mismatched)
+            print(f"server agrees with clients: {len(told) - mismatched}/{len(told)}")
+        finally:
+            fixture.cleanup()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Concurrency stress test for the purchase path.
+
+Registers ``--buyers`` users and one seller, lists ``--books`` books, then has
+every buyer try to purchase every book at the same moment (the start-of-
+semester rush). Checks that each book ended up with exactly one successful
+purchase and one order, and reports purchase latency percentiles::
+
+    uvicorn backend.app.main:app --workers 4 --port 8000
+    python scripts/stress_purchase.py --buyers 200 --books 20
+
+Exits non-zero if any book was sold more than once (or not at all). Creates
+real rows, so point it at a scratch database. Requires ``httpx``.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import collections
+import sys
+import time
+import uuid
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - dev tool
+    raise SystemExit("stress_purchase.py requires httpx: pip install httpx")
+
+PASSWORD = "stress123"
+
+
+async def register(client: httpx.AsyncClient, prefix: str) -> tuple[str, str]:
+    student_id = f"{prefix}{uuid.uuid4().hex[:10]}"
+    resp = await client.post("/api/users", json={"student_id": student_id, "name": prefix, "phone": "0", "password": PASSWORD})
+    resp.raise_for_status()
+    user_id = resp.json()["id"]
+    resp = await client.post("/api/login", json={"student_id": student_id, "password": PASSWORD})
+    resp.raise_for_status()
+    return user_id, resp.json()["access_token"]
+
+
+async def create_book(client: httpx.AsyncClient, seller_id: str, n: int) -> str:
+    resp = await client.post("/api/books", json={
+        "isbn": f"978{n:010d}", "title": f"压测教材 {n}", "author": "stress",
+        "original_price": 50, "selling_price": 20, "condition_level": "good",
+        "cover_image": "", "gallery_images": [], "seller_id": seller_id,
+    })
+    resp.raise_for_status()
+    return resp.json()["id"]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--buyers", type=int, default=200)
+    parser.add_argument("--books", type=int, default=20)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=args.buyers, max_keepalive_connections=args.buyers)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60.0) as client:
+        seller_id, _ = await register(client, "seller")
+        buyers = await asyncio.gather(*[register(client, "buyer") for _ in range(args.buyers)])
+        book_ids = await asyncio.gather(*[create_book(client, seller_id, i) for i in range(args.books)])
+
+        latencies: list[float] = []
+        outcomes: dict[str, collections.Counter] = {b: collections.Counter() for b in book_ids}
+        start_gate = asyncio.Event()
+
+        async def attempt(token: str, book_id: str):
+            await start_gate.wait()
+            t0 = time.perf_counter()
+            try:
+                resp = await client.post(f"/api/books/{book_id}/purchase", headers={"Authorization": f"Bearer {token}"})
+                outcomes[book_id][resp.status_code] += 1
+            except httpx.HTTPError:
+                outcomes[book_id]["error"] += 1
+                return
+            latencies.append(time.perf_counter() - t0)
+
+        tasks = [asyncio.create_task(attempt(token, b)) for _, token in buyers for b in book_ids]
+        await asyncio.sleep(0.1)
+        started = time.perf_counter()
+        start_gate.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        resp = await client.get("/api/orders", params={"seller_id": seller_id, "limit": 200})
+        orders = collections.Counter(o["book_id"] for o in resp.json()["items"])
+
+    latencies.sort()
+
+    def pct(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    bad = [b for b in book_ids if outcomes[b][200] != 1 or orders[b] != 1]
+    print(f"{len(tasks)} purchase attempts on {len(book_ids)} books in {elapsed:.2f}s ({len(tasks) / elapsed:.0f} req/s)")
+    print(f"latency p50 {pct(0.50):.1f} ms  p99 {pct(0.99):.1f} ms  max {pct(1.0):.1f} ms")
+    print("status codes:", dict(sum(outcomes.values(), collections.Counter())))
+    if bad:
+        for b in bad:
+            print(f"FAIL {b}: {outcomes[b][200]} winners, {orders[b]} orders", file=sys.stderr)
+        sys.exit(1)
+    print("OK: exactly one winner and one order per book")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,6 +2,8 @@ import { useEffect, useState } from 'react';
 import { useParams, Link, useNavigate } from 'react-router-dom';
 import { fetchBook } from '../services/books';
 import type { Book } from '../types/book';
+import type { UserReputation } from '../types/user';
+import { fetchUserReputation } from '../services/user';
 import {
   Card,
   Descriptions,
@@ -32,6 +34,7 @@ export default function BookDetail() {
   const [error, setError] = useState<string | null>(null);
   const [purchaseLoading, setPurchaseLoading] = useState(false);
   const [hoveredThumb, setHoveredThumb] = useState<number | null>(null);
+  const [seller, setSeller] = useState<UserReputation | null>(null);
   const screens = Grid.useBreakpoint();
   const isMobile = !screens.md;
 
@@ -59,6 +62,15 @@ export default function BookDetail() {
     run();
   }, [bookId]);
 
+  const sellerId = book?.seller_id ?? book?.sellerId;
+  useEffect(() => {
+    setSeller(null);
+    if (!sellerId) return;
+    fetchUserReputation(sellerId)
+      .then(setSeller)
+      .catch(() => setSeller(null));
+  }, [sellerId]);
+
   const handlePurchase = async () => {
     if (!book || book.status !== 'available') return;
     setPurchaseLoading(true);
@@ -180,12 +192,12 @@ export default function BookDetail() {
           >
             {book.cover_image ? (
               <Image
-                src={book.cover_image}
+                src={book.cover_medium ?? book.cover_image}
                 alt={`${book.title}-cover`}
                 width="100%"
                 height={isMobile ? 280 : 360}
                 style={{ objectFit: 'cover' }}
-                preview={{ mask: '查看大图' }}
+                preview={{ mask: '查看大图', src: book.cover_image }}
               />
             ) : (
               <Text style={{ color: palette.muted }}>暂无封面</Text>
@@ -257,7 +269,19 @@ export default function BookDetail() {
         </Descriptions.Item>
         <Descriptions.Item label="描述">{book.description || '暂无描述'}</Descriptions.Item>
         <Descriptions.Item label="状态">{book.status}</Descriptions.Item>
-        <Descriptions.Item label="卖家ID">{book.seller_id ?? book.sellerId ?? '未知'}</Descriptions.Item>
+        <Descriptions.Item label="卖家">
+          {seller ? (
+            <Space size="small" wrap>
+              <Text>{seller.name}</Text>
+              <Tag color={(seller.credit_score ?? 100) >= 100 ? 'green' : 'orange'}>信用 {seller.credit_score ?? 100}</Tag>
+              <Text type="secondary">
+                好评 {seller.positive_reviews ?? 0} · 差评 {seller.negative_reviews ?? 0} · 成交 {seller.total_transactions ?? 0}
+              </Text>
+            </Space>
+          ) : (
+            sellerId ?? '未知'
+          )}
+        </Descriptions.Item>
       </Descriptions>
 
       {galleryImages.length > 0 && (
@@ -1,7 +1,7 @@
 import { useEffect, useState } from 'react';
 import { Link } from 'react-router-dom';
-import { fetchBooks } from '../services/books';
-import type { Book } from '../types/book';
+import { fetchBookPage, fetchCategoryTree } from '../services/books';
+import type { Book, BookFacets, BookFilters, CategoryNode } from '../types/book';
 import {
   Card,
   Tag,
@@ -14,6 +14,7 @@ import {
   Typography,
   Skeleton,
   Empty,
+  TreeSelect,
 } from 'antd';
 import { ReloadOutlined } from '@ant-design/icons';
 import { PageShell } from '../components/PageShell';
@@ -21,17 +22,67 @@ import { conditionColorMap, palette, statusColorMap } from '../theme/design';
 
 const { Title, Text } = Typography;
 
+const conditionLabels: Record<string, string> = { excellent: '全新', good: '良好', fair: '一般', poor: '较差' };
+const priceLabels: Record<string, string> = { '0-10': '¥10以下', '10-20': '¥10-20', '20-50': '¥20-50', '50-100': '¥50-100', '100-': '¥100以上' };
+
+type FacetField = 'condition' | 'price' | 'publish_year';
+
+type CategoryOption = { value: number; title: string; children: CategoryOption[] };
+
+// Counts are rolled up: a category includes the books of all its subcategories
+const categoryOptions = (nodes: CategoryNode[], counts: Record<string, number>): CategoryOption[] =>
+  nodes.map((n) => ({
+    value: n.id,
+    title: `${n.name} (${counts[String(n.id)] ?? 0})`,
+    children: categoryOptions(n.children, counts),
+  }));
+
+function FacetRow({
+  label,
+  counts,
+  selected,
+  labels,
+  onToggle,
+}: {
+  label: string;
+  counts: Record<string, number>;
+  selected: string[];
+  labels?: Record<string, string>;
+  onToggle: (value: string) => void;
+}) {
+  const keys = Object.keys(labels ?? counts).filter((k) => counts[k] || selected.includes(k));
+  if (keys.length === 0) return null;
+  return (
+    <Space size={[8, 8]} wrap>
+      <Text type="secondary">{label}</Text>
+      {keys.map((k) => (
+        <Tag.CheckableTag key={k} checked={selected.includes(k)} onChange={() => onToggle(k)}>
+          {labels?.[k] ?? k} ({counts[k] ?? 0})
+        </Tag.CheckableTag>
+      ))}
+    </Space>
+  );
+}
+
 export default function Books() {
   const [books, setBooks] = useState<Book[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [facets, setFacets] = useState<BookFacets | null>(null);
+  const [filters, setFilters] = useState<BookFilters>({});
+  const [categories, setCategories] = useState<CategoryNode[]>([]);
+
+  useEffect(() => {
+    fetchCategoryTree().then(setCategories).catch(() => setCategories([]));
+  }, []);
 
   const load = async () => {
     setLoading(true);
     setError(null);
     try {
-      const data = await fetchBooks();
-      setBooks(data);
+      const page = await fetchBookPage(filters);
+      setBooks(page.items);
+      setFacets(page.facets);
     } catch (e: unknown) {
       let msg = '加载失败';
       if (e && typeof e === 'object') {
@@ -54,7 +105,16 @@ export default function Books() {
       window.removeEventListener('focus', onFocus);
       clearInterval(interval);
     };
-  }, []);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [filters]);
+
+  const toggle = (field: FacetField, value: string) => {
+    setFilters((prev) => {
+      const current = (prev[field] ?? []).map(String);
+      const next = current.includes(value) ? current.filter((v) => v !== value) : [...current, value];
+      return { ...prev, [field]: field === 'publish_year' ? next.map(Number) : next };
+    });
+  };
 
   return (
     <PageShell>
@@ -71,6 +131,30 @@ export default function Books() {
           </Button>
         </Space>
 
+        {facets && (
+          <Space direction="vertical" size={8}>
+            {categories.length > 0 && (
+              <TreeSelect
+                allowClear
+                treeDefaultExpandAll
+                placeholder="全部分类"
+                style={{ minWidth: 240 }}
+                value={filters.category_id}
+                treeData={categoryOptions(categories, facets.category)}
+                onChange={(value?: number) => setFilters((prev) => ({ ...prev, category_id: value }))}
+              />
+            )}
+            <FacetRow label="品相" counts={facets.condition} labels={conditionLabels} selected={filters.condition ?? []} onToggle={(v) => toggle('condition', v)} />
+            <FacetRow label="价格" counts={facets.price} labels={priceLabels} selected={filters.price ?? []} onToggle={(v) => toggle('price', v)} />
+            <FacetRow
+              label="出版年份"
+              counts={facets.publish_year}
+              selected={(filters.publish_year ?? []).map(String)}
+              onToggle={(v) => toggle('publish_year', v)}
+            />
+          </Space>
+        )}
+
         {error && (
           <Result
             status="error"
@@ -112,7 +196,7 @@ export default function Books() {
                       <div style={{ display: 'flex', gap: 16 }}>
                         {b.cover_image ? (
                           <img
-                            src={b.cover_image}
+                            src={b.cover_thumb ?? b.cover_image}
                             alt="cover"
                             style={{
                               width: 88,
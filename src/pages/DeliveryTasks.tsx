@@ -1,38 +1,55 @@
-import { useEffect, useState } from 'react';
-import { Card, List, Tag, Button, message, Space, Typography, Result, Empty } from 'antd';
+import { useEffect, useRef, useState } from 'react';
+import { Card, List, Tag, Button, message, Space, Typography, Result, Empty, Select, Switch, Input } from 'antd';
 import { ReloadOutlined, CheckOutlined, CarOutlined } from '@ant-design/icons';
-import api from '../services/api';
+import {
+  PRESENCE_INTERVAL_MS,
+  acceptDeliveryTask,
+  claimNextDeliveryTask,
+  fetchCourierZones,
+  fetchDeliveryTasks,
+  fetchMyCourier,
+  subscribeDeliveryTasks,
+  updateDeliveryStatus,
+  updatePresence,
+} from '../services/delivery';
+import type { Courier, CourierZone, DeliveryTask, DeliveryTaskStatus } from '../types/delivery';
 import { PageShell } from '../components/PageShell';
 import { palette, statusColorMap } from '../theme/design';
 
 const { Title, Text } = Typography;
 
-interface DeliveryTask {
-  id: string;
-  order_id: string;
-  courier_id?: string | null;
-  pickup_location: string;
-  delivery_location: string;
-  delivery_fee: number;
-  status: string;
-}
+// Next step for a task the courier holds, and whether it needs a handover code
+const nextStep: Partial<Record<DeliveryTaskStatus, { status: DeliveryTaskStatus; label: string; code?: string }>> = {
+  accepted: { status: 'picked_up', label: '确认取件', code: '卖家取件码' },
+  picked_up: { status: 'delivering', label: '开始配送' },
+  delivering: { status: 'delivered', label: '确认送达', code: '买家收货码' },
+};
+
+const errorDetail = (e: unknown) =>
+  e && typeof e === 'object' && 'response' in e
+    ? (e as { response?: { data?: { detail?: string } } }).response?.data?.detail
+    : undefined;
 
 export default function DeliveryTasks() {
   const [tasks, setTasks] = useState<DeliveryTask[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [courier, setCourier] = useState<Courier | null>(null);
+  const [zones, setZones] = useState<CourierZone[]>([]);
+  const [zone, setZone] = useState<string | undefined>();
+  const [online, setOnline] = useState(false);
+  const [myTasks, setMyTasks] = useState<DeliveryTask[]>([]);
+  const [codes, setCodes] = useState<Record<string, string>>({});
+  const heartbeat = useRef<number>();
 
   const load = async () => {
     setLoading(true);
     setError(null);
     try {
-      const { data } = await api.get<DeliveryTask[]>('/delivery_tasks');
-      setTasks(data);
+      const data = await fetchDeliveryTasks('pending');
+      setTasks(data.items);
     } catch (e: unknown) {
-      const detail =
-        e && typeof e === 'object' && 'response' in e
-          ? (e as { response?: { data?: { detail?: string } } }).response?.data?.detail
-          : undefined;
+      const detail = errorDetail(e);
       setError(detail || '加载失败');
       message.error(detail || '加载失败');
     } finally {
@@ -40,21 +57,89 @@ export default function DeliveryTasks() {
     }
   };
 
+  // Live feed of pending tasks; the refresh button stays as a manual fallback
   useEffect(() => {
-    load();
+    setLoading(true);
+    const close = subscribeDeliveryTasks({
+      onSnapshot: (items) => {
+        setTasks(items);
+        setError(null);
+        setLoading(false);
+      },
+      onAdded: (task) => setTasks((prev) => [...prev.filter((t) => t.id !== task.id), task]),
+      onRemoved: (id) => setTasks((prev) => prev.filter((t) => t.id !== id)),
+      onError: () => setLoading(false),
+    });
+    return close;
   }, []);
 
+  useEffect(() => {
+    fetchMyCourier()
+      .then((c) => {
+        setCourier(c);
+        setZone(c.current_zone || undefined);
+        return fetchCourierZones().then(setZones);
+      })
+      .catch(() => setCourier(null));
+  }, []);
+
+  // While online, report presence periodically so the dispatcher keeps assigning tasks
+  const beat = async (isOnline: boolean, z?: string) => {
+    try {
+      const presence = await updatePresence(isOnline, z);
+      setOnline(presence.online);
+      setMyTasks(presence.tasks);
+    } catch (e: unknown) {
+      setOnline(false);
+      message.error(errorDetail(e) || '上线失败');
+    }
+  };
+
+  useEffect(() => {
+    if (!online) return;
+    heartbeat.current = window.setInterval(() => beat(true, zone), PRESENCE_INTERVAL_MS);
+    return () => window.clearInterval(heartbeat.current);
+  }, [online, zone]);
+
+  const toggleOnline = (checked: boolean) => {
+    if (checked && !zone) {
+      message.warning('请先选择所在区域');
+      return;
+    }
+    beat(checked, zone);
+  };
+
+  const claimNext = async () => {
+    try {
+      const t = await claimNextDeliveryTask();
+      message.success(`已接单：${t.pickup_location} → ${t.delivery_location}`);
+      setMyTasks((prev) => [...prev, t]);
+    } catch (e: unknown) {
+      message.error(errorDetail(e) || '接单失败');
+    }
+  };
+
+  const advance = async (t: DeliveryTask) => {
+    const step = nextStep[t.status];
+    if (!step) return;
+    try {
+      const updated = await updateDeliveryStatus(t.id, step.status, codes[t.id]);
+      message.success(step.label + '成功');
+      setCodes((prev) => ({ ...prev, [t.id]: '' }));
+      setMyTasks((prev) =>
+        updated.status === 'delivered' ? prev.filter((x) => x.id !== t.id) : prev.map((x) => (x.id === t.id ? updated : x)),
+      );
+    } catch (e: unknown) {
+      message.error(errorDetail(e) || '操作失败');
+    }
+  };
+
   const accept = async (id: string) => {
     try {
-      await api.post(`/delivery_tasks/${id}/accept`);
+      await acceptDeliveryTask(id);
       message.success('接单成功');
-      load();
     } catch (e: unknown) {
-      const detail =
-        e && typeof e === 'object' && 'response' in e
-          ? (e as { response?: { data?: { detail?: string } } }).response?.data?.detail
-          : undefined;
-      message.error(detail || '接单失败');
+      message.error(errorDetail(e) || '接单失败');
     }
   };
 
@@ -73,6 +158,77 @@ export default function DeliveryTasks() {
           </Button>
         </Space>
 
+        {courier && (
+          <Card bordered={false} style={{ borderRadius: 18 }}>
+            <Space direction="vertical" style={{ width: '100%' }}>
+              <Space wrap>
+                <Text strong>接单状态</Text>
+                <Select
+                  placeholder="所在区域"
+                  style={{ minWidth: 160 }}
+                  value={zone}
+                  onChange={(z: string) => {
+                    setZone(z);
+                    if (online) beat(true, z);
+                  }}
+                  options={zones.map((z) => ({ value: z.name, label: z.name }))}
+                  disabled={courier.status !== 'approved'}
+                />
+                <Switch
+                  checked={online}
+                  onChange={toggleOnline}
+                  checkedChildren="在线"
+                  unCheckedChildren="离线"
+                  disabled={courier.status !== 'approved'}
+                />
+                {courier.status === 'approved' ? (
+                  <Button icon={<CheckOutlined />} onClick={claimNext}>
+                    抢下一单
+                  </Button>
+                ) : (
+                  <Tag>资格{courier.status}</Tag>
+                )}
+              </Space>
+              {online && (
+                <List
+                  size="small"
+                  dataSource={myTasks}
+                  locale={{ emptyText: '系统正在为你派单…' }}
+                  renderItem={(t) => {
+                    const step = nextStep[t.status];
+                    return (
+                      <List.Item>
+                        <Space wrap>
+                          <Tag color={statusColorMap[t.status] || 'blue'}>{t.status}</Tag>
+                          <Text>{t.pickup_location} → {t.delivery_location}</Text>
+                          <Text strong>¥{t.delivery_fee}</Text>
+                          {t.estimated_duration ? (
+                            <Text type="secondary">预计 {Math.ceil(t.estimated_duration / 60)} 分钟</Text>
+                          ) : null}
+                          {step?.code && (
+                            <Input
+                              size="small"
+                              style={{ width: 120 }}
+                              placeholder={step.code}
+                              value={codes[t.id] || ''}
+                              onChange={(e) => setCodes((prev) => ({ ...prev, [t.id]: e.target.value }))}
+                            />
+                          )}
+                          {step && (
+                            <Button size="small" type="primary" onClick={() => advance(t)}>
+                              {step.label}
+                            </Button>
+                          )}
+                        </Space>
+                      </List.Item>
+                    );
+                  }}
+                />
+              )}
+            </Space>
+          </Card>
+        )}
+
         {error && (
           <Result
             status="error"
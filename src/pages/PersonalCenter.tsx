@@ -1,10 +1,11 @@
 import { useEffect, useState } from 'react';
-import { Card, Tabs, Descriptions, Form, Input, Button, message, Table, Tag, Popconfirm, Space, Typography, Empty } from 'antd';
+import { Card, Tabs, Descriptions, Form, Input, Button, message, Table, Tag, Popconfirm, Space, Typography, Empty, Modal } from 'antd';
 import type { TabsProps } from 'antd';
 import type { UserProfile } from '../types/user';
 import type { Order } from '../types/order';
 import type { Book } from '../types/book';
 import { fetchProfile, updateProfile, changePassword, fetchMyOrders, fetchMySales, fetchMyBooks, deleteMyOrder, deleteMySale, deleteMyBook } from '../services/user';
+import { fetchOrderDelivery } from '../services/delivery';
 import type { ColumnsType } from 'antd/es/table';
 import { Link } from 'react-router-dom';
 import { PageShell } from '../components/PageShell';
@@ -142,6 +143,26 @@ export default function PersonalCenter() {
     }
   };
 
+  // Buyers get the code to give the courier on arrival, sellers the one for pickup
+  const showDeliveryCode = async (orderId: string) => {
+    try {
+      const d = await fetchOrderDelivery(orderId);
+      const code = d.delivery_code || d.pickup_code;
+      Modal.info({
+        title: d.delivery_code ? '收货码' : '取件码',
+        content: (
+          <Space direction="vertical">
+            <Text strong style={{ fontSize: 24, letterSpacing: 4 }}>{code}</Text>
+            <Text type="secondary">配送状态：{d.status}</Text>
+            {d.estimated_duration ? <Text type="secondary">预计 {Math.ceil(d.estimated_duration / 60)} 分钟送达</Text> : null}
+          </Space>
+        ),
+      });
+    } catch (e: any) {
+      message.error(e?.response?.data?.detail || '获取配送信息失败');
+    }
+  };
+
   const orderColumns: ColumnsType<Order> = [
     { title: '订单号', dataIndex: 'order_number', key: 'order_number' },
     { title: '书籍ID', dataIndex: 'book_id', key: 'book_id', render: (id: string) => <Link to={`/books/${id}`}>{id}</Link> },
@@ -152,9 +173,14 @@ export default function PersonalCenter() {
       title: '操作',
       key: 'actions',
       render: (_, record) => (
-        <Popconfirm title="确定删除该订单吗？" onConfirm={() => handleDeleteOrder(record.id)}>
-          <Button danger size="small">删除</Button>
-        </Popconfirm>
+        <Space>
+          {record.delivery_method === 'delivery' && (
+            <Button size="small" onClick={() => showDeliveryCode(record.id)}>收货码</Button>
+          )}
+          <Popconfirm title="确定删除该订单吗？" onConfirm={() => handleDeleteOrder(record.id)}>
+            <Button danger size="small">删除</Button>
+          </Popconfirm>
+        </Space>
       ),
     },
   ];
@@ -169,9 +195,14 @@ export default function PersonalCenter() {
       title: '操作',
       key: 'actions',
       render: (_, record) => (
-        <Popconfirm title="确定删除该售出记录吗？" onConfirm={() => handleDeleteSale(record.id)}>
-          <Button danger size="small">删除</Button>
-        </Popconfirm>
+        <Space>
+          {record.delivery_method === 'delivery' && (
+            <Button size="small" onClick={() => showDeliveryCode(record.id)}>取件码</Button>
+          )}
+          <Popconfirm title="确定删除该售出记录吗？" onConfirm={() => handleDeleteSale(record.id)}>
+            <Button danger size="small">删除</Button>
+          </Popconfirm>
+        </Space>
       ),
     },
   ];
@@ -245,6 +276,10 @@ export default function PersonalCenter() {
                   <Descriptions.Item label="姓名">{profile.name}</Descriptions.Item>
                   <Descriptions.Item label="电话">{profile.phone}</Descriptions.Item>
                   <Descriptions.Item label="信用分">{profile.credit_score}</Descriptions.Item>
+                  <Descriptions.Item label="好评 / 差评">
+                    {profile.positive_reviews ?? 0} / {profile.negative_reviews ?? 0}
+                  </Descriptions.Item>
+                  <Descriptions.Item label="完成交易">{profile.total_transactions ?? 0}</Descriptions.Item>
                 </Descriptions>
               )}
             </Card>
@@ -1,5 +1,6 @@
 import api from './api';
-import type { Book } from '../types/book';
+import type { Book, BookFacets, BookFilters, CategoryNode } from '../types/book';
+import type { Page } from '../types/page';
 import { MOCK_BOOKS } from '../data/mockBooks';
 
 const adapt = (b: Book): Book => {
@@ -18,8 +19,8 @@ const adapt = (b: Book): Book => {
 export async function fetchBooks(q?: string) {
   try {
     const params = q ? { q } : undefined;
-    const { data } = await api.get<Book[]>('/books', { params });
-    return data.map(adapt);
+    const { data } = await api.get<Page<Book>>('/books', { params });
+    return data.items.map(adapt);
   } catch (err: any) {
     // Only fallback on network errors (backend not reachable), not on 4xx/5xx
     const isNetwork = !err?.response && !!err?.request;
@@ -37,6 +38,30 @@ export async function fetchBooks(q?: string) {
   }
 }
 
+export async function fetchBookPage(filters: BookFilters = {}) {
+  const params: Record<string, string | number> = {};
+  if (filters.q) params.q = filters.q;
+  if (filters.category_id) params.category_id = filters.category_id;
+  if (filters.condition?.length) params.condition = filters.condition.join(',');
+  if (filters.price?.length) params.price = filters.price.join(',');
+  if (filters.publish_year?.length) params.publish_year = filters.publish_year.join(',');
+  try {
+    const { data } = await api.get<Page<Book> & { facets?: BookFacets | null }>('/books', { params });
+    return { items: data.items.map(adapt), facets: data.facets ?? null, nextCursor: data.next_cursor ?? null };
+  } catch (err: any) {
+    const isNetwork = !err?.response && !!err?.request;
+    if (import.meta.env.DEV && isNetwork) {
+      return { items: await fetchBooks(filters.q), facets: null, nextCursor: null };
+    }
+    throw err;
+  }
+}
+
+export async function fetchCategoryTree() {
+  const { data } = await api.get<CategoryNode[]>('/categories/tree');
+  return data;
+}
+
 export async function fetchBook(bookId: string) {
   try {
     const { data } = await api.get<Book>(`/books/${bookId}`);
@@ -58,6 +83,7 @@ export interface CreateBookPayload {
   publisher: string;
   publish_year?: number;
   edition?: string;
+  category_id?: number;
   original_price: number;
   selling_price: number;
   condition_level: 'excellent' | 'good' | 'fair' | 'poor';
@@ -0,0 +1,74 @@
+import api from './api';
+import type { ChatEvent, ChatMessage, ChatSession, MessageType } from '../types/chat';
+import type { Page } from '../types/page';
+
+export async function openChatSession(peerId: string, bookId?: string) {
+  const { data } = await api.post<ChatSession>('/chat/sessions', { peer_id: peerId, book_id: bookId });
+  return data;
+}
+
+export async function fetchChatSessions(cursor?: string) {
+  const { data } = await api.get<Page<ChatSession>>('/chat/sessions', { params: { cursor } });
+  return data;
+}
+
+export async function fetchChatMessages(sessionId: string, cursor?: string) {
+  const { data } = await api.get<Page<ChatMessage>>(`/chat/sessions/${sessionId}/messages`, { params: { cursor } });
+  return data;
+}
+
+export async function fetchChatUnread() {
+  const { data } = await api.get<{ total: number }>('/chat/unread');
+  return data.total;
+}
+
+export async function markChatRead(sessionId: string) {
+  await api.post(`/chat/sessions/${sessionId}/read`);
+}
+
+export interface ChatSocket {
+  send(sessionId: string, content: string, messageType?: MessageType, clientId?: string): void;
+  read(sessionId: string): void;
+  close(): void;
+}
+
+// Keeps one socket open, reconnecting with backoff; callers reload history on reconnect
+export function connectChat(onEvent: (event: ChatEvent) => void, onReconnect?: () => void): ChatSocket {
+  let ws: WebSocket | null = null;
+  let closed = false;
+  let retry = 0;
+  let ping: ReturnType<typeof setInterval> | undefined;
+
+  const open = () => {
+    const token = localStorage.getItem('token') || '';
+    const proto = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    ws = new WebSocket(`${proto}://${window.location.host}/api/chat/ws?token=${encodeURIComponent(token)}`);
+    ws.onopen = () => {
+      if (retry > 0) onReconnect?.();
+      retry = 0;
+      ping = setInterval(() => ws?.send(JSON.stringify({ type: 'ping' })), 25000);
+    };
+    ws.onmessage = (e) => onEvent(JSON.parse(e.data) as ChatEvent);
+    ws.onclose = (e) => {
+      clearInterval(ping);
+      // 4401: token rejected, reconnecting will not help
+      if (closed || e.code === 4401) return;
+      retry += 1;
+      setTimeout(open, Math.min(30000, 500 * 2 ** retry));
+    };
+  };
+  open();
+
+  const sendFrame = (frame: object) => {
+    if (ws?.readyState === WebSocket.OPEN) ws.send(JSON.stringify(frame));
+  };
+  return {
+    send: (sessionId, content, messageType = 'text', clientId) =>
+      sendFrame({ type: 'send', session_id: sessionId, content, message_type: messageType, client_id: clientId }),
+    read: (sessionId) => sendFrame({ type: 'read', session_id: sessionId }),
+    close: () => {
+      closed = true;
+      ws?.close();
+    },
+  };
+}
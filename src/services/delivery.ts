@@ -0,0 +1,76 @@
+import api from './api';
+import type { Courier, CourierPresence, CourierZone, DeliveryTask, DeliveryTaskStatus, OrderDelivery } from '../types/delivery';
+import type { Page } from '../types/page';
+
+// Heartbeat interval while online; the server drops couriers after ~90s of silence
+export const PRESENCE_INTERVAL_MS = 30_000;
+
+export async function fetchDeliveryTasks(status?: DeliveryTaskStatus, cursor?: string) {
+  const { data } = await api.get<Page<DeliveryTask>>('/delivery_tasks', { params: { status, cursor } });
+  return data;
+}
+
+export interface DeliveryTaskFeedHandlers {
+  onSnapshot(tasks: DeliveryTask[]): void;
+  onAdded(task: DeliveryTask): void;
+  onRemoved(taskId: string): void;
+  onError?(): void;
+}
+
+// Server-Sent Events feed of claimable tasks; EventSource reconnects by itself and
+// every (re)connect starts with a fresh snapshot. Returns a function that closes it.
+export function subscribeDeliveryTasks(handlers: DeliveryTaskFeedHandlers) {
+  const source = new EventSource('/api/delivery_tasks/stream');
+  source.addEventListener('snapshot', (e) => handlers.onSnapshot(JSON.parse((e as MessageEvent).data)));
+  source.addEventListener('added', (e) => handlers.onAdded(JSON.parse((e as MessageEvent).data)));
+  source.addEventListener('removed', (e) => handlers.onRemoved(JSON.parse((e as MessageEvent).data).id));
+  source.onerror = () => handlers.onError?.();
+  return () => source.close();
+}
+
+export async function acceptDeliveryTask(taskId: string) {
+  const { data } = await api.post<DeliveryTask>(`/delivery_tasks/${taskId}/accept`);
+  return data;
+}
+
+// Hands this courier the best pending task for them; 404 when none is left
+export async function claimNextDeliveryTask() {
+  const { data } = await api.post<DeliveryTask>('/delivery_tasks/claim');
+  return data;
+}
+
+// accepted -> picked_up (seller's code) -> delivering -> delivered (buyer's code)
+export async function updateDeliveryStatus(taskId: string, status: DeliveryTaskStatus, code?: string) {
+  const { data } = await api.post<DeliveryTask>(`/delivery_tasks/${taskId}/status`, { status, code });
+  return data;
+}
+
+export async function fetchOrderDelivery(orderId: string) {
+  const { data } = await api.get<OrderDelivery>(`/orders/${orderId}/delivery`);
+  return data;
+}
+
+export async function fetchMyCourier() {
+  const { data } = await api.get<Courier>('/couriers/me');
+  return data;
+}
+
+export async function applyCourier(idCardNumber: string, studentCard?: string) {
+  const { data } = await api.post<Courier>('/couriers/me', { id_card_number: idCardNumber, student_card: studentCard });
+  return data;
+}
+
+export async function fetchCourierZones() {
+  const { data } = await api.get<CourierZone[]>('/couriers/zones');
+  return data;
+}
+
+export async function updatePresence(online: boolean, zone?: string) {
+  const { data } = await api.put<CourierPresence>('/couriers/me/presence', { online, zone });
+  return data;
+}
+
+export async function fetchMyDeliveryTasks() {
+  const { data } = await api.get<DeliveryTask[]>('/couriers/me/tasks');
+  return data;
+}
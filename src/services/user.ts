@@ -1,13 +1,19 @@
 import api from './api';
-import type { UserProfile } from '../types/user';
+import type { UserProfile, UserReputation } from '../types/user';
 import type { Order } from '../types/order';
 import type { Book } from '../types/book';
+import type { Page } from '../types/page';
 
 export async function fetchProfile() {
   const { data } = await api.get<UserProfile>('/me');
   return data;
 }
 
+export async function fetchUserReputation(userId: string) {
+  const { data } = await api.get<UserReputation>(`/users/${userId}/reputation`);
+  return data;
+}
+
 export async function updateProfile(payload: Partial<Pick<UserProfile, 'name' | 'phone'>>) {
   const { data } = await api.patch<UserProfile>('/me', payload);
   localStorage.setItem('user_name', data.name);
@@ -21,8 +27,8 @@ export async function changePassword(payload: ChangePasswordPayload) {
 }
 
 export async function fetchMyBooks() {
-  const { data } = await api.get<Book[]>('/me/books');
-  return data;
+  const { data } = await api.get<Page<Book>>('/me/books');
+  return data.items;
 }
 
 export async function deleteMyBook(bookId: string) {
@@ -31,8 +37,8 @@ export async function deleteMyBook(bookId: string) {
 }
 
 export async function fetchMyOrders() {
-  const { data } = await api.get<Order[]>('/me/orders');
-  return data;
+  const { data } = await api.get<Page<Order>>('/me/orders');
+  return data.items;
 }
 
 export async function deleteMyOrder(orderId: string) {
@@ -41,8 +47,8 @@ export async function deleteMyOrder(orderId: string) {
 }
 
 export async function fetchMySales() {
-  const { data } = await api.get<Order[]>('/me/sales');
-  return data;
+  const { data } = await api.get<Page<Order>>('/me/sales');
+  return data.items;
 }
 
 export async function deleteMySale(orderId: string) {
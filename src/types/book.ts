@@ -11,6 +11,8 @@ export interface Book {
   condition_level: 'excellent' | 'good' | 'fair' | 'poor';
   description?: string;
   cover_image?: string | null;
+  cover_thumb?: string | null; // resized WebP variants, null until generated
+  cover_medium?: string | null;
   gallery_images?: string[];
   seller_id: string;
   status: 'available' | 'reserved' | 'sold' | 'off_shelf';
@@ -21,9 +23,34 @@ export interface Book {
   condition?: 'excellent' | 'good' | 'fair' | 'poor';
   sellerId?: string;
   createdAt?: string;
+  category_id?: number | null;
   category_name?: string;
   subtitle?: string;
   created_at?: string;
   updated_at?: string;
   updatedAt?: string;
 }
+
+// Facet counts returned with /books lists of available books
+export interface BookFacets {
+  condition: Record<string, number>;
+  price: Record<string, number>; // keys like "0-10", "100-"
+  publish_year: Record<string, number>;
+  category: Record<string, number>;
+}
+
+export interface BookFilters {
+  q?: string;
+  category_id?: number;
+  condition?: string[];
+  price?: string[];
+  publish_year?: number[];
+}
+
+export interface CategoryNode {
+  id: number;
+  name: string;
+  parent_id: number | null;
+  depth: number;
+  children: CategoryNode[];
+}
@@ -0,0 +1,33 @@
+export type MessageType = 'text' | 'image' | 'system';
+
+export interface ChatSession {
+  id: string;
+  user1_id: string;
+  user2_id: string;
+  peer_id: string;
+  book_id?: string | null;
+  last_message?: string | null;
+  last_message_at?: string | null;
+  unread_count: number;
+  created_at?: string | null;
+}
+
+export interface ChatMessage {
+  id: string;
+  session_id: string;
+  sender_id: string;
+  message_type: MessageType;
+  content: string;
+  image_url?: string | null;
+  is_read: boolean;
+  read_at?: string | null;
+  created_at?: string | null;
+}
+
+// Frames pushed by /api/chat/ws
+export type ChatEvent =
+  | { type: 'message'; message: ChatMessage }
+  | { type: 'ack'; client_id?: string | number | null; message: ChatMessage }
+  | { type: 'read'; session_id: string; reader_id: string; read_at: string }
+  | { type: 'error'; client_id?: string | number | null; status: number; detail: string }
+  | { type: 'pong' };
@@ -0,0 +1,49 @@
+export type DeliveryTaskStatus = 'pending' | 'accepted' | 'picked_up' | 'delivering' | 'delivered' | 'cancelled';
+
+export interface DeliveryTask {
+  id: string;
+  order_id: string;
+  courier_id?: string | null;
+  pickup_location: string;
+  delivery_location: string;
+  delivery_fee: number;
+  status: DeliveryTaskStatus;
+  estimated_duration?: number | null;
+  actual_duration?: number | null;
+  accepted_at?: string | null;
+  picked_up_at?: string | null;
+  delivered_at?: string | null;
+  created_at?: string | null;
+}
+
+// GET /orders/{id}/delivery: the seller sees pickup_code, the buyer delivery_code
+export interface OrderDelivery extends DeliveryTask {
+  pickup_code?: string | null;
+  delivery_code?: string | null;
+}
+
+export type CourierStatus = 'pending' | 'approved' | 'rejected' | 'suspended';
+
+export interface Courier {
+  id: string;
+  user_id: string;
+  status: CourierStatus;
+  total_orders?: number | null;
+  completed_orders?: number | null;
+  rating?: number | null;
+  is_online?: boolean | null;
+  last_online_time?: string | null;
+  current_zone?: string | null;
+}
+
+export interface CourierPresence {
+  online: boolean;
+  zone?: string | null;
+  tasks: DeliveryTask[];
+}
+
+export interface CourierZone {
+  name: string;
+  x: number;
+  y: number;
+}
@@ -4,5 +4,20 @@ export interface UserProfile {
   name: string;
   phone: string;
   credit_score: number;
+  positive_reviews?: number | null;
+  negative_reviews?: number | null;
+  total_transactions?: number | null;
+}
+
+// GET /users/{id}/reputation: stored aggregates, cheap enough for every seller badge
+export interface UserReputation {
+  id: string;
+  name: string;
+  credit_score?: number | null;
+  positive_reviews?: number | null;
+  negative_reviews?: number | null;
+  total_transactions?: number | null;
+  courier_rating?: number | null;
+  courier_reviews?: number | null;
 }
 